@@ -83,7 +83,10 @@ class DeepSeekChatOpenAI(ChatOpenAI):
 
 from prompts.agent_prompt import STOP_SIGNAL, get_agent_system_prompt
 from tools.general_tools import (extract_conversation, extract_tool_messages,
-                                 get_config_value, write_config_value)
+                                 get_config_value, get_session_mcp_config,
+                                 use_agent_session, write_config_value,
+                                 write_config_values)
+from tools.ledger import get_ledger, last_position_date, write_position_checkpoint
 from tools.price_tools import add_no_trade_record
 
 # Load environment variables
@@ -286,6 +289,12 @@ class BaseAgent:
         self.model: Optional[ChatOpenAI] = None
         self.agent: Optional[Any] = None
 
+        # Shared with other agents when several run in one event loop (main_parrallel.py --mode inproc)
+        self.llm_semaphore: Optional[asyncio.Semaphore] = None
+        self.http_async_client: Optional[Any] = None
+        # Per-provider request/token budget (tools.rate_limiter.RateLimitCallback)
+        self.rate_limiter: Optional[Any] = None
+
         # Data paths
         self.data_path = os.path.join(self.base_log_path, self.signature)
         self.position_file = os.path.join(self.data_path, "position", "position.jsonl")
@@ -324,11 +333,13 @@ class BaseAgent:
             print("⚠️  OpenAI base URL not set, using default")
 
         try:
-            # Create MCP client
-            self.client = MultiServerMCPClient(self.mcp_config)
+            # Create MCP client, unless the runner injected one shared by all its agents
+            if self.client is None:
+                self.client = MultiServerMCPClient(get_session_mcp_config(self.mcp_config))
 
             # Get tools
-            self.tools = await self.client.get_tools()
+            if self.tools is None:
+                self.tools = await self.client.get_tools()
             if not self.tools:
                 print("⚠️  Warning: No MCP tools loaded. MCP services may not be running.")
                 print(f"   MCP configuration: {self.mcp_config}")
@@ -351,6 +362,8 @@ class BaseAgent:
                     api_key=self.openai_api_key,
                     max_retries=3,
                     timeout=30,
+                    http_async_client=self.http_async_client,
+                    callbacks=[self.rate_limiter] if self.rate_limiter else None,
                 )
             else:
                 self.model = ChatOpenAI(
@@ -359,6 +372,8 @@ class BaseAgent:
                     api_key=self.openai_api_key,
                     max_retries=3,
                     timeout=30,
+                    http_async_client=self.http_async_client,
+                    callbacks=[self.rate_limiter] if self.rate_limiter else None,
                 )
         except Exception as e:
             raise RuntimeError(f"❌ Failed to initialize AI model: {e}")
@@ -389,7 +404,10 @@ class BaseAgent:
         """Agent invocation with retry"""
         for attempt in range(1, self.max_retries + 1):
             try:
-                return await self.agent.ainvoke({"messages": message}, {"recursion_limit": 100})
+                if self.llm_semaphore is None:
+                    return await self.agent.ainvoke({"messages": message}, {"recursion_limit": 100})
+                async with self.llm_semaphore:
+                    return await self.agent.ainvoke({"messages": message}, {"recursion_limit": 100})
             except Exception as e:
                 if attempt == self.max_retries:
                     raise e
@@ -409,6 +427,7 @@ class BaseAgent:
         # Set up logging
         log_file = self._setup_logging(today_date)
         write_config_value("LOG_FILE", log_file)
+
         # Update system prompt
         self.agent = create_agent(
             self.model,
@@ -483,6 +502,9 @@ class BaseAgent:
                 raise
             write_config_value("IF_TRADE", False)
 
+        # Checkpoint the ledger so the next session only replays records written after this one
+        write_position_checkpoint(self.signature)
+
     def register_agent(self) -> None:
         """Register new agent, create initial positions"""
         # Check if position.jsonl file already exists
@@ -520,7 +542,7 @@ class BaseAgent:
         Returns:
             List of trading dates (excluding weekends and holidays)
         """
-        from tools.price_tools import is_trading_day
+        from tools.price_tools import get_trading_calendar
 
         dates = []
         max_date = None
@@ -529,18 +551,8 @@ class BaseAgent:
             self.register_agent()
             max_date = init_date
         else:
-            # Read existing position file, find latest date
-            with open(self.position_file, "r") as f:
-                for line in f:
-                    doc = json.loads(line)
-                    current_date = doc["date"]
-                    if max_date is None:
-                        max_date = current_date
-                    else:
-                        current_date_obj = datetime.strptime(current_date, "%Y-%m-%d")
-                        max_date_obj = datetime.strptime(max_date, "%Y-%m-%d")
-                        if current_date_obj > max_date_obj:
-                            max_date = current_date
+            # Latest processed date: records are appended in date order, so only the last line is read
+            max_date = last_position_date(self.position_file) or init_date
 
         # Check if new dates need to be processed
         max_date_obj = datetime.strptime(max_date, "%Y-%m-%d")
@@ -549,25 +561,20 @@ class BaseAgent:
         if end_date_obj <= max_date_obj:
             return []
 
-        # Generate trading date list, filtered by actual trading days
-        trading_dates = []
-        current_date = max_date_obj + timedelta(days=1)
-
-        while current_date <= end_date_obj:
-            date_str = current_date.strftime("%Y-%m-%d")
-            # Check if this is an actual trading day in merged.jsonl
-            if is_trading_day(date_str, market=self.market):
-                trading_dates.append(date_str)
-            current_date += timedelta(days=1)
-
-        return trading_dates
+        # Trading dates strictly after max_date up to end_date, from the sorted calendar in merged.jsonl
+        calendar = get_trading_calendar(self.market, "daily")
+        if calendar is None:
+            return []
+        return calendar.range(max_date, end_date, include_start=False)
 
     async def run_with_retry(self, today_date: str) -> None:
         """Run method with retry"""
         for attempt in range(1, self.max_retries + 1):
             try:
                 print(f"🔄 Attempting to run {self.signature} - {today_date} (Attempt {attempt})")
-                await self.run_trading_session(today_date)
+                # Config reads and MCP tool calls of the session see this agent's signature and date
+                with use_agent_session(self.signature, today_date, self.base_log_path, self.market):
+                    await self.run_trading_session(today_date)
                 print(f"✅ {self.signature} - {today_date} run successful")
                 return
             except Exception as e:
@@ -604,8 +611,7 @@ class BaseAgent:
             print(f"🔄 Processing {self.signature} - Date: {date}")
 
             # Set configuration
-            write_config_value("TODAY_DATE", date)
-            write_config_value("SIGNATURE", self.signature)
+            write_config_values({"TODAY_DATE": date, "SIGNATURE": self.signature})
 
             try:
                 await self.run_with_retry(date)
@@ -621,20 +627,16 @@ class BaseAgent:
         if not os.path.exists(self.position_file):
             return {"error": "Position file does not exist"}
 
-        positions = []
-        with open(self.position_file, "r") as f:
-            for line in f:
-                positions.append(json.loads(line))
-
-        if not positions:
+        # Read from the end of the file unless the ledger already holds the state
+        latest_position, total_records = get_ledger(self.position_file).summary()
+        if latest_position is None:
             return {"error": "No position records"}
 
-        latest_position = positions[-1]
         return {
             "signature": self.signature,
             "latest_date": latest_position.get("date"),
             "positions": latest_position.get("positions", {}),
-            "total_records": len(positions),
+            "total_records": total_records,
         }
 
     def __str__(self) -> str:
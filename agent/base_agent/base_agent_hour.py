@@ -20,8 +20,15 @@ import sys
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.insert(0, project_root)
 
-from tools.general_tools import extract_conversation, extract_tool_messages, get_config_value, write_config_value
-from tools.price_tools import add_no_trade_record
+from tools.general_tools import (
+    extract_conversation,
+    extract_tool_messages,
+    get_config_value,
+    write_config_value,
+    write_config_values,
+)
+from tools.ledger import last_position_date
+from tools.price_tools import add_no_trade_record, get_trading_calendar
 from prompts.agent_prompt import get_agent_system_prompt, STOP_SIGNAL
 
 # Load environment variables
@@ -51,7 +58,7 @@ class BaseAgent_Hour(BaseAgent):
         # Set up logging
         log_file = self._setup_logging(today_date)
         write_config_value("LOG_FILE", log_file)
-        
+
         # Update system prompt
         from langchain.agents import create_agent
         self.agent = create_agent(
@@ -135,59 +142,19 @@ class BaseAgent_Hour(BaseAgent):
         else:
             raise ValueError("Only support hour-level trading. Please use YYYY-MM-DD HH:MM:SS format.")
         
-        # Get merged.jsonl path
-        base_dir = Path(__file__).resolve().parents[2]
-        merged_file = base_dir / "data" / "merged.jsonl"
-        
-        if not merged_file.exists():
-            return []
-        
-        # Collect all timestamps from merged.jsonl
-        all_timestamps = set()
-        
-        with merged_file.open("r", encoding="utf-8") as f:
-            for line in f:
-                if not line.strip():
-                    continue
-                try:
-                    doc = json.loads(line)
-                    # 查找所有以 "Time Series" 开头的键
-                    for key, value in doc.items():
-                        if key.startswith("Time Series"):
-                            if isinstance(value, dict):
-                                all_timestamps.update(value.keys())
-                            break
-                except Exception:
-                    continue
-        
-        if not all_timestamps:
+        # Get the sorted hourly trading calendar built from merged.jsonl
+        calendar = get_trading_calendar(self.market, "60min")
+        if calendar is None or not len(calendar):
             return []
+
         # Determine min_datetime based on init_date and last processed date in position file
         min_datetime = init_dt
         
         last_processed_dt = None
         if os.path.exists(self.position_file):
-            max_date = None
-            with open(self.position_file, "r") as f:
-                for line in f:
-                    doc = json.loads(line)
-                    current_date = doc['date']
-                    if max_date is None:
-                        max_date = current_date
-                    else:
-                        if ' ' in current_date:
-                            current_date_obj = datetime.strptime(current_date, "%Y-%m-%d %H:%M:%S")
-                        else:
-                            current_date_obj = datetime.strptime(current_date, "%Y-%m-%d")
-                        
-                        if ' ' in max_date:
-                            max_date_obj = datetime.strptime(max_date, "%Y-%m-%d %H:%M:%S")
-                        else:
-                            max_date_obj = datetime.strptime(max_date, "%Y-%m-%d")
-                        
-                        if current_date_obj > max_date_obj:
-                            max_date = current_date
-            
+            # Latest processed date: records are appended in date order, so only the last line is read
+            max_date = last_position_date(self.position_file)
+
             if max_date:
                 if has_time:
                     last_processed_dt = datetime.strptime(max_date, "%Y-%m-%d %H:%M:%S")
@@ -202,37 +169,13 @@ class BaseAgent_Hour(BaseAgent):
         if last_processed_dt is not None:
             # If last processed has time, we will filter strictly greater than it;
             min_datetime = max(init_dt, last_processed_dt)
-            if not has_time:
-                last_processed_dt = last_processed_dt.date()
-        
-        # Filter timestamps within the range
-        trading_times = []
-        if not has_time:
-            min_datetime = min_datetime.date()
-            end_dt = end_dt.date()
-    
-        for ts_str in all_timestamps:
-            try:
-                if has_time:
-                    ts_dt = datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S")
-                else:
-                    ts_dt = datetime.strptime(ts_str, "%Y-%m-%d").date()
-                # Check if timestamp is in range with boundary rules
-                in_lower = False
-                if last_processed_dt is None:
-                    in_lower = ts_dt >= min_datetime
-                else:
-                    in_lower = ts_dt > min_datetime
-                if in_lower and ts_dt <= end_dt:
-                    trading_times.append(ts_str)
-                    
-            except Exception as e:
-                print(f"❌ Error processing timestamp: {ts_str}")
-                print(e)
-                continue
-        
-        # Sort and remove duplicates
-        trading_times = sorted(list(set(trading_times)))
+
+        # Bisect the calendar for timestamps within the range with boundary rules
+        trading_times = calendar.range(
+            min_datetime.strftime("%Y-%m-%d %H:%M:%S"),
+            end_dt.strftime("%Y-%m-%d %H:%M:%S"),
+            include_start=last_processed_dt is None,
+        )
         if REGISTER:
             print("REGISTER date will not be considered")
             trading_times = trading_times[1:]
@@ -261,8 +204,7 @@ class BaseAgent_Hour(BaseAgent):
             print(f"🔄 Processing {self.signature} - Date: {date}")
             
             # Set configuration
-            write_config_value("TODAY_DATE", date)
-            write_config_value("SIGNATURE", self.signature)
+            write_config_values({"TODAY_DATE": date, "SIGNATURE": self.signature})
             
             try:
                 await self.run_with_retry(date)
@@ -85,7 +85,10 @@ class DeepSeekChatOpenAI(ChatOpenAI):
 from prompts.agent_prompt_astock import (STOP_SIGNAL,
                                          get_agent_system_prompt_astock)
 from tools.general_tools import (extract_conversation, extract_tool_messages,
-                                 get_config_value, write_config_value)
+                                 get_config_value, get_session_mcp_config,
+                                 use_agent_session, write_config_value,
+                                 write_config_values)
+from tools.ledger import get_ledger, last_position_date, write_position_checkpoint
 from tools.price_tools import add_no_trade_record
 
 # Load environment variables
@@ -269,11 +272,13 @@ class BaseAgentAStock:
             print("⚠️  OpenAI base URL not set, using default")
 
         try:
-            # Create MCP client
-            self.client = MultiServerMCPClient(self.mcp_config)
+            # Create MCP client, unless the runner injected one shared by all its agents
+            if self.client is None:
+                self.client = MultiServerMCPClient(get_session_mcp_config(self.mcp_config))
 
             # Get tools
-            self.tools = await self.client.get_tools()
+            if self.tools is None:
+                self.tools = await self.client.get_tools()
             if not self.tools:
                 print("⚠️  Warning: No MCP tools loaded. MCP services may not be running.")
                 print(f"   MCP configuration: {self.mcp_config}")
@@ -350,6 +355,7 @@ class BaseAgentAStock:
         # Set up logging
         log_file = self._setup_logging(today_date)
 
+
         # Update system prompt - 使用A股专用提示词
         self.agent = create_agent(
             self.model,
@@ -424,6 +430,9 @@ class BaseAgentAStock:
                 raise
             write_config_value("IF_TRADE", False)
 
+        # Checkpoint the ledger so the next session only replays records written after this one
+        write_position_checkpoint(self.signature)
+
     def register_agent(self) -> None:
         """Register new agent, create initial positions"""
         # Check if position.jsonl file already exists
@@ -469,18 +478,8 @@ class BaseAgentAStock:
             self.register_agent()
             max_date = init_date
         else:
-            # Read existing position file, find latest date
-            with open(self.position_file, "r") as f:
-                for line in f:
-                    doc = json.loads(line)
-                    current_date = doc["date"]
-                    if max_date is None:
-                        max_date = current_date
-                    else:
-                        current_date_obj = datetime.strptime(current_date, "%Y-%m-%d")
-                        max_date_obj = datetime.strptime(max_date, "%Y-%m-%d")
-                        if current_date_obj > max_date_obj:
-                            max_date = current_date
+            # Latest processed date: records are appended in date order, so only the last line is read
+            max_date = last_position_date(self.position_file) or init_date
 
         # Check if new dates need to be processed
         max_date_obj = datetime.strptime(max_date, "%Y-%m-%d")
@@ -507,7 +506,9 @@ class BaseAgentAStock:
         for attempt in range(1, self.max_retries + 1):
             try:
                 print(f"🔄 Attempting to run {self.signature} - {today_date} (Attempt {attempt})")
-                await self.run_trading_session(today_date)
+                # Config reads and MCP tool calls of the session see this agent's signature and date
+                with use_agent_session(self.signature, today_date, self.base_log_path, self.market):
+                    await self.run_trading_session(today_date)
                 print(f"✅ {self.signature} - {today_date} run successful")
                 return
             except Exception as e:
@@ -544,8 +545,7 @@ class BaseAgentAStock:
             print(f"🔄 Processing {self.signature} - Date: {date}")
 
             # Set configuration
-            write_config_value("TODAY_DATE", date)
-            write_config_value("SIGNATURE", self.signature)
+            write_config_values({"TODAY_DATE": date, "SIGNATURE": self.signature})
 
             try:
                 await self.run_with_retry(date)
@@ -561,20 +561,16 @@ class BaseAgentAStock:
         if not os.path.exists(self.position_file):
             return {"error": "Position file does not exist"}
 
-        positions = []
-        with open(self.position_file, "r") as f:
-            for line in f:
-                positions.append(json.loads(line))
-
-        if not positions:
+        # Read from the end of the file unless the ledger already holds the state
+        latest_position, total_records = get_ledger(self.position_file).summary()
+        if latest_position is None:
             return {"error": "No position records"}
 
-        latest_position = positions[-1]
         return {
             "signature": self.signature,
             "latest_date": latest_position.get("date"),
             "positions": latest_position.get("positions", {}),
-            "total_records": len(positions),
+            "total_records": total_records,
         }
 
     def __str__(self) -> str:
@@ -4,7 +4,9 @@ MCP Service Startup Script (Python Version)
 Start all four MCP services: Math, Search, TradeTools, LocalPrices
 """
 
+import json
 import os
+import shutil
 import signal
 import subprocess
 import sys
@@ -16,11 +18,19 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Add project root directory to Python path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+from tools.price_cube import SHARED_CUBES_ENV, publish_shared_cubes
+from tools.price_tools import get_merged_file_path
+
 
 class MCPServiceManager:
     def __init__(self):
         self.services = {}
         self.running = True
+        self.cube_scratch_dir = None
 
         # Set default ports
         self.ports = {
@@ -171,6 +181,8 @@ class MCPServiceManager:
         for service_id, config in self.service_configs.items():
             print(f"  - {config['name']}: {config['port']}")
 
+        self.publish_price_cubes()
+
         print("\n🔄 Starting services...")
 
         # Start all services
@@ -200,6 +212,19 @@ class MCPServiceManager:
             print("\n❌ All services failed to start properly")
             self.stop_all_services()
 
+    def publish_price_cubes(self):
+        """Build the price cubes once; the services inherit PRICE_CUBE_SHARED and mmap them"""
+        try:
+            shared_cubes, self.cube_scratch_dir = publish_shared_cubes(
+                [get_merged_file_path(market) for market in ("us", "cn", "crypto")]
+            )
+        except Exception as e:
+            print(f"⚠️  Failed to build shared price cubes, services will load prices themselves: {e}")
+            return
+        if shared_cubes:
+            os.environ[SHARED_CUBES_ENV] = json.dumps(shared_cubes)
+            print(f"\n📦 Shared price cubes: {', '.join(shared_cubes.values())}")
+
     def check_all_services(self):
         """Check all service status and return count of healthy services"""
         healthy_count = 0
@@ -263,6 +288,10 @@ class MCPServiceManager:
             except Exception as e:
                 print(f"❌ Error stopping {service['name']} service: {e}")
 
+        if self.cube_scratch_dir is not None:
+            shutil.rmtree(self.cube_scratch_dir, ignore_errors=True)
+            self.cube_scratch_dir = None
+
         print("✅ All services stopped")
 
     def status(self):
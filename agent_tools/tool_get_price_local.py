@@ -1,10 +1,12 @@
+import bisect
 import json
 import os
 import sys
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
+import numpy as np
 from dotenv import load_dotenv
 from fastmcp import FastMCP
 
@@ -21,6 +23,13 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 from tools.general_tools import get_config_value
+from tools.indicators import INDICATORS, get_indicator_values
+from tools.price_db import load_price_db, price_backend
+from tools.price_index import read_symbol_doc
+from tools.price_store import FIELD_KEYS, FIELDS
+from tools.bar_store import BarStore
+from tools.price_snapshot import PriceCacheWatcher, PriceSnapshot
+from tools.price_tools import get_bar_store, get_merged_file_path
 
 
 def _workspace_data_path(filename: str, symbol: Optional[str] = None) -> Path:
@@ -62,6 +71,59 @@ def _validate_date_hourly(date_str: str) -> None:
     except ValueError as exc:
         raise ValueError("date must be in YYYY-MM-DD HH:MM:SS format") from exc
 
+
+# Warm price cache, set when this module runs as the LocalPrices server
+_watcher: Optional[PriceCacheWatcher] = None
+
+
+def _snapshot() -> Optional[PriceSnapshot]:
+    """Get the current warm snapshot; a request holds on to it until it returns."""
+    return _watcher.snapshot if _watcher is not None else None
+
+
+def _bar_store(data_path: Path, snapshot: Optional[PriceSnapshot] = None) -> Optional[BarStore]:
+    bar_store = snapshot.bar_store(data_path) if snapshot is not None else None
+    return bar_store if bar_store is not None else get_bar_store(data_path)
+
+
+def _read_symbol_doc(data_path: Path, symbol: str, snapshot: Optional[PriceSnapshot] = None) -> Optional[dict]:
+    """Read one symbol's merged.jsonl document.
+
+    Served from the warm snapshot when the server runs, from the SQLite price
+    database when PRICE_BACKEND=sqlite, and otherwise by a single seek through
+    the merged.idx symbol index.
+    """
+    source = snapshot.source(data_path) if snapshot is not None else None
+    if source is None and price_backend() == "sqlite":
+        source = load_price_db(data_path)
+    if source is not None:
+        return source.symbol_doc(symbol)
+    return read_symbol_doc(data_path, symbol)
+
+
+def _daily_series(data_path: Path, symbol: str, doc: dict, snapshot: Optional[PriceSnapshot] = None) -> Dict[str, dict]:
+    """Get the symbol's daily bars, resampled from its intraday series when the file holds no daily one."""
+    series = doc.get("Time Series (Daily)")
+    if series is None:
+        bar_store = _bar_store(data_path, snapshot)
+        series = bar_store.series(symbol, "daily") if bar_store is not None else {}
+    return series
+
+
+def _is_current_bar(date: str, today_date: Optional[str]) -> bool:
+    """Whether the bar at date is still open at TODAY_DATE.
+
+    An hourly session's TODAY_DATE carries a time, so the day's daily bar is
+    the current one too: its high/low/close/volume would include the hours
+    after TODAY_DATE.
+    """
+    if not today_date:
+        return False
+    if " " in date or "T" in date:
+        return date == today_date
+    return date == today_date[:10]
+
+
 @mcp.tool()
 def get_price_local(symbol: str, date: str) -> Dict[str, Any]:
     """Read OHLCV data for specified stock and date. Get historical information for specified stock.
@@ -79,12 +141,13 @@ def get_price_local(symbol: str, date: str) -> Dict[str, Any]:
     """
     # Detect date format
     result = None
+    snapshot = _snapshot()
     if ' ' in date or 'T' in date:
         # Contains time component, use hourly
-        result =  get_price_local_hourly(symbol, date)
+        result =  get_price_local_hourly(symbol, date, snapshot)
     else:
         # Date only, use daily
-        result = get_price_local_daily(symbol, date)
+        result = get_price_local_daily(symbol, date, snapshot)
     
     # log_file = get_config_value("LOG_FILE")
     # signature = get_config_value("SIGNATURE")
@@ -100,12 +163,212 @@ def get_price_local(symbol: str, date: str) -> Dict[str, Any]:
 
 
 
-def get_price_local_daily(symbol: str, date: str) -> Dict[str, Any]:
+@mcp.tool()
+def get_prices(symbols: List[str], dates: List[str], fields: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Read OHLCV data for many stocks and dates in one call, returned as a compact table.
+
+    Prefer this over calling get_price_local once per symbol/date.
+
+    Args:
+        symbols: Stock symbols, e.g. ['AAPL', 'MSFT'] or ['600519.SH'].
+        dates: Dates in 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS' format. Based on your current time format.
+        fields: Subset of ['open', 'high', 'low', 'close', 'volume']; defaults to all of them.
+
+    Returns:
+        Dictionary with "columns" (symbol, date, then the requested fields), "rows" (one list per
+        symbol/date found) and "errors" (symbol/date pairs that could not be read). For the current
+        date only the open price is available; the other fields are null.
+    """
+    fields = list(fields) if fields else list(FIELDS)
+    unknown_fields = [field for field in fields if field not in FIELD_KEYS]
+    if unknown_fields:
+        return {"error": f"Unknown fields {unknown_fields}. Valid fields: {list(FIELDS)}"}
+
+    # Validate every date up front and pick the time series by its format
+    series_keys: Dict[str, str] = {}
+    errors: List[Dict[str, Any]] = []
+    for date in dates:
+        try:
+            if " " in date or "T" in date:
+                _validate_date_hourly(date)
+                series_keys[date] = "Time Series (60min)"
+            else:
+                _validate_date_daily(date)
+                series_keys[date] = "Time Series (Daily)"
+        except ValueError as e:
+            errors.append({"date": date, "error": str(e)})
+
+    today_date = get_config_value("TODAY_DATE")
+    snapshot = _snapshot()
+    rows: List[List[Any]] = []
+    for symbol in symbols:
+        data_path = _workspace_data_path("merged.jsonl", symbol)
+        doc = _read_symbol_doc(data_path, symbol, snapshot) if data_path.exists() else None
+        if doc is None:
+            errors.append({"symbol": symbol, "error": f"No records found for stock {symbol} in local data"})
+            continue
+        for date, series_key in series_keys.items():
+            if series_key == "Time Series (Daily)":
+                bar = _daily_series(data_path, symbol, doc, snapshot).get(date)
+            else:
+                bar = doc.get(series_key, {}).get(date)
+            if bar is None:
+                errors.append({"symbol": symbol, "date": date, "error": "Data not found for date"})
+                continue
+            # The current bar only exposes its open price, as in get_price_local
+            masked = _is_current_bar(date, today_date)
+            rows.append(
+                [symbol, date]
+                + [None if masked and field != "open" else bar.get(FIELD_KEYS[field]) for field in fields]
+            )
+
+    result: Dict[str, Any] = {"columns": ["symbol", "date"] + fields, "rows": rows}
+    current_dates = [date for date in series_keys if _is_current_bar(date, today_date)]
+    if current_dates and any(field != "open" for field in fields):
+        result["note"] = f"You can not get the current high/low/close/volume for {', '.join(current_dates)}"
+    if errors:
+        result["errors"] = errors
+    return result
+
+
+_RESOLUTIONS = {"daily": "daily", "4h": "4h", "hourly": "60min", "60min": "60min"}
+MAX_HISTORY_LOOKBACK = 1000
+
+
+@mcp.tool()
+def get_price_history(symbol: str, end_date: str, lookback: int = 20, resolution: str = "daily") -> Dict[str, Any]:
+    """Read the last `lookback` OHLCV bars of a stock up to end_date (inclusive) in one call.
+
+    Bars after the current date are never returned; for the current bar only the open price is available.
+
+    Args:
+        symbol: Stock symbol, e.g. 'AAPL' or '600519.SH'.
+        end_date: Last date of the window, 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS'.
+        lookback: Number of bars to return (1-1000).
+        resolution: 'daily', '4h' or 'hourly'; coarser bars are aggregated from finer local data.
+
+    Returns:
+        Dictionary with symbol, resolution, "columns" (date, open, high, low, close, volume)
+        and "rows" ordered from oldest to newest.
+    """
+    resolution_key = _RESOLUTIONS.get(resolution)
+    if resolution_key is None:
+        return {"error": f"resolution must be one of {list(_RESOLUTIONS)}", "symbol": symbol}
+    try:
+        if " " in end_date or "T" in end_date:
+            _validate_date_hourly(end_date)
+        else:
+            _validate_date_daily(end_date)
+    except ValueError as e:
+        return {"error": str(e), "symbol": symbol, "end_date": end_date}
+    if not 1 <= lookback <= MAX_HISTORY_LOOKBACK:
+        return {"error": f"lookback must be between 1 and {MAX_HISTORY_LOOKBACK}", "symbol": symbol}
+
+    data_path = _workspace_data_path("merged.jsonl", symbol)
+    bar_store = _bar_store(data_path, _snapshot())
+    if bar_store is None or not bar_store.source.has_symbol(symbol):
+        return {"error": f"No records found for stock {symbol} in local data", "symbol": symbol}
+    # Coarser bars are resampled from the symbol's native series
+    bars = bar_store.bars(symbol, resolution_key)
+    if bars is None:
+        return {"error": f"No {resolution} data for stock {symbol} in local data", "symbol": symbol}
+    timestamps, values = bars
+    is_daily = resolution_key == "daily"
+
+    # Cut the window at the bar holding the current time so no later prices leak into it
+    today_date = get_config_value("TODAY_DATE")
+    today_key = today_date
+    if today_date and is_daily:
+        today_key = today_date[:10]
+    elif today_date and resolution_key == "4h" and " " in today_date:
+        today_key = f"{today_date[:11]}{int(today_date[11:13]) // 4 * 4:02d}:00:00"
+    if is_daily:
+        end_key = end_date[:10]
+    else:
+        # A date-only end covers every intraday bar of that day
+        end_key = end_date if " " in end_date else end_date + "~"
+    end = bisect.bisect_right(timestamps, end_key)
+    if today_key:
+        end = min(end, bisect.bisect_right(timestamps, today_key))
+    start = max(0, end - lookback)
+
+    window = values[start:end]
+    rows = []
+    for ts, bar in zip(timestamps[start:end], window.tolist()):
+        row = [None if v != v else v for v in bar]
+        if ts == today_key:
+            # Same masking as get_price_local: only the open is known yet
+            row = [row[0]] + [None] * (len(FIELDS) - 1)
+        rows.append([ts] + row)
+    return {
+        "symbol": symbol,
+        "resolution": resolution,
+        "columns": ["date"] + list(FIELDS),
+        "rows": rows,
+    }
+
+
+@mcp.tool()
+def get_indicators(symbol: str, date: str, names: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Read precomputed technical indicators of a stock as of a date.
+
+    Available names: sma_20, sma_50, ema_12, ema_26, rsi_14, atr_14, realized_vol_20 (per-bar
+    standard deviation of log returns) and momentum_10 (10-bar rate of change). Values use the last
+    completed bar at or before date; the current bar is never used because its close is not known yet.
+
+    Args:
+        symbol: Stock symbol, e.g. 'AAPL' or '600519.SH'.
+        date: Date in 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS' format.
+        names: Indicator names to return; defaults to all of them.
+
+    Returns:
+        Dictionary with symbol, date, "as_of" (the bar the values belong to) and "indicators".
+    """
+    names = list(names) if names else list(INDICATORS)
+    unknown_names = [name for name in names if name not in INDICATORS]
+    if unknown_names:
+        return {"error": f"Unknown indicators {unknown_names}. Valid indicators: {list(INDICATORS)}", "symbol": symbol}
+    try:
+        if " " in date or "T" in date:
+            _validate_date_hourly(date)
+        else:
+            _validate_date_daily(date)
+    except ValueError as e:
+        return {"error": str(e), "symbol": symbol, "date": date}
+
+    data_path = _workspace_data_path("merged.jsonl", symbol)
+    bar_store = _bar_store(data_path, _snapshot())
+    source = bar_store.source if bar_store is not None else None
+    if source is None or not source.has_symbol(symbol):
+        return {"error": f"No records found for stock {symbol} in local data", "symbol": symbol, "date": date}
+    timestamps, values = get_indicator_values(data_path, symbol, source)
+    is_daily = bool(timestamps) and " " not in timestamps[0]
+
+    # Last bar at or before date, and strictly before the current bar
+    date_key = date[:10] if is_daily else (date if " " in date else date + "~")
+    end = bisect.bisect_right(timestamps, date_key)
+    today_date = get_config_value("TODAY_DATE")
+    if today_date:
+        end = min(end, bisect.bisect_left(timestamps, today_date[:10] if is_daily else today_date))
+    if end == 0:
+        return {"error": f"No completed bars for stock {symbol} before {date}", "symbol": symbol, "date": date}
+
+    row = values[end - 1]
+    return {
+        "symbol": symbol,
+        "date": date,
+        "as_of": timestamps[end - 1],
+        "indicators": {name: (None if np.isnan(row[i]) else float(row[i])) for i, name in enumerate(INDICATORS) if name in names},
+    }
+
+
+def get_price_local_daily(symbol: str, date: str, snapshot: Optional[PriceSnapshot] = None) -> Dict[str, Any]:
     """Read OHLCV data for specified stock and date. Get historical information for specified stock.
 
     Args:
         symbol: Stock symbol, e.g. 'IBM' or '600243.SHH'.
         date: Date in 'YYYY-MM-DD' format.
+        snapshot: Optional warm price snapshot to read from.
 
     Returns:
         Dictionary containing symbol, date and ohlcv data.
@@ -120,58 +383,51 @@ def get_price_local_daily(symbol: str, date: str) -> Dict[str, Any]:
     if not data_path.exists():
         return {"error": f"Data file not found: {data_path}", "symbol": symbol, "date": date}
 
-    with data_path.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            doc = json.loads(line)
-            meta = doc.get("Meta Data", {})
-            if meta.get("2. Symbol") != symbol:
-                continue
-            series = doc.get("Time Series (Daily)", {})
-            day = series.get(date)
-            if day is None:
-                sample_dates = sorted(series.keys(), reverse=True)[:5]
-                return {
-                    "error": f"Data not found for date {date}. Please verify the date exists in data. Sample available dates: {sample_dates}",
-                    "symbol": symbol,
-                    "date": date,
-                }
-            if date == get_config_value("TODAY_DATE"):
-                return {
-                    "symbol": symbol,
-                    "date": date,
-                    "ohlcv": {
-                        "open": day.get("1. buy price"),
-                        "high": "You can not get the current high price",
-                        "low": "You can not get the current low price", 
-                        "close": "You can not get the next close price",
-                        "volume": "You can not get the current volume",
-                    },
-                }
-            else:
-                return {
-                    "symbol": symbol,
-                    "date": date,
-                    "ohlcv": {
-                        "open": day.get("1. buy price"),
-                        "high": day.get("2. high"),
-                        "low": day.get("3. low"), 
-                        "close": day.get("4. sell price"),
-                        "volume": day.get("5. volume"),
-                    },
-                }
-
-
-    return {"error": f"No records found for stock {symbol} in local data", "symbol": symbol, "date": date}
-
-
-def get_price_local_hourly(symbol: str, date: str) -> Dict[str, Any]:
+    doc = _read_symbol_doc(data_path, symbol, snapshot)
+    if doc is None:
+        return {"error": f"No records found for stock {symbol} in local data", "symbol": symbol, "date": date}
+    series = _daily_series(data_path, symbol, doc, snapshot)
+    day = series.get(date)
+    if day is None:
+        sample_dates = sorted(series.keys(), reverse=True)[:5]
+        return {
+            "error": f"Data not found for date {date}. Please verify the date exists in data. Sample available dates: {sample_dates}",
+            "symbol": symbol,
+            "date": date,
+        }
+    if _is_current_bar(date, get_config_value("TODAY_DATE")):
+        return {
+            "symbol": symbol,
+            "date": date,
+            "ohlcv": {
+                "open": day.get("1. buy price"),
+                "high": "You can not get the current high price",
+                "low": "You can not get the current low price", 
+                "close": "You can not get the next close price",
+                "volume": "You can not get the current volume",
+            },
+        }
+    else:
+        return {
+            "symbol": symbol,
+            "date": date,
+            "ohlcv": {
+                "open": day.get("1. buy price"),
+                "high": day.get("2. high"),
+                "low": day.get("3. low"), 
+                "close": day.get("4. sell price"),
+                "volume": day.get("5. volume"),
+            },
+        }
+
+
+def get_price_local_hourly(symbol: str, date: str, snapshot: Optional[PriceSnapshot] = None) -> Dict[str, Any]:
     """Read OHLCV data for specified stock and date. Get historical information for specified stock.
 
     Args:
         symbol: Stock symbol, e.g. 'IBM' or '600243.SHH'.
         date: Date in 'YYYY-MM-DD' format.
+        snapshot: Optional warm price snapshot to read from.
 
     Returns:
         Dictionary containing symbol, date and ohlcv data.
@@ -182,53 +438,46 @@ def get_price_local_hourly(symbol: str, date: str) -> Dict[str, Any]:
     except ValueError as e:
         return {"error": str(e), "symbol": symbol, "date": date}
 
-    data_path = _workspace_data_path(filename)
+    data_path = _workspace_data_path(filename, symbol)
     if not data_path.exists():
         return {"error": f"Data file not found: {data_path}", "symbol": symbol, "date": date}
 
-    with data_path.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            doc = json.loads(line)
-            meta = doc.get("Meta Data", {})
-            if meta.get("2. Symbol") != symbol:
-                continue
-            series = doc.get("Time Series (60min)", {})
-            day = series.get(date)
-            if day is None:
-                sample_dates = sorted(series.keys(), reverse=True)[:5]
-                return {
-                    "error": f"Data not found for date {date}. Please verify the date exists in data. Sample available dates: {sample_dates}",
-                    "symbol": symbol,
-                    "date": date
-                }
-            if date == get_config_value("TODAY_DATE"):
-                return {
-                    "symbol": symbol,
-                    "date": date,
-                    "ohlcv": {
-                        "open": day.get("1. buy price"),
-                        "high": "You can not get the current high price",
-                        "low": "You can not get the current low price", 
-                        "close": "You can not get the next close price",
-                        "volume": "You can not get the current volume",
-                    },
-                }
-            else:
-                return {
-                    "symbol": symbol,
-                    "date": date,
-                    "ohlcv": {
-                        "open": day.get("1. buy price"),
-                        "high": day.get("2. high"),
-                        "low": day.get("3. low"), 
-                        "close": day.get("4. sell price"),
-                        "volume": day.get("5. volume"),
-                    },
-                }
-
-    return {"error": f"No records found for stock {symbol} in local data", "symbol": symbol, "date": date}
+    doc = _read_symbol_doc(data_path, symbol, snapshot)
+    if doc is None:
+        return {"error": f"No records found for stock {symbol} in local data", "symbol": symbol, "date": date}
+    series = doc.get("Time Series (60min)", {})
+    day = series.get(date)
+    if day is None:
+        sample_dates = sorted(series.keys(), reverse=True)[:5]
+        return {
+            "error": f"Data not found for date {date}. Please verify the date exists in data. Sample available dates: {sample_dates}",
+            "symbol": symbol,
+            "date": date
+        }
+    if date == get_config_value("TODAY_DATE"):
+        return {
+            "symbol": symbol,
+            "date": date,
+            "ohlcv": {
+                "open": day.get("1. buy price"),
+                "high": "You can not get the current high price",
+                "low": "You can not get the current low price", 
+                "close": "You can not get the next close price",
+                "volume": "You can not get the current volume",
+            },
+        }
+    else:
+        return {
+            "symbol": symbol,
+            "date": date,
+            "ohlcv": {
+                "open": day.get("1. buy price"),
+                "high": day.get("2. high"),
+                "low": day.get("3. low"), 
+                "close": day.get("4. sell price"),
+                "volume": day.get("5. volume"),
+            },
+        }
 
 
 def get_price_local_function(symbol: str, date: str, filename: str = "merged.jsonl") -> Dict[str, Any]:
@@ -251,39 +500,35 @@ def get_price_local_function(symbol: str, date: str, filename: str = "merged.jso
     if not data_path.exists():
         return {"error": f"Data file not found: {data_path}", "symbol": symbol, "date": date}
 
-    with data_path.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            doc = json.loads(line)
-            meta = doc.get("Meta Data", {})
-            if meta.get("2. Symbol") != symbol:
-                continue
-            series = doc.get("Time Series (Daily)", {})
-            day = series.get(date)
-            if day is None:
-                sample_dates = sorted(series.keys(), reverse=True)[:5]
-                return {
-                    "error": f"Data not found for date {date}. Please verify the date exists in data. Sample available dates: {sample_dates}",
-                    "symbol": symbol,
-                    "date": date,
-                }
-            return {
-                "symbol": symbol,
-                "date": date,
-                "ohlcv": {
-                    "buy price": day.get("1. buy price"),
-                    "high": day.get("2. high"),
-                    "low": day.get("3. low"),
-                    "sell price": day.get("4. sell price"),
-                    "volume": day.get("5. volume"),
-                },
-            }
-
-    return {"error": f"No records found for stock {symbol} in local data", "symbol": symbol, "date": date}
+    doc = _read_symbol_doc(data_path, symbol, _snapshot())
+    if doc is None:
+        return {"error": f"No records found for stock {symbol} in local data", "symbol": symbol, "date": date}
+    series = doc.get("Time Series (Daily)", {})
+    day = series.get(date)
+    if day is None:
+        sample_dates = sorted(series.keys(), reverse=True)[:5]
+        return {
+            "error": f"Data not found for date {date}. Please verify the date exists in data. Sample available dates: {sample_dates}",
+            "symbol": symbol,
+            "date": date,
+        }
+    return {
+        "symbol": symbol,
+        "date": date,
+        "ohlcv": {
+            "buy price": day.get("1. buy price"),
+            "high": day.get("2. high"),
+            "low": day.get("3. low"),
+            "sell price": day.get("4. sell price"),
+            "volume": day.get("5. volume"),
+        },
+    }
 
 
 if __name__ == "__main__":
-    
+    # Keep every market's prices parsed in memory and reload them when the data pipeline rewrites a file
+    reload_interval = float(os.getenv("PRICE_RELOAD_INTERVAL", "5"))
+    _watcher = PriceCacheWatcher([get_merged_file_path(m) for m in ("us", "cn", "crypto")], reload_interval).start()
+
     port = int(os.getenv("GETPRICE_HTTP_PORT", "8003"))
     mcp.run(transport="streamable-http", port=port)
@@ -1,48 +1,25 @@
+import json
 import os
 import sys
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List
 
 from fastmcp import FastMCP
 
-from typing import Dict, List, Optional, Any
-import fcntl
-from pathlib import Path
 # Add project root directory to Python path
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
-import json
 
 from tools.general_tools import get_config_value, write_config_value
-from tools.price_tools import (get_latest_position, get_open_prices,
-                               get_yesterday_date,
-                               get_yesterday_open_and_close_price,
-                               get_yesterday_profit)
+from tools.holdings import CASH_SCALE
+from tools.ledger import get_position_ledger
+from tools.order_batch import execute_order_batch, execute_rebalance
+from tools.order_executor import submit_order
+from tools.price_tools import get_open_prices
 
 mcp = FastMCP("TradeTools")
 
-def _position_lock(signature: str):
-    """Context manager for file-based lock to serialize position updates per signature."""
-    class _Lock:
-        def __init__(self, name: str):
-            base_dir = Path(project_root) / "data" / "agent_data" / name
-            base_dir.mkdir(parents=True, exist_ok=True)
-            self.lock_path = base_dir / ".position.lock"
-            # Ensure lock file exists
-            self._fh = open(self.lock_path, "a+")
-        def __enter__(self):
-            fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
-            return self
-        def __exit__(self, exc_type, exc, tb):
-            try:
-                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
-            finally:
-                self._fh.close()
-    return _Lock(signature)
-
-
-
 @mcp.tool()
-def buy(symbol: str, amount: int) -> Dict[str, Any]:
+async def buy(symbol: str, amount: int) -> Dict[str, Any]:
     """
     Buy stock function
 
@@ -115,17 +92,24 @@ def buy(symbol: str, amount: int) -> Dict[str, Any]:
             "suggestion": f"Please use {(amount // 100) * 100} or {((amount // 100) + 1) * 100} shares instead.",
         }
 
+    # Steps 2-7 run on the signature's order executor, which serializes them with all other
+    # orders for this signature and fsyncs position.jsonl once per batch of orders
+    return await submit_order(signature, _execute_buy, today_date, symbol, amount, market)
+
+
+def _execute_buy(signature: str, today_date: str, symbol: str, amount: int, market: str) -> Dict[str, Any]:
+    """Steps 2-7 of buy, run by the signature's OrderExecutor with position_lock held."""
     # Step 2: Get current latest position and operation ID
-    # get_latest_position returns two values: position dictionary and current maximum operation ID
+    # latest_holdings returns two values: fixed-point holdings and current maximum operation ID
     # This ID is used to ensure each operation has a unique identifier
-    # Acquire lock for atomic read-modify-write on positions
-    with _position_lock(signature):
-        try:
-            current_position, current_action_id = get_latest_position(today_date, signature)
-        except Exception as e:
-            print(e)
-            print(today_date, signature)
-            return {"error": f"Failed to load latest position: {e}", "symbol": symbol, "date": today_date}
+    # The ledger keeps the last record's fixed-point holdings, so no position dict is converted here
+    ledger = get_position_ledger(signature)
+    try:
+        holdings, current_action_id = ledger.latest_holdings(today_date, market)
+    except Exception as e:
+        print(e)
+        print(today_date, signature)
+        return {"error": f"Failed to load latest position: {e}", "symbol": symbol, "date": today_date}
     # Step 3: Get stock opening price for the day
     # Use get_open_prices function to get the opening price of specified stock for the day
     # If stock symbol does not exist or price data is missing, KeyError exception will be raised
@@ -140,102 +124,45 @@ def buy(symbol: str, amount: int) -> Dict[str, Any]:
         }
 
     # Step 4: Validate buy conditions
-    # Calculate cash required for purchase: stock price × buy quantity
-    try:
-        cash_left = current_position["CASH"] - this_symbol_price * amount
-    except Exception as e:
-        print(current_position, "CASH", this_symbol_price, amount)
+    # Calculate cash required for purchase: stock price × buy quantity, in fixed-point cash units
+    required_cash = holdings.trade_cash_units(amount, this_symbol_price)
 
     # Check if cash balance is sufficient for purchase
-    if cash_left < 0:
+    if holdings.cash - required_cash < 0:
         # Insufficient cash, return error message
         return {
             "error": "Insufficient cash! This action will not be allowed.",
-            "required_cash": this_symbol_price * amount,
-            "cash_available": current_position.get("CASH", 0),
+            "required_cash": required_cash / CASH_SCALE,
+            "cash_available": holdings.cash_value,
             "symbol": symbol,
             "date": today_date,
         }
     else:
         # Step 5: Execute buy operation, update position
-        # Create a copy of current position to avoid directly modifying original data
-        new_position = current_position.copy()
-
-        # Decrease cash balance
-        new_position["CASH"] = cash_left
-
-        # Increase stock position quantity
-        new_position[symbol] += amount
+        # Decrease cash balance and increase stock position quantity (integer arithmetic only)
+        holdings.buy(symbol, amount, this_symbol_price)
+        new_position = holdings.to_positions()
 
         # Step 6: Record transaction to position.jsonl file
-        # Build file path: {project_root}/data/{log_path}/{signature}/position/position.jsonl
-        # Use append mode ("a") to write new transaction record
+        # Appended through the signature's PositionLedger, which then only parses the new line
         # Each operation ID increments by 1, ensuring uniqueness of operation sequence
-        log_path = get_config_value("LOG_PATH", "./data/agent_data")
-        if log_path.startswith("./data/"):
-            log_path = log_path[7:]  # Remove "./data/" prefix
-        position_file_path = os.path.join(project_root, "data", log_path, signature, "position", "position.jsonl")
-        with open(position_file_path, "a") as f:
-            # Write JSON format transaction record, containing date, operation ID, transaction details and updated position
-            print(
-                f"Writing to position.jsonl: {json.dumps({'date': today_date, 'id': current_action_id + 1, 'this_action':{'action':'buy','symbol':symbol,'amount':amount},'positions': new_position})}"
-            )
-            f.write(
-                json.dumps(
-                    {
-                        "date": today_date,
-                        "id": current_action_id + 1,
-                        "this_action": {"action": "buy", "symbol": symbol, "amount": amount},
-                        "positions": new_position,
-                    }
-                )
-                + "\n"
-            )
+        record = {
+            "date": today_date,
+            "id": current_action_id + 1,
+            "this_action": {"action": "buy", "symbol": symbol, "amount": amount},
+            "positions": new_position,
+        }
+        print(f"Writing to position.jsonl: {json.dumps(record)}")
+        ledger.append(record, holdings)
+
         # Step 7: Return updated position
         write_config_value("IF_TRADE", True)
         print("IF_TRADE", get_config_value("IF_TRADE"))
         return new_position
 
 
-def _get_today_buy_amount(symbol: str, today_date: str, signature: str) -> int:
-    """
-    Helper function to get the total amount bought today for T+1 restriction check
-
-    Args:
-        symbol: Stock symbol
-        today_date: Trading date
-        signature: Model signature
-
-    Returns:
-        Total shares bought today
-    """
-    log_path = get_config_value("LOG_PATH", "./data/agent_data")
-    if log_path.startswith("./data/"):
-        log_path = log_path[7:]  # Remove "./data/" prefix
-    position_file_path = os.path.join(project_root, "data", log_path, signature, "position", "position.jsonl")
-
-    if not os.path.exists(position_file_path):
-        return 0
-
-    total_bought_today = 0
-    with open(position_file_path, "r") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                record = json.loads(line)
-                if record.get("date") == today_date:
-                    this_action = record.get("this_action", {})
-                    if this_action.get("action") == "buy" and this_action.get("symbol") == symbol:
-                        total_bought_today += this_action.get("amount", 0)
-            except Exception:
-                continue
-
-    return total_bought_today
-
-
 @mcp.tool()
-def sell(symbol: str, amount: int) -> Dict[str, Any]:
+async def sell(symbol: str, amount: int) -> Dict[str, Any]:
     """
     Sell stock function
 
@@ -309,10 +236,19 @@ def sell(symbol: str, amount: int) -> Dict[str, Any]:
             "suggestion": f"Please use {(amount // 100) * 100} or {((amount // 100) + 1) * 100} shares instead.",
         }
 
+    # Steps 2-7 run on the signature's order executor, which serializes them with all other
+    # orders for this signature and fsyncs position.jsonl once per batch of orders
+    return await submit_order(signature, _execute_sell, today_date, symbol, amount, market)
+
+
+def _execute_sell(signature: str, today_date: str, symbol: str, amount: int, market: str) -> Dict[str, Any]:
+    """Steps 2-7 of sell, run by the signature's OrderExecutor with position_lock held."""
     # Step 2: Get current latest position and operation ID
-    # get_latest_position returns two values: position dictionary and current maximum operation ID
+    # latest_holdings returns two values: fixed-point holdings and current maximum operation ID
     # This ID is used to ensure each operation has a unique identifier
-    current_position, current_action_id = get_latest_position(today_date, signature)
+    # The ledger keeps the last record's fixed-point holdings, so no position dict is converted here
+    ledger = get_position_ledger(signature)
+    holdings, current_action_id = ledger.latest_holdings(today_date, market)
 
     # Step 3: Get stock opening price for the day
     # Use get_open_prices function to get the opening price of specified stock for the day
@@ -329,7 +265,8 @@ def sell(symbol: str, amount: int) -> Dict[str, Any]:
 
     # Step 4: Validate sell conditions
     # Check if holding this stock
-    if symbol not in current_position:
+    have = holdings.units(symbol)
+    if have == 0:
         return {
             "error": f"No position for {symbol}! This action will not be allowed.",
             "symbol": symbol,
@@ -337,10 +274,10 @@ def sell(symbol: str, amount: int) -> Dict[str, Any]:
         }
 
     # Check if position quantity is sufficient for selling
-    if current_position[symbol] < amount:
+    if have < amount:
         return {
             "error": "Insufficient shares! This action will not be allowed.",
-            "have": current_position.get(symbol, 0),
+            "have": have,
             "want_to_sell": amount,
             "symbol": symbol,
             "date": today_date,
@@ -348,15 +285,16 @@ def sell(symbol: str, amount: int) -> Dict[str, Any]:
 
     # 🇨🇳 Chinese A-shares T+1 trading rule: Cannot sell shares bought on the same day
     if market == "cn":
-        bought_today = _get_today_buy_amount(symbol, today_date, signature)
+        # The ledger's settlement book tracks today's buys, no need to rescan position.jsonl
+        bought_today = ledger.bought_on(today_date, symbol)
         if bought_today > 0:
             # Calculate sellable quantity (total position - bought today)
-            sellable_amount = current_position[symbol] - bought_today
+            sellable_amount = have - bought_today
             if amount > sellable_amount:
                 return {
                     "error": f"T+1 restriction violated! You bought {bought_today} shares of {symbol} today and cannot sell them until tomorrow.",
                     "symbol": symbol,
-                    "total_position": current_position[symbol],
+                    "total_position": have,
                     "bought_today": bought_today,
                     "sellable_today": max(0, sellable_amount),
                     "want_to_sell": amount,
@@ -364,46 +302,88 @@ def sell(symbol: str, amount: int) -> Dict[str, Any]:
                 }
 
     # Step 5: Execute sell operation, update position
-    # Create a copy of current position to avoid directly modifying original data
-    new_position = current_position.copy()
-
-    # Decrease stock position quantity
-    new_position[symbol] -= amount
-
-    # Increase cash balance: sell price × sell quantity
-    # Use get method to ensure CASH field exists, default to 0 if not present
-    new_position["CASH"] = new_position.get("CASH", 0) + this_symbol_price * amount
+    # Decrease stock position quantity and increase cash balance by sell price × sell quantity
+    holdings.sell(symbol, amount, this_symbol_price)
+    new_position = holdings.to_positions()
 
     # Step 6: Record transaction to position.jsonl file
-    # Build file path: {project_root}/data/{log_path}/{signature}/position/position.jsonl
-    # Use append mode ("a") to write new transaction record
+    # Appended through the signature's PositionLedger, which then only parses the new line
     # Each operation ID increments by 1, ensuring uniqueness of operation sequence
-    log_path = get_config_value("LOG_PATH", "./data/agent_data")
-    if log_path.startswith("./data/"):
-        log_path = log_path[7:]  # Remove "./data/" prefix
-    position_file_path = os.path.join(project_root, "data", log_path, signature, "position", "position.jsonl")
-    with open(position_file_path, "a") as f:
-        # Write JSON format transaction record, containing date, operation ID and updated position
-        print(
-            f"Writing to position.jsonl: {json.dumps({'date': today_date, 'id': current_action_id + 1, 'this_action':{'action':'sell','symbol':symbol,'amount':amount},'positions': new_position})}"
-        )
-        f.write(
-            json.dumps(
-                {
-                    "date": today_date,
-                    "id": current_action_id + 1,
-                    "this_action": {"action": "sell", "symbol": symbol, "amount": amount},
-                    "positions": new_position,
-                }
-            )
-            + "\n"
-        )
+    record = {
+        "date": today_date,
+        "id": current_action_id + 1,
+        "this_action": {"action": "sell", "symbol": symbol, "amount": amount},
+        "positions": new_position,
+    }
+    print(f"Writing to position.jsonl: {json.dumps(record)}")
+    ledger.append(record, holdings)
 
     # Step 7: Return updated position
     write_config_value("IF_TRADE", True)
     return new_position
 
 
+@mcp.tool()
+async def execute_orders(orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Execute a batch of stock orders atomically
+
+    All orders are validated in the given order against one snapshot of the current position
+    (cash freed by an earlier sell can pay for a later buy). If every order is valid they are all
+    recorded at once; if any order is invalid, none is executed and each problem is reported.
+    Prefer this over many separate buy/sell calls when rebalancing.
+
+    Args:
+        orders: List of orders, each {"action": "buy" or "sell", "symbol": str, "amount": number}
+
+    Returns:
+        Dict[str, Any]:
+          - Success: {"executed": [orders with their ids], "positions": new position dictionary, "date": ...}
+          - Failure: {"error": error message, "rejected": [{"index", "order", "error"}, ...], "date": ...}
+
+    Example:
+        >>> result = execute_orders([{"action": "sell", "symbol": "AAPL", "amount": 10}, {"action": "buy", "symbol": "MSFT", "amount": 5}])
+    """
+    signature = get_config_value("SIGNATURE")
+    if signature is None:
+        raise ValueError("SIGNATURE environment variable is not set")
+    today_date = get_config_value("TODAY_DATE")
+
+    # The whole batch runs as one step on the signature's order executor
+    return await submit_order(signature, execute_order_batch, today_date, orders, None)
+
+
+@mcp.tool()
+async def rebalance_to_weights(weights: Dict[str, float], cash_buffer: float = 0.0) -> Dict[str, Any]:
+    """
+    Rebalance the portfolio to target weights in one atomic step
+
+    Computes, at today's buy prices, the quantity of every symbol that makes it the given fraction of
+    the total portfolio value, rounded down to tradable amounts (100-share lots for A-shares, whole
+    shares for US stocks, 4 decimals for crypto). Held symbols missing from weights are sold. The
+    resulting sells and buys are executed together like execute_orders: all of them or none.
+
+    Args:
+        weights: Target weight per symbol, e.g. {"AAPL": 0.25}; weights must sum to at most 1
+        cash_buffer: Fraction of the portfolio value to keep in cash, between 0 and 1
+
+    Returns:
+        Dict[str, Any]:
+          - Success: {"executed": [...], "positions": new position dictionary, "orders": [...], "date": ...}
+          - Failure: {"error": error message, ...}
+
+    Example:
+        >>> result = rebalance_to_weights({"AAPL": 0.3, "MSFT": 0.3, "NVDA": 0.3}, 0.05)
+    """
+    signature = get_config_value("SIGNATURE")
+    if signature is None:
+        raise ValueError("SIGNATURE environment variable is not set")
+    today_date = get_config_value("TODAY_DATE")
+
+    # Planning and execution run as one step on the signature's order executor
+    return await submit_order(signature, execute_rebalance, today_date, weights, cash_buffer, None)
+
+
 if __name__ == "__main__":
     # new_result = buy("AAPL", 1)
     # print(new_result)
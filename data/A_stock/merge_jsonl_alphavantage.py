@@ -2,8 +2,13 @@ import glob
 import json
 import os
 import csv
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tools.price_db import price_backend, write_price_db
+from tools.price_index import write_symbol_index
+
 sse_50_codes = [
     "600519.SHH",
     "601318.SHH",
@@ -158,3 +163,9 @@ print(f"   - 成功处理: {processed_count} 个文件")
 print(f"   - 跳过文件: {skipped_count} 个文件")
 print(f"   - 输出文件: {output_file}")
 
+# 生成 symbol -> (字节偏移, 长度) 的侧车索引，价格服务据此一次 seek 读取单个标的
+print(f"Symbol index written to: {write_symbol_index(output_file)}")
+
+# PRICE_BACKEND=sqlite 时同步写入 SQLite 价格库（bars 表）
+if price_backend() == "sqlite":
+    print(f"Price database written to: {write_price_db(output_file, 'cn')}")
@@ -1,10 +1,15 @@
 import json
 import os
+import sys
 from pathlib import Path
 from typing import Any, Dict
 
 import pandas as pd
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tools.price_db import price_backend, write_price_db
+from tools.price_index import write_symbol_index
+
 
 def convert_a_stock_to_jsonl(
     csv_path: str = "daily_prices_sse_50.csv",
@@ -112,6 +117,13 @@ def convert_a_stock_to_jsonl(
     print(f"✅ Total stocks: {len(grouped)}")
     print(f"✅ File size: {output_path.stat().st_size / 1024 / 1024:.2f} MB")
 
+    # Emit the symbol -> (byte offset, length) sidecar for O(1) single-symbol reads
+    print(f"✅ Symbol index: {write_symbol_index(output_path)}")
+
+    # Load the bars table as well when running with PRICE_BACKEND=sqlite
+    if price_backend() == "sqlite":
+        print(f"✅ Price database: {write_price_db(output_path, 'cn')}")
+
 
 if __name__ == "__main__":
     # Convert A-share data to JSONL format
@@ -20,9 +20,14 @@ import glob
 import json
 import os
 import shutil
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tools.price_db import price_backend, write_price_db
+from tools.price_index import write_symbol_index
+
 load_dotenv()
 
 # Major cryptocurrencies against USDT (using USD as proxy on Alpha Vantage)
@@ -204,5 +209,12 @@ print(f"\nCrypto merge complete! Output saved to: {output_file}")
 processed_count = len([f for f in files if any(symbol in os.path.basename(f) for symbol in crypto_symbols_usdt)])
 print(f"Total symbols processed: {processed_count}")
 
+# Emit the symbol -> (byte offset, length) sidecar so the price server reads one symbol with a single seek
+print(f"Symbol index written to: {write_symbol_index(output_file)}")
+
+# Load the bars table as well when running with PRICE_BACKEND=sqlite
+if price_backend() == "sqlite":
+    print(f"Price database written to: {write_price_db(output_file, 'crypto')}")
+
 # Verify that symbol fixes were applied correctly
 verify_symbol_fixes()
\ No newline at end of file
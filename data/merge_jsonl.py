@@ -1,6 +1,12 @@
 import glob
 import json
 import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from tools.price_db import price_backend, write_price_db
+from tools.price_index import write_symbol_index
 
 all_nasdaq_100_symbols = [
     "NVDA",
@@ -154,3 +160,10 @@ with open(output_file, "w", encoding="utf-8") as fout:
             pass
 
         fout.write(json.dumps(data, ensure_ascii=False) + "\n")
+
+# 生成 symbol -> (字节偏移, 长度) 的侧车索引，价格服务据此一次 seek 读取单个标的
+print(f"Symbol index written to: {write_symbol_index(output_file)}")
+
+# PRICE_BACKEND=sqlite 时同步写入 SQLite 价格库（bars 表）
+if price_backend() == "sqlite":
+    print(f"Price database written to: {write_price_db(output_file, 'us')}")
@@ -10,7 +10,7 @@ load_dotenv()
 
 from prompts.agent_prompt import all_nasdaq_100_symbols
 # Import tools and prompts
-from tools.general_tools import get_config_value, write_config_value
+from tools.general_tools import get_config_value, write_config_values
 
 # Agent class mapping table - for dynamic import and instantiation
 AGENT_REGISTRY = {
@@ -226,10 +226,7 @@ async def main(config_path=None):
                 print(f"🔄 Position file not found, cleared config for fresh start from {INIT_DATE}")
         
         # Write config values to shared config file (from .env RUNTIME_ENV_PATH)
-        write_config_value("SIGNATURE", signature)
-        write_config_value("IF_TRADE", False)
-        write_config_value("MARKET", market)
-        write_config_value("LOG_PATH", log_path)
+        write_config_values({"SIGNATURE": signature, "IF_TRADE": False, "MARKET": market, "LOG_PATH": log_path})
         
         print(f"✅ Runtime config initialized: SIGNATURE={signature}, MARKET={market}")
 
@@ -6,11 +6,29 @@ import json
 from pathlib import Path
 from dotenv import load_dotenv
 import argparse
+import shutil
+import time
+from contextlib import nullcontext
 load_dotenv()
 
 # Import tools and prompts
-from tools.general_tools import write_config_value
-from prompts.agent_prompt import all_nasdaq_100_symbols
+from tools.general_tools import (
+    get_session_mcp_config,
+    get_session_runtime_env_path,
+    use_session_context,
+    write_config_values,
+)
+from tools.price_cube import SHARED_CUBES_ENV, publish_shared_cubes
+from tools.price_tools import get_merged_file_path
+from tools.rate_limiter import (
+    RATE_LIMIT_DIR_ENV,
+    TokenBucket,
+    create_run_rate_limit_dir,
+    get_provider_key,
+    get_rate_limit,
+    get_rate_limiter,
+)
+from prompts.agent_prompt import all_nasdaq_100_symbols, all_sse_50_symbols
 
 
 # Agent class mapping table - for dynamic import and instantiation
@@ -97,12 +115,55 @@ def load_config(config_path=None):
         exit(1)
 
 
-async def _run_model_in_current_process(AgentClass, model_config, INIT_DATE, END_DATE, agent_config, log_config):
+class _SharedMCPTools:
+    """One MCP client and tool list for all in-process agents, loaded by the first agent that asks.
+
+    The tools send each call's session context as headers (see
+    get_session_mcp_config), so they need not be rebuilt per agent or per day.
+    """
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.client = None
+        self.tools = None
+
+    async def get(self, mcp_config):
+        async with self.lock:
+            if self.tools is None:
+                from langchain_mcp_adapters.client import MultiServerMCPClient
+
+                client = MultiServerMCPClient(get_session_mcp_config(mcp_config))
+                self.tools = await client.get_tools()
+                self.client = client
+        return self.client, self.tools
+
+
+async def _run_model_in_current_process(
+    AgentClass,
+    model_config,
+    INIT_DATE,
+    END_DATE,
+    agent_config,
+    log_config,
+    inproc=False,
+    llm_semaphore=None,
+    http_async_client=None,
+    rate_limiter=None,
+    mcp_tools=None,
+):
+    """Run one model's date range in this process.
+
+    Args:
+        inproc: Other models share this process; keep SIGNATURE (and so the
+            runtime env file) in a task-scoped session context instead of os.environ
+        llm_semaphore: Semaphore bounding concurrent LLM calls across models
+        http_async_client: Shared httpx.AsyncClient (connection pool) for the LLM API
+        rate_limiter: RateLimitCallback of the model's provider, None for no limit
+        mcp_tools: _SharedMCPTools of the runner, None to let the agent load its own
+    """
     model_name = model_config.get("name", "unknown")
     basemodel = model_config.get("basemodel")
     signature = model_config.get("signature")
-    openai_base_url = model_config.get("openai_base_url", None)
-    openai_api_key = model_config.get("openai_api_key", None)
 
     if not basemodel:
         print(f"❌ Model {model_name} missing basemodel field")
@@ -116,30 +177,66 @@ async def _run_model_in_current_process(AgentClass, model_config, INIT_DATE, END
     print(f"📝 Signature: {signature}")
     print(f"🔧 BaseModel: {basemodel}")
 
-    project_root = Path(__file__).resolve().parent
-    runtime_env_dir = project_root / "data" / "agent_data" / signature
-    runtime_env_dir.mkdir(parents=True, exist_ok=True)
-    runtime_env_path = runtime_env_dir / ".runtime_env.json"
-    os.environ["RUNTIME_ENV_PATH"] = str(runtime_env_path)
-    os.environ["SIGNATURE"] = signature
-    write_config_value("TODAY_DATE", END_DATE)
-    write_config_value("IF_TRADE", False)
+    try:
+        runtime_env_path = Path(get_session_runtime_env_path(signature))
+    except ValueError as e:
+        print(f"❌ Model {model_name}: {e}")
+        return
+    runtime_env_path.parent.mkdir(parents=True, exist_ok=True)
+    log_path = log_config.get("log_path", "./data/agent_data")
+    if inproc:
+        # asyncio tasks copy the context, so each model task sees only its own session
+        session = use_session_context({"SIGNATURE": signature, "LOG_PATH": log_path})
+    else:
+        os.environ["RUNTIME_ENV_PATH"] = str(runtime_env_path)
+        os.environ["SIGNATURE"] = signature
+        session = nullcontext()
+    with session:
+        await _run_agent(
+            AgentClass,
+            model_config,
+            INIT_DATE,
+            END_DATE,
+            agent_config,
+            log_path,
+            llm_semaphore,
+            http_async_client,
+            rate_limiter,
+            mcp_tools,
+        )
+
+
+async def _run_agent(
+    AgentClass,
+    model_config,
+    INIT_DATE,
+    END_DATE,
+    agent_config,
+    log_path,
+    llm_semaphore,
+    http_async_client,
+    rate_limiter,
+    mcp_tools=None,
+):
+    model_name = model_config.get("name", "unknown")
+    signature = model_config.get("signature")
+    market = model_config.get("market", "us")
+    write_config_values({"TODAY_DATE": END_DATE, "IF_TRADE": False})
 
     max_steps = agent_config.get("max_steps", 10)
     max_retries = agent_config.get("max_retries", 3)
     base_delay = agent_config.get("base_delay", 0.5)
     initial_cash = agent_config.get("initial_cash", 10000.0)
 
-    log_path = log_config.get("log_path", "./data/agent_data")
-
     try:
         agent = AgentClass(
             signature=signature,
-            basemodel=basemodel,
-            stock_symbols=all_nasdaq_100_symbols,
+            basemodel=model_config.get("basemodel"),
+            stock_symbols=all_sse_50_symbols if market == "cn" else all_nasdaq_100_symbols,
+            market=market,
             log_path=log_path,
-            openai_base_url=openai_base_url,
-            openai_api_key=openai_api_key,
+            openai_base_url=model_config.get("openai_base_url", None),
+            openai_api_key=model_config.get("openai_api_key", None),
             max_steps=max_steps,
             max_retries=max_retries,
             base_delay=base_delay,
@@ -147,6 +244,12 @@ async def _run_model_in_current_process(AgentClass, model_config, INIT_DATE, END
             init_date=INIT_DATE
         )
 
+        agent.llm_semaphore = llm_semaphore
+        agent.http_async_client = http_async_client
+        agent.rate_limiter = rate_limiter
+        if mcp_tools is not None:
+            agent.client, agent.tools = await mcp_tools.get(agent.mcp_config)
+
         print(f"✅ {AgentClass.__name__} instance created successfully: {agent}")
         await agent.initialize()
         print("✅ Initialization successful")
@@ -168,32 +271,148 @@ async def _run_model_in_current_process(AgentClass, model_config, INIT_DATE, END
     print("=" * 60)
 
 
-async def _spawn_model_subprocesses(config_path, enabled_models):
-    tasks = []
+def _order_by_provider(enabled_models):
+    """Interleave models round-robin across providers (openai_base_url), so queued workers spread the load."""
+    groups = {}
+    for model in enabled_models:
+        groups.setdefault(get_provider_key(model), []).append(model)
+    ordered = []
+    queues = list(groups.values())
+    while any(queues):
+        for queue in queues:
+            if queue:
+                ordered.append(queue.pop(0))
+    return ordered
+
+
+async def _in_worker_slot(slots, run_stats, model, run):
+    """Wait for a free worker slot, run the model and record its queueing and run time."""
+    queued_at = time.monotonic()
+    async with slots:
+        started_at = time.monotonic()
+        status = "ok"
+        try:
+            await run()
+        except Exception as e:
+            status = f"failed: {e}"
+            print(f"❌ Model {model.get('signature')} failed: {e}")
+        run_stats.append(
+            {
+                "signature": model.get("signature"),
+                "provider": get_provider_key(model),
+                "queued_seconds": started_at - queued_at,
+                "run_seconds": time.monotonic() - started_at,
+                "status": status,
+            }
+        )
+
+
+async def _spawn_model_subprocesses(config_path, enabled_models, max_workers, run_stats):
+    slots = asyncio.Semaphore(max_workers)
     python_exec = sys.executable
     this_file = str(Path(__file__).resolve())
-    for model in enabled_models:
-        signature = model.get("signature")
-        if not signature:
-            continue
-        cmd = [python_exec, this_file]
-        if config_path:
-            cmd.append(str(config_path))
-        cmd.extend(["--signature", signature])
-        print(f"🧩 Spawning subprocess for signature='{signature}': {' '.join(cmd)}")
-        proc = await asyncio.create_subprocess_exec(*cmd)
-        tasks.append(proc.wait())
+
+    def runner(signature):
+        async def run():
+            cmd = [python_exec, this_file]
+            if config_path:
+                cmd.append(str(config_path))
+            cmd.extend(["--signature", signature])
+            print(f"🧩 Spawning subprocess for signature='{signature}': {' '.join(cmd)}")
+            proc = await asyncio.create_subprocess_exec(*cmd)
+            returncode = await proc.wait()
+            if returncode != 0:
+                raise RuntimeError(f"subprocess exited with code {returncode}")
+        return run
+
+    tasks = [
+        _in_worker_slot(slots, run_stats, model, runner(model["signature"]))
+        for model in enabled_models
+        if model.get("signature")
+    ]
     if not tasks:
         return
     await asyncio.gather(*tasks)
 
 
-async def main(config_path=None, only_signature: str | None = None):
+async def _run_models_inproc(
+    AgentClass, enabled_models, INIT_DATE, END_DATE, agent_config, log_config, max_llm_calls, max_workers,
+    scheduler_config, run_stats
+):
+    """Run all models as asyncio tasks in this process.
+
+    The models share the price store, one HTTP connection pool for the LLM API,
+    the per-provider rate limiters and one MCP client and tool list (each tool
+    call sends its agent's session headers). At most max_workers models run and at most
+    max_llm_calls LLM calls are in flight at once. One model failing does not
+    stop the others.
+    """
+    import httpx
+
+    slots = asyncio.Semaphore(max_workers)
+    llm_semaphore = asyncio.Semaphore(max_llm_calls)
+    mcp_tools = _SharedMCPTools()
+    limits = httpx.Limits(max_connections=max(max_llm_calls * 2, 10), max_keepalive_connections=max_llm_calls)
+    async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(30.0)) as http_async_client:
+
+        def runner(model_config):
+            return lambda: _run_model_in_current_process(
+                AgentClass,
+                model_config,
+                INIT_DATE,
+                END_DATE,
+                agent_config,
+                log_config,
+                inproc=True,
+                llm_semaphore=llm_semaphore,
+                http_async_client=http_async_client,
+                rate_limiter=get_rate_limiter(model_config, scheduler_config),
+                mcp_tools=mcp_tools,
+            )
+
+        await asyncio.gather(
+            *[_in_worker_slot(slots, run_stats, model_config, runner(model_config)) for model_config in enabled_models]
+        )
+
+
+def _print_run_summary(enabled_models, scheduler_config, max_workers, run_stats):
+    """Print worker queueing per model and rate limits and usage per provider."""
+    print("=" * 60)
+    print(f"📋 Run summary (max {max_workers} concurrent models)")
+    for stat in run_stats:
+        print(
+            f"   - {stat['signature']}: queued {stat['queued_seconds']:.1f}s, "
+            f"ran {stat['run_seconds']:.1f}s, {stat['status']}"
+        )
+    for provider in sorted({get_provider_key(m) for m in enabled_models}):
+        limit = get_rate_limit(scheduler_config, provider)
+        if not limit.get("rpm") and not limit.get("tpm"):
+            print(f"   🌐 {provider}: no rate limit")
+            continue
+        stats = TokenBucket(provider, limit.get("rpm"), limit.get("tpm")).stats()
+        print(
+            f"   🌐 {provider}: limit rpm={limit.get('rpm') or '-'} tpm={limit.get('tpm') or '-'}; "
+            f"{stats['requests']} requests, {int(stats['tokens'])} tokens, "
+            f"{stats['waits']} throttled ({stats['wait_seconds']:.1f}s waiting)"
+        )
+    print("=" * 60)
+
+
+async def main(
+    config_path=None,
+    only_signature: str | None = None,
+    mode: str = "subprocess",
+    max_llm_calls: int = 8,
+    max_workers: int | None = None,
+):
     """Run trading experiment using Agent class (parallel runner)
     
     Args:
         config_path: Configuration file path, if None use default config
         only_signature: If provided, run only this model signature
+        mode: "subprocess" runs each model in its own process, "inproc" runs all models in this event loop
+        max_llm_calls: Most concurrent LLM calls across models in "inproc" mode
+        max_workers: Most models running at once, overrides scheduler.max_workers in the config
     """
     # Load configuration file
     config = load_config(config_path)
@@ -234,8 +453,10 @@ async def main(config_path=None, only_signature: str | None = None):
         exit(1)
 
     # Get model list from configuration file (only select enabled models)
+    # Each model trades the config's market unless it names its own
+    market = config.get("market", "us")
     enabled_models = [
-        model for model in config["models"] 
+        dict(model, market=model.get("market", market)) for model in config["models"] 
         if model.get("enabled", True)
     ]
     if only_signature:
@@ -244,6 +465,8 @@ async def main(config_path=None, only_signature: str | None = None):
     # Get agent configuration
     agent_config = config.get("agent_config", {})
     log_config = config.get("log_config", {})
+    scheduler_config = config.get("scheduler", {})
+    max_workers = max_workers or scheduler_config.get("max_workers") or max(len(enabled_models), 1)
 
     # Display enabled model information
     model_names = [m.get("name", m.get("signature")) for m in enabled_models]
@@ -251,21 +474,111 @@ async def main(config_path=None, only_signature: str | None = None):
     print(f"🤖 Agent type: {agent_type}")
     print(f"📅 Date range: {INIT_DATE} to {END_DATE}")
     print(f"🤖 Model list: {model_names}")
+    print(f"🌍 Markets: {', '.join(sorted({m['market'] for m in enabled_models}))}")
+
+    if only_signature:
+        # Subprocess of a parallel run (or a single model run): draw from the shared provider budget
+        for model_config in enabled_models:
+            await _run_model_in_current_process(
+                AgentClass,
+                model_config,
+                INIT_DATE,
+                END_DATE,
+                agent_config,
+                log_config,
+                rate_limiter=get_rate_limiter(model_config, scheduler_config),
+            )
+        print("🎉 All models processing completed!")
+        return
 
-    if len(enabled_models) <= 1:
+    # A new run gets its own bucket directory: every provider starts with a full budget and
+    # empty stats, and concurrent runs of other configs keep theirs. Subprocesses inherit it.
+    rate_limit_dir = create_run_rate_limit_dir(log_config.get("log_path", "./data/agent_data"))
+    os.environ[RATE_LIMIT_DIR_ENV] = str(rate_limit_dir)
+    try:
+        await _run_models(
+            AgentClass, config, config_path, enabled_models, INIT_DATE, END_DATE, agent_config, log_config,
+            scheduler_config, mode, max_llm_calls, max_workers,
+        )
+    finally:
+        shutil.rmtree(rate_limit_dir, ignore_errors=True)
+
+
+async def _run_models(
+    AgentClass, config, config_path, enabled_models, INIT_DATE, END_DATE, agent_config, log_config,
+    scheduler_config, mode, max_llm_calls, max_workers,
+):
+    """Run the enabled models in the chosen mode and print the run summary."""
+    enabled_models = _order_by_provider(enabled_models)
+    run_stats = []
+    if mode == "inproc":
+        print(
+            f"⚡ Running {len(enabled_models)} models in this process "
+            f"(at most {max_workers} at once, {max_llm_calls} concurrent LLM calls)..."
+        )
+        await _run_models_inproc(
+            AgentClass,
+            enabled_models,
+            INIT_DATE,
+            END_DATE,
+            agent_config,
+            log_config,
+            max_llm_calls,
+            max_workers,
+            scheduler_config,
+            run_stats,
+        )
+        print("🎉 All models processing completed!")
+    elif len(enabled_models) <= 1:
         for model_config in enabled_models:
-            await _run_model_in_current_process(AgentClass, model_config, INIT_DATE, END_DATE, agent_config, log_config)
+            await _in_worker_slot(
+                asyncio.Semaphore(1),
+                run_stats,
+                model_config,
+                lambda: _run_model_in_current_process(
+                    AgentClass,
+                    model_config,
+                    INIT_DATE,
+                    END_DATE,
+                    agent_config,
+                    log_config,
+                    rate_limiter=get_rate_limiter(model_config, scheduler_config),
+                ),
+            )
         print("🎉 All models processing completed!")
     else:
-        print("⚡ Multiple models enabled; running them in parallel using subprocesses...")
-        await _spawn_model_subprocesses(config_path, enabled_models)
+        print(f"⚡ Multiple models enabled; running them in subprocesses, at most {max_workers} at once...")
+        # Build the price cubes once; subprocesses inherit PRICE_CUBE_SHARED and mmap them instead of parsing merged.jsonl
+        markets = sorted({m["market"] for m in enabled_models})
+        shared_cubes, scratch_dir = publish_shared_cubes([get_merged_file_path(market) for market in markets])
+        if shared_cubes:
+            os.environ[SHARED_CUBES_ENV] = json.dumps(shared_cubes)
+            print(f"📦 Shared price cubes ({', '.join(markets)}): {', '.join(shared_cubes.values())}")
+        try:
+            await _spawn_model_subprocesses(config_path, enabled_models, max_workers, run_stats)
+        finally:
+            if scratch_dir is not None:
+                shutil.rmtree(scratch_dir, ignore_errors=True)
         print("🎉 All model subprocesses completed!")
+    _print_run_summary(enabled_models, scheduler_config, max_workers, run_stats)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="AI-Trader parallel runner")
     parser.add_argument("config_path", nargs="?", default=None, help="Path to config JSON")
     parser.add_argument("--signature", dest="signature", default=None, help="Run only this model signature")
+    parser.add_argument(
+        "--mode",
+        choices=["subprocess", "inproc"],
+        default="subprocess",
+        help="Run models in one subprocess each, or as asyncio tasks in this process",
+    )
+    parser.add_argument(
+        "--max-llm-calls", type=int, default=8, help="Most concurrent LLM calls across models (inproc mode)"
+    )
+    parser.add_argument(
+        "--max-workers", type=int, default=None, help="Most models running at once (default: scheduler.max_workers or all)"
+    )
     args = parser.parse_args()
 
     if args.config_path:
@@ -275,5 +588,5 @@ if __name__ == "__main__":
     if args.signature:
         print(f"🎯 Filtering to single signature: {args.signature}")
 
-    asyncio.run(main(args.config_path, args.signature))
+    asyncio.run(main(args.config_path, args.signature, args.mode, args.max_llm_calls, args.max_workers))
 
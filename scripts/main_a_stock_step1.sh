@@ -18,3 +18,10 @@ python merge_jsonl_alphavantage.py
 # python merge_jsonl_tushare.py
 
 cd ..
+
+# 编译内存映射价格立方体
+cd "$PROJECT_ROOT"
+python -m tools.price_cube --market cn
+
+# 增量更新技术指标缓存
+python -m tools.indicators --market cn
@@ -30,3 +30,10 @@ python merge_crypto_jsonl.py
 # python merge_jsonl_tushare.py
 
 cd ..
+
+# 编译内存映射价格立方体
+cd "$PROJECT_ROOT"
+python -m tools.price_cube --market crypto
+
+# 增量更新技术指标缓存
+python -m tools.indicators --market crypto
@@ -13,3 +13,9 @@ cd data
 python get_interdaily_price.py #run interdaily price data
 python merge_jsonl.py
 cd ..
+
+# compile merged.jsonl into the memory-mapped price cube
+python -m tools.price_cube --market us
+
+# update the technical indicator cache (only new bars are recomputed)
+python -m tools.indicators --market us
@@ -0,0 +1,17 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add project root directory to Python path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+
+@pytest.fixture(autouse=True)
+def runtime_env(tmp_path, monkeypatch):
+    """Point the runtime config and agent data at tmp_path, so tests never touch data/."""
+    monkeypatch.setenv("RUNTIME_ENV_PATH", str(tmp_path / ".runtime_env.json"))
+    monkeypatch.setenv("LOG_PATH", str(tmp_path / "agent_data"))
+    monkeypatch.delenv("POSITION_LEDGER_FORMAT", raising=False)
+    return tmp_path
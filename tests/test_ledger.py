@@ -0,0 +1,238 @@
+"""PositionLedger: reading, writing and maintaining position.jsonl."""
+import json
+
+import pytest
+
+from tools.ledger import (
+    PositionLedger,
+    SettlementBook,
+    compact_position_file,
+    count_records,
+    get_checkpoint_file,
+    iter_position_records,
+    last_position_date,
+    migrate_position_file,
+    read_last_records,
+    read_tail_record,
+)
+
+
+def _record(date, record_id, positions, action="no_trade", symbol="", amount=0):
+    return {
+        "date": date,
+        "id": record_id,
+        "this_action": {"action": action, "symbol": symbol, "amount": amount},
+        "positions": dict(positions),
+    }
+
+
+def _trading_records(days=10):
+    """One buy and one no_trade per day, with AAPL growing and MSFT unchanged."""
+    records = []
+    positions = {"AAPL": 0, "MSFT": 5, "CASH": 10000.0}
+    for day in range(1, days + 1):
+        date = f"2025-01-{day:02d}"
+        positions = dict(positions, AAPL=positions["AAPL"] + 1, CASH=positions["CASH"] - 100.0)
+        records.append(_record(date, 2 * day, positions, "buy", "AAPL", 1))
+        records.append(_record(date, 2 * day + 1, positions))
+    return records
+
+
+@pytest.fixture
+def position_file(tmp_path):
+    path = tmp_path / "sig" / "position" / "position.jsonl"
+    path.parent.mkdir(parents=True)
+    return path
+
+
+def test_append_and_latest_position(position_file):
+    ledger = PositionLedger(position_file)
+    records = _trading_records(3)
+    ledger.append_many(records)
+    positions, record_id = ledger.latest_position("2025-01-02")
+    assert record_id == 5
+    assert positions == records[3]["positions"]
+    # A day without records falls back to the last day before it
+    assert ledger.latest_position("2025-01-10") == (records[-1]["positions"], 7)
+    assert ledger.latest_position("2024-12-31") == ({}, -1)
+
+
+def test_checkpoint_restores_state_and_replays_tail(position_file):
+    ledger = PositionLedger(position_file)
+    records = _trading_records(5)
+    ledger.append_many(records)
+    assert ledger.write_checkpoint() == get_checkpoint_file(position_file)
+    checkpoint_offset = position_file.stat().st_size
+
+    extra = _record("2025-01-06", 100, {"AAPL": 9, "MSFT": 5, "CASH": 1.0})
+    with open(position_file, "a", encoding="utf-8") as f:
+        f.write(json.dumps(extra) + "\n")
+
+    cold = PositionLedger(position_file)
+    cold.refresh()
+    assert cold.latest == extra
+    assert cold.next_id == 101
+    assert cold.record_count == len(records) + 1
+    assert cold.dates() == [f"2025-01-{d:02d}" for d in range(1, 7)]
+    # Only the bytes after the checkpoint were parsed
+    cold_from_checkpoint = PositionLedger(position_file)
+    cold_from_checkpoint._load_checkpoint(position_file.stat())
+    assert cold_from_checkpoint._offset == checkpoint_offset
+
+
+def test_stale_checkpoint_is_ignored(position_file):
+    ledger = PositionLedger(position_file)
+    ledger.append_many(_trading_records(3))
+    ledger.write_checkpoint()
+    # Rewrite the file in place with different records
+    rewritten = _trading_records(2)
+    with open(position_file, "r+", encoding="utf-8") as f:
+        f.seek(0)
+        f.write("".join(json.dumps(r) + "\n" for r in rewritten))
+        f.truncate()
+    cold = PositionLedger(position_file)
+    assert cold.latest == rewritten[-1]
+    assert cold.record_count == len(rewritten)
+
+
+def test_v2_migration_round_trip(position_file, monkeypatch):
+    monkeypatch.setenv("POSITION_SNAPSHOT_EVERY", "4")
+    records = _trading_records(10)
+    PositionLedger(position_file).append_many(records)
+
+    old_size, new_size = migrate_position_file(position_file, "v2")
+    assert new_size < old_size
+    lines = [json.loads(line) for line in position_file.read_text(encoding="utf-8").splitlines()]
+    assert sum("delta" in line for line in lines) > 0
+    assert sum("positions" in line for line in lines) >= len(lines) // 4
+    assert list(iter_position_records(position_file)) == records
+
+    # A delta record deep in the file is rebuilt from the snapshot before it
+    ledger = PositionLedger(position_file)
+    assert ledger.record("2025-01-05") == records[9]
+    assert ledger.latest_position("2025-01-10") == (records[-1]["positions"], records[-1]["id"])
+
+    migrate_position_file(position_file, "v1")
+    assert [json.loads(line) for line in position_file.read_text(encoding="utf-8").splitlines()] == records
+
+
+def test_v2_appends_write_deltas(position_file, monkeypatch):
+    monkeypatch.setenv("POSITION_LEDGER_FORMAT", "v2")
+    records = _trading_records(3)
+    ledger = PositionLedger(position_file)
+    for record in records:
+        ledger.append(record)
+    lines = [json.loads(line) for line in position_file.read_text(encoding="utf-8").splitlines()]
+    assert "positions" in lines[0]
+    assert lines[1]["delta"] == {"CASH": records[1]["positions"]["CASH"]}
+    assert list(iter_position_records(position_file)) == records
+
+
+def test_settlement_book_tracks_recent_buys():
+    book = SettlementBook()
+    book.record("2025-01-02 10:00:00", {"action": "buy", "symbol": "600028.SH", "amount": 100})
+    book.record("2025-01-02 11:00:00", {"action": "buy", "symbol": "600028.SH", "amount": 200})
+    book.record("2025-01-02 11:00:00", {"action": "sell", "symbol": "600028.SH", "amount": 100})
+    assert book.bought_on("2025-01-02", "600028.SH") == 300
+    assert book.bought_on("2025-01-03", "600028.SH") == 0
+
+    for day in range(3, 3 + SettlementBook.KEEP_DAYS):
+        book.record(f"2025-01-{day:02d}", {"action": "buy", "symbol": "600030.SH", "amount": 100})
+    # The oldest day was pruned, so it is reported as unknown
+    assert book.bought_on("2025-01-02", "600028.SH") is None
+    assert SettlementBook.from_dict(book.to_dict()).bought_on("2025-01-07", "600030.SH") == 100
+
+
+def test_ledger_bought_on_falls_back_to_scan(position_file):
+    ledger = PositionLedger(position_file)
+    records = _trading_records(SettlementBook.KEEP_DAYS + 2)
+    ledger.append_many(records)
+    assert ledger.bought_on("2025-01-01", "AAPL") == 1
+    assert ledger.bought_on(f"2025-01-{SettlementBook.KEEP_DAYS + 2:02d}", "AAPL") == 1
+    assert ledger.bought_on("2025-01-01", "MSFT") == 0
+
+
+def test_compact_drops_redundant_no_trade_records(position_file):
+    positions = {"AAPL": 1, "CASH": 900.0}
+    records = [
+        _record("2025-01-01", 0, positions, "buy", "AAPL", 1),
+        _record("2025-01-01 11:00:00", 1, positions),
+        _record("2025-01-01 12:00:00", 2, positions),
+        _record("2025-01-02", 3, positions),
+        _record("2025-01-03", 4, positions),
+    ]
+    PositionLedger(position_file).append_many(records)
+
+    before, after = compact_position_file(position_file)
+    kept = list(iter_position_records(position_file))
+    assert (before, after) == (5, 4)
+    # The last record of each trading day stays, and ids are unchanged
+    assert [r["id"] for r in kept] == [0, 2, 3, 4]
+    assert get_checkpoint_file(position_file).exists()
+    assert PositionLedger(position_file).latest == records[-1]
+
+
+def test_last_position_date_skips_torn_tail(position_file, capsys):
+    records = _trading_records(3)
+    PositionLedger(position_file).append_many(records)
+    with open(position_file, "a", encoding="utf-8") as f:
+        f.write('{"date": "2025-01-04", "id": 8, "posi')
+
+    assert last_position_date(position_file) == "2025-01-03"
+    assert read_last_records(position_file, 2) == records[-2:]
+    assert "torn" in capsys.readouterr().out
+    # The ledger never consumes the partial line
+    assert PositionLedger(position_file).latest == records[-1]
+
+
+def _fail_replay(monkeypatch):
+    def fail(self):
+        raise AssertionError("the ledger replayed position.jsonl")
+
+    monkeypatch.setattr(PositionLedger, "refresh", fail)
+
+
+def test_cold_latest_position_reads_only_the_tail(position_file, monkeypatch):
+    records = _trading_records(5)
+    PositionLedger(position_file).append_many(records)
+    with open(position_file, "a", encoding="utf-8") as f:
+        f.write('{"date": "2025-01-06", "id": 12, "posi')
+
+    _fail_replay(monkeypatch)
+    assert PositionLedger(position_file).latest_position("2025-01-05") == (records[-1]["positions"], 11)
+    assert PositionLedger(position_file).latest_position("2025-02-01") == (records[-1]["positions"], 11)
+    assert PositionLedger(position_file).summary() == (records[-1], len(records))
+    assert count_records(position_file) == len(records)
+
+    # An earlier date still needs the replay
+    monkeypatch.undo()
+    assert PositionLedger(position_file).latest_position("2025-01-02") == (records[3]["positions"], 5)
+
+
+def test_read_tail_record_rebuilds_v2_delta(position_file, monkeypatch):
+    monkeypatch.setenv("POSITION_LEDGER_FORMAT", "v2")
+    monkeypatch.setenv("POSITION_SNAPSHOT_EVERY", "4")
+    records = _trading_records(5)
+    PositionLedger(position_file).append_many(records)
+    assert "delta" in read_last_records(position_file, 1)[0]
+    assert read_tail_record(position_file) == records[-1]
+
+
+def test_latest_holdings_are_reused_across_appends(position_file, monkeypatch):
+    from tools.holdings import Holdings
+
+    ledger = PositionLedger(position_file)
+    ledger.append(_record("2025-01-01", 0, {"BTC-USDT": 0.5, "CASH": 1000.0}))
+    holdings, record_id = ledger.latest_holdings("2025-01-02", "crypto")
+    assert (holdings.units("BTC-USDT"), holdings.cash_value, record_id) == (5000, 1000.0, 0)
+
+    holdings.buy("BTC-USDT", 1, 100.0)
+    ledger.append(_record("2025-01-02", 1, holdings.to_positions(), "buy_crypto", "BTC-USDT", 0.0001), holdings)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("holdings were rebuilt from a position dict")
+
+    monkeypatch.setattr(Holdings, "from_positions", fail)
+    again, record_id = ledger.latest_holdings("2025-01-02", "crypto")
+    assert (again.units("BTC-USDT"), record_id) == (5001, 1)
+    assert again.to_positions() == {"BTC-USDT": 0.5001, "CASH": 999.99}
@@ -0,0 +1,175 @@
+"""Atomic order batches and weight rebalancing."""
+import json
+
+import pytest
+
+from tools import order_batch
+from tools.ledger import PositionLedger, get_position_file
+from tools.order_batch import MAX_BATCH_ORDERS, execute_order_batch, execute_rebalance, plan_rebalance
+
+SIGNATURE = "test-model"
+TODAY = "2025-01-03"
+PRICES = {"AAPL": 100.0, "MSFT": 50.0, "600028.SH": 5.0, "600030.SH": 20.0, "BTC-USDT": 50000.0, "ETH-USDT": 2500.0}
+
+
+@pytest.fixture
+def open_prices(monkeypatch):
+    def get_open_prices(today_date, symbols, market="us"):
+        return {f"{symbol}_price": PRICES.get(symbol) for symbol in symbols}
+
+    monkeypatch.setattr(order_batch, "get_open_prices", get_open_prices)
+
+
+@pytest.fixture
+def ledger(runtime_env):
+    return PositionLedger(get_position_file(SIGNATURE))
+
+
+def _seed(ledger, positions, date="2025-01-02"):
+    ledger.append({"date": date, "id": 0, "this_action": {"action": "no_trade", "symbol": "", "amount": 0}, "positions": positions})
+
+
+def _lines(ledger):
+    return [json.loads(line) for line in ledger.path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_batch_uses_cash_freed_by_earlier_sell(ledger, open_prices):
+    _seed(ledger, {"AAPL": 10, "MSFT": 0, "CASH": 100.0})
+    result = execute_order_batch(
+        SIGNATURE, TODAY, [{"action": "sell", "symbol": "AAPL", "amount": 10}, {"action": "buy", "symbol": "MSFT", "amount": 20}]
+    )
+    assert [order["id"] for order in result["executed"]] == [1, 2]
+    assert result["positions"] == {"AAPL": 0, "MSFT": 20, "CASH": 100.0}
+    assert [line["positions"] for line in _lines(ledger)[1:]] == [
+        {"AAPL": 0, "MSFT": 0, "CASH": 1100.0},
+        {"AAPL": 0, "MSFT": 20, "CASH": 100.0},
+    ]
+
+
+def test_batch_with_one_bad_order_writes_nothing(ledger, open_prices):
+    _seed(ledger, {"AAPL": 10, "CASH": 1000.0})
+    size = ledger.path.stat().st_size
+    result = execute_order_batch(
+        SIGNATURE,
+        TODAY,
+        [
+            {"action": "buy", "symbol": "AAPL", "amount": 1},
+            {"action": "buy", "symbol": "MSFT", "amount": 100},
+            {"action": "sell", "symbol": "NOPE", "amount": 1},
+            {"action": "hold", "symbol": "AAPL", "amount": 1},
+        ],
+    )
+    assert "executed" not in result
+    assert [r["index"] for r in result["rejected"]] == [1, 2, 3]
+    assert "Insufficient cash" in result["rejected"][0]["error"]
+    assert ledger.path.stat().st_size == size
+
+
+def test_fractional_stock_amounts_are_rejected(ledger, open_prices):
+    _seed(ledger, {"AAPL": 10, "CASH": 1000.0})
+    result = execute_order_batch(
+        SIGNATURE,
+        TODAY,
+        [
+            {"action": "buy", "symbol": "AAPL", "amount": 10.7},
+            {"action": "buy", "symbol": "AAPL", "amount": "1e2"},
+            {"action": "sell", "symbol": "AAPL", "amount": 2.0},
+        ],
+    )
+    assert [r["index"] for r in result["rejected"]] == [0, 1]
+    assert "whole shares" in result["rejected"][0]["error"]
+    # "1e2" is a whole number of shares, it is only too expensive
+    assert "Insufficient cash" in result["rejected"][1]["error"]
+
+
+def test_batch_limits(ledger, open_prices):
+    assert "error" in execute_order_batch(SIGNATURE, TODAY, [])
+    orders = [{"action": "buy", "symbol": "AAPL", "amount": 1}] * (MAX_BATCH_ORDERS + 1)
+    assert "Too many orders" in execute_order_batch(SIGNATURE, TODAY, orders)["error"]
+
+
+def test_a_share_lots_and_t_plus_1(ledger, open_prices):
+    _seed(ledger, {"600028.SH": 0, "CASH": 10000.0})
+    odd_lot = execute_order_batch(SIGNATURE, TODAY, [{"action": "buy", "symbol": "600028.SH", "amount": 150}])
+    assert "multiples of 100" in odd_lot["rejected"][0]["error"]
+
+    same_batch = execute_order_batch(
+        SIGNATURE,
+        TODAY,
+        [{"action": "buy", "symbol": "600028.SH", "amount": 200}, {"action": "sell", "symbol": "600028.SH", "amount": 100}],
+    )
+    assert "T+1" in same_batch["rejected"][0]["error"]
+
+    assert "executed" in execute_order_batch(SIGNATURE, TODAY, [{"action": "buy", "symbol": "600028.SH", "amount": 200}])
+    later_batch = execute_order_batch(SIGNATURE, TODAY, [{"action": "sell", "symbol": "600028.SH", "amount": 100}])
+    assert "T+1" in later_batch["rejected"][0]["error"]
+    next_day = execute_order_batch(SIGNATURE, "2025-01-06", [{"action": "sell", "symbol": "600028.SH", "amount": 100}])
+    assert next_day["positions"]["600028.SH"] == 100
+
+
+def test_crypto_amounts_round_to_fixed_point(ledger, open_prices):
+    _seed(ledger, {"BTC-USDT": 0, "CASH": 10000.0})
+    too_small = execute_order_batch(SIGNATURE, TODAY, [{"action": "buy", "symbol": "BTC-USDT", "amount": 0.00004}], "crypto")
+    assert "smallest tradable quantity" in too_small["rejected"][0]["error"]
+
+    result = execute_order_batch(SIGNATURE, TODAY, [{"action": "buy_crypto", "symbol": "BTC-USDT", "amount": 0.12346}], "crypto")
+    assert result["executed"][0]["amount"] == pytest.approx(0.1235)
+    assert result["positions"] == {"BTC-USDT": 0.1235, "CASH": 3825.0}
+
+
+def test_many_round_trips_do_not_drift(ledger, open_prices):
+    _seed(ledger, {"ETH-USDT": 0, "CASH": 1000.0})
+    for _ in range(50):
+        execute_order_batch(
+            SIGNATURE,
+            TODAY,
+            [{"action": "buy", "symbol": "ETH-USDT", "amount": 0.1}, {"action": "sell", "symbol": "ETH-USDT", "amount": 0.1}],
+            "crypto",
+        )
+    positions, _ = ledger.latest_position(TODAY)
+    assert positions == {"ETH-USDT": 0.0, "CASH": 1000.0}
+
+
+def test_plan_rebalance_sells_first_and_respects_lots():
+    position = {"600028.SH": 1000, "600030.SH": 0, "CASH": 5000.0}
+    prices = {"600028.SH": 5.0, "600030.SH": 20.0}
+    orders = plan_rebalance(position, prices, {"600030.SH": 0.5}, 0.1, "cn")
+    assert orders == [
+        {"action": "sell", "symbol": "600028.SH", "amount": 1000},
+        # 45% of 10000 at 20.0 is 225 shares, rounded down to 200
+        {"action": "buy", "symbol": "600030.SH", "amount": 200},
+    ]
+
+
+def test_plan_rebalance_crypto_quantities():
+    orders = plan_rebalance({"BTC-USDT": 0.2, "CASH": 0.0}, {"BTC-USDT": 50000.0, "ETH-USDT": 2500.0}, {"ETH-USDT": 0.5, "BTC-USDT": 0.5}, 0.0, "crypto")
+    assert orders == [
+        {"action": "sell", "symbol": "BTC-USDT", "amount": 0.1},
+        {"action": "buy", "symbol": "ETH-USDT", "amount": 2.0},
+    ]
+
+
+def test_rebalance_refuses_unpriced_holdings(ledger, open_prices):
+    with pytest.raises(ValueError, match="DELISTED"):
+        plan_rebalance({"DELISTED": 10, "AAPL": 0, "CASH": 0.0}, {"AAPL": 100.0}, {"AAPL": 1.0}, 0.0, "us")
+    # A symbol held at zero does not need a price
+    assert plan_rebalance({"DELISTED": 0, "CASH": 100.0}, {"AAPL": 100.0}, {"AAPL": 1.0}, 0.0, "us") == [
+        {"action": "buy", "symbol": "AAPL", "amount": 1}
+    ]
+
+    _seed(ledger, {"AAPL": 10, "DELISTED": 5, "CASH": 0.0})
+    result = execute_rebalance(SIGNATURE, TODAY, {"AAPL": 0.5, "MSFT": 0.5}, 0.0)
+    assert "DELISTED" in result["error"] and "orders" not in result
+
+
+def test_execute_rebalance(ledger, open_prices):
+    _seed(ledger, {"AAPL": 10, "MSFT": 0, "CASH": 0.0})
+    assert "more than 1" in execute_rebalance(SIGNATURE, TODAY, {"AAPL": 0.7, "MSFT": 0.5}, 0.0)["error"]
+    assert "together" in execute_rebalance(SIGNATURE, TODAY, {"AAPL": 0.5, "600028.SH": 0.5}, 0.0)["error"]
+
+    result = execute_rebalance(SIGNATURE, TODAY, {"AAPL": 0.5, "MSFT": 0.5}, 0.0)
+    assert result["orders"] == [
+        {"action": "sell", "symbol": "AAPL", "amount": 5},
+        {"action": "buy", "symbol": "MSFT", "amount": 10},
+    ]
+    assert result["positions"] == {"AAPL": 5, "MSFT": 10, "CASH": 0.0}
@@ -0,0 +1,69 @@
+"""OrderExecutor: one writer per signature, group-committed fsync."""
+import asyncio
+
+import pytest
+
+from tools import order_executor
+from tools.ledger import PositionLedger, get_position_ledger
+from tools.order_executor import submit_order
+
+SIGNATURE = "test-model"
+
+
+def _append(signature, record_id):
+    ledger = get_position_ledger(signature)
+    positions = {"AAPL": record_id, "CASH": 1000.0}
+    ledger.append({"date": "2025-01-02", "id": record_id, "this_action": {"action": "buy", "symbol": "AAPL", "amount": 1}, "positions": positions})
+    return positions
+
+
+def _fail(signature):
+    raise RuntimeError("no price")
+
+
+class _NoLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def executors(monkeypatch, runtime_env):
+    monkeypatch.setattr(order_executor, "_EXECUTORS", {})
+    monkeypatch.setattr(order_executor, "position_lock", lambda signature: _NoLock())
+
+
+async def _submit_all(*calls):
+    return await asyncio.gather(*(submit_order(SIGNATURE, *call) for call in calls), return_exceptions=True)
+
+
+def test_each_order_gets_its_own_result(executors):
+    results = asyncio.run(_submit_all((_append, 0), (_fail,), (_append, 1)))
+    assert results[0] == {"AAPL": 0, "CASH": 1000.0}
+    assert isinstance(results[1], RuntimeError)
+    assert results[2] == {"AAPL": 1, "CASH": 1000.0}
+
+
+def test_fsync_failure_does_not_fail_recorded_orders(executors, monkeypatch):
+    def broken_sync(self):
+        raise OSError("disk gone")
+
+    monkeypatch.setattr(PositionLedger, "sync", broken_sync)
+    results = asyncio.run(_submit_all((_append, 0), (_fail,)))
+    assert results[0]["AAPL"] == 0
+    assert "disk gone" in results[0]["warning"]
+    assert isinstance(results[1], RuntimeError)
+    # The ledger's own copy of the positions is untouched
+    assert "warning" not in get_position_ledger(SIGNATURE).latest["positions"]
+
+
+def test_lock_failure_fails_orders_that_did_not_run(executors, monkeypatch):
+    def broken_lock(signature):
+        raise OSError("no lock")
+
+    monkeypatch.setattr(order_executor, "position_lock", broken_lock)
+    results = asyncio.run(_submit_all((_append, 0)))
+    assert isinstance(results[0], OSError)
+    assert not get_position_ledger(SIGNATURE).path.exists()
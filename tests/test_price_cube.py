@@ -0,0 +1,37 @@
+"""Price cube files are written atomically, even by concurrent compiles."""
+import threading
+import time
+
+from tools.price_cube import _write_atomic
+
+
+def test_concurrent_writers_do_not_share_a_temp_file(tmp_path):
+    target = tmp_path / "meta.json"
+    barrier = threading.Barrier(2)
+
+    def slow_write(payload):
+        def write(f):
+            f.write(payload[:4])
+            barrier.wait()
+            time.sleep(0.05)
+            f.write(payload[4:])
+
+        return write
+
+    errors = []
+
+    def run(payload):
+        try:
+            _write_atomic(target, slow_write(payload))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(payload,)) for payload in (b"first-writer", b"second-writer")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert target.read_bytes() in (b"first-writer", b"second-writer")
+    assert [p.name for p in tmp_path.iterdir()] == ["meta.json"]
@@ -0,0 +1,82 @@
+"""The current bar only exposes its open price, whatever tool or resolution reads it."""
+import json
+
+import pytest
+
+from agent_tools import tool_get_price_local
+from tools.general_tools import use_session_context
+
+SYMBOL = "TEST"
+HOURS = ["10:00:00", "11:00:00", "12:00:00", "13:00:00", "14:00:00", "15:00:00"]
+DAYS = ["2025-01-02", "2025-01-03", "2025-01-06"]
+
+
+def _bar(open_price: float, high: float, low: float, close: float, volume: float) -> dict:
+    return {
+        "1. buy price": str(open_price),
+        "2. high": str(high),
+        "3. low": str(low),
+        "4. sell price": str(close),
+        "5. volume": str(volume),
+    }
+
+
+@pytest.fixture
+def hourly_prices(tmp_path, monkeypatch):
+    """A merged.jsonl with only 60min bars; the last hour of each day spikes to 999."""
+    series = {}
+    price = 100.0
+    for day in DAYS:
+        for hour in HOURS:
+            spike = hour == HOURS[-1]
+            series[f"{day} {hour}"] = _bar(price, 999.0 if spike else price + 1, price - 1, price + 0.5, 1000)
+            price += 1
+    doc = {"Meta Data": {"2. Symbol": SYMBOL, "4. Interval": "60min"}, "Time Series (60min)": series}
+    merged_file = tmp_path / "merged.jsonl"
+    merged_file.write_text(json.dumps(doc) + "\n", encoding="utf-8")
+    monkeypatch.setattr(tool_get_price_local, "_workspace_data_path", lambda filename, symbol=None: merged_file)
+    return series
+
+
+def test_get_prices_masks_todays_daily_bar_in_hourly_session(hourly_prices):
+    with use_session_context({"TODAY_DATE": "2025-01-03 12:00:00"}):
+        result = tool_get_price_local.get_prices.fn([SYMBOL], ["2025-01-03", "2025-01-02"])
+    rows = {row[1]: row[2:] for row in result["rows"]}
+    assert rows["2025-01-03"] == [pytest.approx(106.0), None, None, None, None]
+    # Earlier days are complete, including their last hour
+    assert rows["2025-01-02"][1] == pytest.approx(999.0)
+    assert "2025-01-03" in result["note"]
+
+
+def test_get_prices_masks_current_hour(hourly_prices):
+    with use_session_context({"TODAY_DATE": "2025-01-03 12:00:00"}):
+        result = tool_get_price_local.get_prices.fn([SYMBOL], ["2025-01-03 12:00:00", "2025-01-03 11:00:00"])
+    rows = {row[1]: row[2:] for row in result["rows"]}
+    assert rows["2025-01-03 12:00:00"][1:] == [None, None, None, None]
+    assert rows["2025-01-03 11:00:00"][1] is not None
+
+
+def test_get_price_local_daily_masks_today_in_hourly_session(hourly_prices):
+    with use_session_context({"TODAY_DATE": "2025-01-03 12:00:00"}):
+        result = tool_get_price_local.get_price_local_daily(SYMBOL, "2025-01-03")
+    assert result["ohlcv"]["open"] == pytest.approx(106.0)
+    for field in ("high", "low", "close", "volume"):
+        assert isinstance(result["ohlcv"][field], str) and "can not" in result["ohlcv"][field]
+
+
+def test_get_price_history_stops_at_today(hourly_prices):
+    with use_session_context({"TODAY_DATE": "2025-01-03 12:00:00"}):
+        daily = tool_get_price_local.get_price_history.fn(SYMBOL, "2025-01-06", lookback=10)
+        hourly = tool_get_price_local.get_price_history.fn(SYMBOL, "2025-01-06", lookback=50, resolution="hourly")
+    dates = [row[0] for row in daily["rows"]]
+    assert dates == ["2025-01-02", "2025-01-03"]
+    assert daily["rows"][-1][2:] == [None, None, None, None]
+    assert hourly["rows"][-1][0] == "2025-01-03 12:00:00"
+    assert hourly["rows"][-1][2:] == [None, None, None, None]
+    assert all(row[0] <= "2025-01-03 12:00:00" for row in hourly["rows"])
+
+
+def test_get_indicators_use_last_completed_bar(hourly_prices):
+    with use_session_context({"TODAY_DATE": "2025-01-03 12:00:00"}):
+        result = tool_get_price_local.get_indicators.fn(SYMBOL, "2025-01-06 15:00:00", ["sma_20"])
+    assert result["as_of"] == "2025-01-03 11:00:00"
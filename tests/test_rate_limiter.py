@@ -0,0 +1,40 @@
+"""TokenBucket budgets shared through a lock file, without blocking the event loop."""
+import asyncio
+import threading
+
+import pytest
+
+from tools import rate_limiter
+from tools.rate_limiter import TokenBucket
+
+
+@pytest.fixture
+def bucket(tmp_path, monkeypatch):
+    monkeypatch.setenv(rate_limiter.RATE_LIMIT_DIR_ENV, str(tmp_path / "rate_limits"))
+    return TokenBucket("https://example.invalid/v1", rpm=60, tpm=1000)
+
+
+def test_budget_is_taken_and_refilled(bucket):
+    assert bucket.try_acquire(600) == 0
+    # The next 600 tokens need 200 more, refilled at 1000 per minute
+    assert bucket.try_acquire(600) == pytest.approx(12.0, abs=0.1)
+    bucket.settle(-500)
+    assert bucket.try_acquire(600) == 0
+    assert bucket.stats()["tokens"] == 700
+
+
+def test_waiting_for_the_lock_does_not_block_the_event_loop(bucket):
+    holder = bucket._locked()
+    threading.Timer(0.3, holder.close).start()
+
+    async def main():
+        ticks = 0
+        acquire = asyncio.create_task(bucket.acquire(10))
+        while not acquire.done():
+            ticks += 1
+            await asyncio.sleep(0.02)
+        return ticks, acquire.result()
+
+    ticks, waited = asyncio.run(main())
+    assert ticks >= 5
+    assert waited == 0.0
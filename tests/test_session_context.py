@@ -0,0 +1,66 @@
+"""Request-scoped session config: what an MCP request may set, and where it leads."""
+import pytest
+
+from tools import general_tools
+from tools.general_tools import (
+    get_config_value,
+    get_session_context,
+    get_session_runtime_env_path,
+    session_headers,
+    use_agent_session,
+    write_config_value,
+)
+from tools.ledger import get_position_file
+
+
+@pytest.fixture
+def request_headers(monkeypatch):
+    headers = {}
+    monkeypatch.setattr(general_tools, "_get_http_headers", lambda: headers)
+    return headers
+
+
+def test_headers_cannot_set_paths(request_headers):
+    request_headers.update(
+        {
+            "x-trader-signature": "gpt-5",
+            "x-trader-today-date": "2025-01-03",
+            "x-trader-log-path": "/etc",
+            "x-trader-runtime-env-path": "/etc/passwd",
+        }
+    )
+    assert get_session_context() == {"SIGNATURE": "gpt-5", "TODAY_DATE": "2025-01-03"}
+    with pytest.raises(ValueError):
+        session_headers({"LOG_PATH": "/etc"})
+
+
+@pytest.mark.parametrize("signature", ["..", "../gpt-5", "a/b", "gpt 5", ""])
+def test_invalid_signature_header_is_rejected(request_headers, signature):
+    request_headers["x-trader-signature"] = signature
+    with pytest.raises(ValueError):
+        get_session_context()
+
+
+def test_position_file_stays_in_log_path(tmp_path):
+    assert get_position_file("gpt-5", str(tmp_path)) == tmp_path / "gpt-5" / "position" / "position.jsonl"
+    with pytest.raises(ValueError):
+        get_position_file("../../outside", str(tmp_path))
+
+
+def test_session_config_goes_to_the_signature_runtime_env(runtime_env, request_headers, monkeypatch):
+    monkeypatch.setattr(general_tools, "project_root", runtime_env)
+    monkeypatch.setattr(general_tools, "_SESSION_PATHS", {})
+    log_path = str(runtime_env / "agent_data")
+    with use_agent_session("gpt-5", "2025-01-03", log_path, "us"):
+        assert get_config_value("IF_TRADE") is None
+
+    # A tool server call for the same signature sees the agent's log path and writes its flag
+    request_headers["x-trader-signature"] = "gpt-5"
+    assert get_config_value("LOG_PATH") == log_path
+    write_config_value("IF_TRADE", True)
+    request_headers.clear()
+
+    with use_agent_session("gpt-5", "2025-01-03", log_path, "us"):
+        assert get_config_value("IF_TRADE") is True
+    assert get_config_value("IF_TRADE") is None
+    assert get_session_runtime_env_path("gpt-5") == str(runtime_env / "data" / "agent_data" / "gpt-5" / ".runtime_env.json")
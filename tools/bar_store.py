@@ -0,0 +1,134 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from tools.price_store import CLOSE, FIELD_KEYS, FIELDS, HIGH, LOW, OPEN, VOLUME
+
+# Bar length of each supported resolution, finest first
+RESOLUTION_MINUTES = {"60min": 60, "4h": 240, "daily": 1440}
+
+
+def resample_ohlcv(timestamps: List[str], ohlcv: np.ndarray, resolution: str) -> Tuple[List[str], np.ndarray]:
+    """Aggregate sorted intraday bars into coarser bars.
+
+    Bars are bucketed by calendar day ("daily") or by 4-hour block of the day
+    ("4h"), labelled with the bucket start. Open is the first bar's open, close
+    the last bar's close, high/low ignore missing values and volume is summed.
+
+    Args:
+        timestamps: Sorted 'YYYY-MM-DD HH:MM:SS' timestamps
+        ohlcv: Aligned float64 array of shape (len(timestamps), len(FIELDS))
+        resolution: "daily" or "4h"
+
+    Returns:
+        (bucket timestamps, aggregated array of shape (buckets, len(FIELDS)))
+    """
+    if not timestamps:
+        return [], np.empty((0, len(FIELDS)), dtype=np.float64)
+    times = np.array(timestamps, dtype="datetime64[s]")
+    if resolution == "daily":
+        keys = times.astype("datetime64[D]")
+    elif resolution == "4h":
+        hours = times.astype("datetime64[h]").astype(np.int64)
+        keys = (hours - hours % 4).astype("datetime64[h]")
+    else:
+        raise ValueError(f"Unsupported resample resolution: {resolution}")
+
+    starts = np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+    ends = np.concatenate((starts[1:], [len(keys)])) - 1
+
+    out = np.empty((len(starts), len(FIELDS)), dtype=np.float64)
+    out[:, OPEN] = ohlcv[starts, OPEN]
+    out[:, HIGH] = np.fmax.reduceat(ohlcv[:, HIGH], starts)
+    out[:, LOW] = np.fmin.reduceat(ohlcv[:, LOW], starts)
+    out[:, CLOSE] = ohlcv[ends, CLOSE]
+    volume = ohlcv[:, VOLUME]
+    counts = np.add.reduceat(~np.isnan(volume), starts)
+    out[:, VOLUME] = np.where(counts > 0, np.add.reduceat(np.nan_to_num(volume), starts), np.nan)
+
+    if resolution == "daily":
+        labels = [str(key) for key in keys[starts]]
+    else:
+        labels = [label.replace("T", " ") for label in np.datetime_as_string(keys[starts], unit="s")]
+    return labels, out
+
+
+class BarStore:
+    """Bars of one merged.jsonl at any resolution at or above the native one.
+
+    Each symbol is kept once at the finest resolution its data file holds;
+    coarser bars (4h, daily) are resampled from it on first use and cached.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self._bars: Dict[Tuple[str, str], Tuple[List[str], np.ndarray]] = {}
+        self._series: Dict[Tuple[str, str], Dict[str, dict]] = {}
+        self._index: Dict[Tuple[str, str], Dict[str, int]] = {}
+
+    def bars(self, symbol: str, resolution: str) -> Optional[Tuple[List[str], np.ndarray]]:
+        """Get (timestamps, ohlcv) of symbol at resolution.
+
+        Returns:
+            The bars, or None if the symbol is unknown or resolution is finer than its data
+        """
+        native = self.source.symbol_resolution(symbol)
+        if native is None or resolution not in RESOLUTION_MINUTES:
+            return None
+        if resolution == native:
+            return self.source.ohlcv(symbol)
+        if RESOLUTION_MINUTES.get(native, 0) > RESOLUTION_MINUTES[resolution]:
+            return None
+        key = (symbol, resolution)
+        cached = self._bars.get(key)
+        if cached is None:
+            cached = resample_ohlcv(*self.source.ohlcv(symbol), resolution)
+            self._bars[key] = cached
+        return cached
+
+    def _row(self, symbol: str, timestamp: str, resolution: str) -> Optional[np.ndarray]:
+        bars = self.bars(symbol, resolution)
+        if bars is None:
+            return None
+        key = (symbol, resolution)
+        index = self._index.get(key)
+        if index is None:
+            index = {ts: i for i, ts in enumerate(bars[0])}
+            self._index[key] = index
+        i = index.get(timestamp)
+        return None if i is None else bars[1][i]
+
+    def _value(self, symbol: str, timestamp: str, resolution: str, field: int) -> Optional[float]:
+        row = self._row(symbol, timestamp, resolution)
+        if row is None or np.isnan(row[field]):
+            return None
+        return float(row[field])
+
+    def has_bar(self, symbol: str, timestamp: str, resolution: str) -> bool:
+        if resolution == self.source.symbol_resolution(symbol):
+            return self.source.has_bar(symbol, timestamp)
+        return self._row(symbol, timestamp, resolution) is not None
+
+    def get_open(self, symbol: str, timestamp: str, resolution: str) -> Optional[float]:
+        if resolution == self.source.symbol_resolution(symbol):
+            return self.source.get_open(symbol, timestamp)
+        return self._value(symbol, timestamp, resolution, OPEN)
+
+    def get_close(self, symbol: str, timestamp: str, resolution: str) -> Optional[float]:
+        if resolution == self.source.symbol_resolution(symbol):
+            return self.source.get_close(symbol, timestamp)
+        return self._value(symbol, timestamp, resolution, CLOSE)
+
+    def series(self, symbol: str, resolution: str) -> Dict[str, dict]:
+        """Get {timestamp: bar} of symbol at resolution, with bars keyed like merged.jsonl."""
+        key = (symbol, resolution)
+        series = self._series.get(key)
+        if series is None:
+            bars = self.bars(symbol, resolution)
+            series = {}
+            if bars is not None:
+                for ts, row in zip(bars[0], bars[1].tolist()):
+                    series[ts] = {FIELD_KEYS[field]: v for field, v in zip(FIELDS, row) if v == v}
+            self._series[key] = series
+        return series
+
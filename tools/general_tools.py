@@ -1,53 +1,249 @@
 import json
 import os
+import re
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Any
+from typing import Any, Dict, Iterator, Optional, Tuple
 
+import httpx
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Config keys a caller can scope to one request, so one set of MCP servers can
+# serve many agents at once. Sent as headers like "X-Trader-Today-Date". Paths
+# (LOG_PATH, RUNTIME_ENV_PATH) are never taken from a request: the servers use
+# the signature's runtime env file, which the runner writes.
+SESSION_KEYS = ("SIGNATURE", "TODAY_DATE", "MARKET")
+SESSION_HEADER_PREFIX = "x-trader-"
+
+# A signature names one directory under the agent data directory
+SIGNATURE_PATTERN = re.compile(r"[A-Za-z0-9._-]+")
+
+project_root = Path(__file__).resolve().parents[1]
+
+_SESSION_CONTEXT: ContextVar[Optional[Dict[str, str]]] = ContextVar("trader_session_context", default=None)
+_get_http_headers = None
+
+
+def session_headers(values: Dict[str, Any]) -> Dict[str, str]:
+    """Build the HTTP headers that carry a session context to the MCP tool servers.
+
+    Args:
+        values: {config key: value}, keys from SESSION_KEYS; None values are skipped
+
+    Returns:
+        {"X-Trader-Signature": ..., "X-Trader-Today-Date": ..., ...}
+    """
+    headers = {}
+    for key, value in values.items():
+        if key not in SESSION_KEYS:
+            raise ValueError(f"{key} is not a session config key, use one of {SESSION_KEYS}")
+        if value is not None:
+            name = "X-Trader-" + "-".join(part.capitalize() for part in key.split("_"))
+            headers[name] = str(value)
+    return headers
+
+
+def check_signature(signature: Any) -> str:
+    """Return signature if it is safe as a directory name, else raise ValueError."""
+    if not isinstance(signature, str) or not SIGNATURE_PATTERN.fullmatch(signature) or not signature.strip("."):
+        raise ValueError(f"Invalid signature {signature!r}, use letters, digits, '.', '_' and '-'")
+    return signature
+
+
+def join_under(root: Any, *parts: str) -> Path:
+    """Join parts onto root, raising ValueError if the result is not inside root."""
+    root = Path(os.path.abspath(root))
+    path = Path(os.path.normpath(root.joinpath(*parts)))
+    if path != root and root not in path.parents:
+        raise ValueError(f"{os.path.join(*parts)} is outside {root}")
+    return path
+
+
+def get_session_runtime_env_path(signature: str) -> str:
+    """Runtime env file of one signature: data/agent_data/{signature}/.runtime_env.json.
+
+    Agents and tool servers both derive it from the session's signature, so a
+    trade server can flag IF_TRADE for the agent that called it.
+    """
+    return str(join_under(project_root / "data" / "agent_data", check_signature(signature), ".runtime_env.json"))
+
+
+@contextmanager
+def use_session_context(values: Dict[str, Any]) -> Iterator[None]:
+    """Scope session config values to the current task/thread context (e.g. one in-process agent)."""
+    token = _SESSION_CONTEXT.set({k: str(v) for k, v in values.items() if v is not None})
+    try:
+        yield
+    finally:
+        _SESSION_CONTEXT.reset(token)
+
+
+def get_session_context() -> Dict[str, str]:
+    """Session config of the current request: use_session_context values, else X-Trader-* headers.
+
+    Returns an empty dict outside a session, in which case callers fall back to
+    the runtime env file.
+    """
+    context = _SESSION_CONTEXT.get()
+    if context is not None:
+        return context
+    global _get_http_headers
+    if _get_http_headers is None:
+        try:
+            from fastmcp.server.dependencies import get_http_headers
+        except ImportError:
+            get_http_headers = dict
+        _get_http_headers = get_http_headers
+    context = {}
+    for name, value in _get_http_headers().items():
+        if name.startswith(SESSION_HEADER_PREFIX):
+            key = name[len(SESSION_HEADER_PREFIX):].replace("-", "_").upper()
+            if key in SESSION_KEYS:
+                context[key] = value
+    if "SIGNATURE" in context:
+        check_signature(context["SIGNATURE"])
+    return context
+
+
+@contextmanager
+def use_agent_session(signature: str, today_date: str, log_path: str, market: str) -> Iterator[None]:
+    """Scope one agent's trading session: its own config reads and every MCP tool call it makes.
+
+    Config reads and writes inside the session go to the signature's runtime
+    env file (get_session_runtime_env_path). LOG_PATH is written there too, as
+    the tool servers only get the signature, date and market from a request.
+
+    Args:
+        signature: Model signature
+        today_date: Current trading date or hour
+        log_path: Base log path of the agent data
+        market: "us", "cn" or "crypto"
+    """
+    with use_session_context(
+        {"SIGNATURE": check_signature(signature), "TODAY_DATE": today_date, "LOG_PATH": log_path, "MARKET": market}
+    ):
+        write_config_value("LOG_PATH", log_path)
+        yield
+
+
+class SessionHeadersAuth(httpx.Auth):
+    """httpx auth hook that sends the caller's session context as X-Trader-* headers.
+
+    The headers are read when each request is sent rather than when the MCP
+    client is built, so one client and one set of loaded tools serve every
+    agent and trading day of a process.
+    """
+
+    def auth_flow(self, request: httpx.Request) -> Iterator[httpx.Request]:
+        context = _SESSION_CONTEXT.get() or {}
+        request.headers.update(session_headers({k: v for k, v in context.items() if k in SESSION_KEYS}))
+        yield request
+
+
+def get_session_mcp_config(mcp_config: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Copy of an MCP configuration whose HTTP connections carry the caller's session context.
+
+    Tool servers read SIGNATURE, TODAY_DATE and MARKET from these headers
+    before falling back to the signature's runtime env file, so several agents can
+    share one set of MCP servers. Wrap tool calls in use_agent_session.
+    """
+    config = {}
+    for name, connection in mcp_config.items():
+        connection = dict(connection)
+        if connection.get("transport") in ("streamable_http", "sse") and "auth" not in connection:
+            connection["auth"] = SessionHeadersAuth()
+        config[name] = connection
+    return config
+
+
+# RUNTIME_ENV_PATH value -> resolved absolute path (directory already created)
+_RESOLVED_PATHS: Dict[Optional[str], str] = {}
+# Session signature -> its runtime env path (directory already created)
+_SESSION_PATHS: Dict[str, str] = {}
+
+
 def _resolve_runtime_env_path() -> str:
     """Resolve runtime env path from RUNTIME_ENV_PATH in .env file.
     
     Simple strategy:
-    1. Read RUNTIME_ENV_PATH from environment (.env file)
-    2. If relative path, resolve from project root
-    3. Return the path (will be created by write_config_value if needed)
+    1. Inside a session, use the signature's file (get_session_runtime_env_path)
+    2. Else read RUNTIME_ENV_PATH from environment (.env file)
+    3. If relative path, resolve from project root
+    4. Return the path (will be created by write_config_value if needed)
     """
-    path = os.environ.get("RUNTIME_ENV_PATH")
-    
+    signature = get_session_context().get("SIGNATURE")
+    if signature is not None:
+        path = _SESSION_PATHS.get(signature)
+        if path is None:
+            path = get_session_runtime_env_path(signature)
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            _SESSION_PATHS[signature] = path
+        return path
+    raw_path = os.environ.get("RUNTIME_ENV_PATH")
+    resolved = _RESOLVED_PATHS.get(raw_path)
+    if resolved is not None:
+        return resolved
+    path = raw_path
+
     if not path:
         # Fallback to default if not set
         path = "data/.runtime_env.json"
     
     # If relative path, resolve from project root
     if not os.path.isabs(path):
-        base_dir = Path(__file__).resolve().parents[1]
-        path = str(base_dir / path)
+        path = str(project_root / path)
     
     # Ensure directory exists
     Path(path).parent.mkdir(parents=True, exist_ok=True)
-    
+
+    _RESOLVED_PATHS[raw_path] = path
     return path
 
 
+# path -> ((st_ino, st_mtime_ns, st_size), parsed config). A file replaced by
+# another process gets a new inode (writes go through rename), so a matching
+# stat means the cached dict is still what is on disk.
+_RUNTIME_ENV_CACHE: Dict[str, Tuple[Tuple[int, int, int], dict]] = {}
+_RUNTIME_ENV_LOCK = threading.Lock()
+
+
 def _load_runtime_env() -> dict:
+    """Load the runtime env file, reusing the cached dict while the file is unchanged.
+
+    The returned dict is shared with the cache and must not be modified.
+    """
     path = _resolve_runtime_env_path()
     if path is None:
         return {}
     try:
-        if os.path.exists(path):
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                if isinstance(data, dict):
-                    return data
+        st = os.stat(path)
+    except OSError:
+        return {}
+    stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+    cached = _RUNTIME_ENV_CACHE.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    data = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            loaded = json.load(f)
+            if isinstance(loaded, dict):
+                data = loaded
     except Exception:
         pass
-    return {}
+    _RUNTIME_ENV_CACHE[path] = (stamp, data)
+    return data
 
 
 def get_config_value(key: str, default=None):
+    """Get a config value: the request's session context first, then the runtime env file, then os.environ."""
+    session = get_session_context()
+    if key in session:
+        return session[key]
     _RUNTIME_ENV = _load_runtime_env()
 
     if key in _RUNTIME_ENV:
@@ -55,18 +251,43 @@ def get_config_value(key: str, default=None):
     return os.getenv(key, default)
 
 
-def write_config_value(key: str, value: Any):
+def write_config_values(values: Dict[str, Any]):
+    """Write several runtime config values with one read and one atomic file replace.
+
+    The new file is written next to the old one and renamed over it, so readers
+    in other processes never see a half-written file. Nothing is written when
+    every value is already set.
+
+    Args:
+        values: {key: value} to set in the runtime env file
+    """
     path = _resolve_runtime_env_path()
     if path is None:
-        print(f"⚠️  WARNING: RUNTIME_ENV_PATH not set, config value '{key}' not persisted")
+        print(f"⚠️  WARNING: RUNTIME_ENV_PATH not set, config values {list(values)} not persisted")
         return
-    _RUNTIME_ENV = _load_runtime_env()
-    _RUNTIME_ENV[key] = value
-    try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(_RUNTIME_ENV, f, ensure_ascii=False, indent=4)
-    except Exception as e:
-        print(f"❌ Error writing config to {path}: {e}")
+    with _RUNTIME_ENV_LOCK:
+        current = _load_runtime_env()
+        if all(key in current and current[key] == value for key, value in values.items()):
+            return
+        _RUNTIME_ENV = dict(current)
+        _RUNTIME_ENV.update(values)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(_RUNTIME_ENV, f, ensure_ascii=False, indent=4)
+            os.replace(tmp_path, path)
+            st = os.stat(path)
+            _RUNTIME_ENV_CACHE[path] = ((st.st_ino, st.st_mtime_ns, st.st_size), _RUNTIME_ENV)
+        except Exception as e:
+            print(f"❌ Error writing config to {path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def write_config_value(key: str, value: Any):
+    write_config_values({key: value})
 
 
 def extract_conversation(conversation: dict, output_type: str):
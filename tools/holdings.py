@@ -0,0 +1,161 @@
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Cash is kept in 1e-4 currency units; quantities in whole shares for stocks
+# and 1e-4 coin units for crypto. Only to_positions() turns them back into the
+# floats written to position.jsonl and shown to the model.
+CASH_SCALE = 10_000
+QUANTITY_SCALES = {"us": 1, "cn": 1, "crypto": 10_000}
+
+
+class SymbolUniverse:
+    """Stable symbol -> index mapping shared by all holdings of one market."""
+
+    def __init__(self, symbols: Optional[List[str]] = None):
+        self.symbols: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        for symbol in symbols or []:
+            self.index(symbol)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def index(self, symbol: str) -> int:
+        """Get the index of symbol, adding it to the universe if it is new."""
+        i = self._index.get(symbol)
+        if i is None:
+            with self._lock:
+                i = self._index.get(symbol)
+                if i is None:
+                    i = len(self.symbols)
+                    self.symbols.append(symbol)
+                    self._index[symbol] = i
+        return i
+
+
+_UNIVERSES: Dict[str, SymbolUniverse] = {}
+_UNIVERSES_LOCK = threading.Lock()
+
+
+def get_universe(market: str) -> SymbolUniverse:
+    """Get the process-wide SymbolUniverse of a market."""
+    with _UNIVERSES_LOCK:
+        universe = _UNIVERSES.get(market)
+        if universe is None:
+            universe = SymbolUniverse()
+            _UNIVERSES[market] = universe
+    return universe
+
+
+def to_cash_units(value: float) -> int:
+    return int(round(value * CASH_SCALE))
+
+
+class Holdings:
+    """Fixed-point holdings of one position: int64 quantities over a SymbolUniverse plus int cash.
+
+    Trades change integers only, so thousands of chained trades do not drift
+    the way repeated float additions (and round(..., 4)) do. Cash moves by the
+    trade value rounded once to 1e-4.
+    """
+
+    def __init__(self, market: str, universe: Optional[SymbolUniverse] = None):
+        self.market = market
+        self.scale = QUANTITY_SCALES.get(market, 1)
+        self.universe = universe or get_universe(market)
+        self.quantities = np.zeros(len(self.universe), dtype=np.int64)
+        self.cash = 0
+        # Symbols in the order of the original position dict, so JSON output keeps its key order
+        self._keys: List[str] = []
+
+    @classmethod
+    def from_positions(
+        cls, positions: Dict[str, float], market: str, universe: Optional[SymbolUniverse] = None
+    ) -> "Holdings":
+        """Build holdings from a position dict such as {"AAPL": 10, "CASH": 5000.0}."""
+        holdings = cls(market, universe)
+        for symbol, quantity in positions.items():
+            if symbol == "CASH":
+                holdings.cash = to_cash_units(quantity or 0)
+                holdings._keys.append("CASH")
+            else:
+                holdings._set(symbol, holdings.to_units(quantity or 0))
+        return holdings
+
+    def _slot(self, symbol: str) -> int:
+        i = self.universe.index(symbol)
+        if i >= len(self.quantities):
+            grown = np.zeros(len(self.universe), dtype=np.int64)
+            grown[: len(self.quantities)] = self.quantities
+            self.quantities = grown
+        if symbol not in self._keys:
+            self._keys.append(symbol)
+        return i
+
+    def _set(self, symbol: str, units: int) -> None:
+        i = self._slot(symbol)
+        self.quantities[i] = units
+
+    def to_units(self, quantity: float) -> int:
+        """Convert a quantity (shares or coins) to fixed-point units."""
+        return int(round(quantity * self.scale))
+
+    def units(self, symbol: str) -> int:
+        i = self.universe.index(symbol)
+        return int(self.quantities[i]) if i < len(self.quantities) else 0
+
+    def quantity(self, symbol: str) -> float:
+        """Quantity of symbol as shares (int) or coins (float)."""
+        units = self.units(symbol)
+        return units if self.scale == 1 else units / self.scale
+
+    @property
+    def cash_value(self) -> float:
+        return self.cash / CASH_SCALE
+
+    def trade_cash_units(self, units: int, price: float) -> int:
+        """Cash units of trading units of a symbol at price, rounded once."""
+        return to_cash_units(price * units / self.scale)
+
+    def buy(self, symbol: str, units: int, price: float) -> None:
+        self.cash -= self.trade_cash_units(units, price)
+        i = self._slot(symbol)
+        self.quantities[i] += units
+
+    def sell(self, symbol: str, units: int, price: float) -> None:
+        self.cash += self.trade_cash_units(units, price)
+        i = self._slot(symbol)
+        self.quantities[i] -= units
+
+    def price_vector(self, prices: Dict[str, Optional[float]]) -> np.ndarray:
+        """Align {symbol: price} to the universe; symbols without a price get 0."""
+        vector = np.zeros(len(self.quantities), dtype=np.float64)
+        for symbol, price in prices.items():
+            if price is not None:
+                i = self.universe.index(symbol)
+                if i < len(vector):
+                    vector[i] = price
+        return vector
+
+    def value(self, price_vector: np.ndarray) -> float:
+        """Total value (cash plus holdings) at a price vector aligned to the universe."""
+        return self.cash_value + float(self.quantities @ price_vector[: len(self.quantities)]) / self.scale
+
+    def copy(self) -> "Holdings":
+        other = Holdings(self.market, self.universe)
+        other.quantities = self.quantities.copy()
+        other.cash = self.cash
+        other._keys = list(self._keys)
+        return other
+
+    def to_positions(self) -> Dict[str, float]:
+        """Convert back to a position dict (the JSON / model boundary)."""
+        positions: Dict[str, float] = {}
+        for symbol in self._keys:
+            positions[symbol] = self.cash_value if symbol == "CASH" else self.quantity(symbol)
+        if "CASH" not in positions:
+            positions["CASH"] = self.cash_value
+        return positions
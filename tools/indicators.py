@@ -0,0 +1,236 @@
+import argparse
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Ensure project root is on sys.path when run as a script
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from tools.price_store import CLOSE, HIGH, LOW, FIELDS
+
+# Public indicator names, in column order of the cache
+INDICATORS = (
+    "sma_20",
+    "sma_50",
+    "ema_12",
+    "ema_26",
+    "rsi_14",
+    "atr_14",
+    "realized_vol_20",
+    "momentum_10",
+)
+# Recursion state stored alongside the indicators so the tail can be resumed
+_STATE_COLUMNS = ("_rsi_avg_gain_14", "_rsi_avg_loss_14")
+COLUMNS = INDICATORS + _STATE_COLUMNS
+_COL = {name: i for i, name in enumerate(COLUMNS)}
+
+INDICATORS_VERSION = 1
+
+
+def get_indicator_dir(merged_file: Path) -> Path:
+    """Get the indicator cache directory for a merged.jsonl file, e.g. data/merged.indicators/"""
+    merged_file = Path(merged_file)
+    return merged_file.with_name(merged_file.stem + ".indicators")
+
+
+def _rolling(x: np.ndarray, window: int, start: int, func) -> np.ndarray:
+    """Apply func over each trailing window ending at start..len(x)-1; NaN until the window is full."""
+    out = np.full(len(x) - start, np.nan)
+    first = max(start, window - 1)
+    if first >= len(x):
+        return out
+    windows = np.lib.stride_tricks.sliding_window_view(x[first - window + 1:], window)
+    out[first - start:] = func(windows)
+    return out
+
+
+def _recursive_mean(x: np.ndarray, window: int, alpha: float, out: np.ndarray, start: int) -> None:
+    """Fill out[start:] with out[i] = alpha * x[i] + (1 - alpha) * out[i - 1].
+
+    The recursion is seeded with the mean of the first `window` finite values
+    and resumes from the last finite value of out[:start]. NaN inputs yield
+    NaN and leave the state unchanged.
+    """
+    finite = np.flatnonzero(np.isfinite(out[:start]))
+    if len(finite):
+        state, seed = float(out[finite[-1]]), None
+    else:
+        state, seed, start = None, [], 0
+    for i in range(start, len(x)):
+        value = x[i]
+        if value != value:
+            out[i] = np.nan
+            continue
+        if state is None:
+            seed.append(value)
+            if len(seed) < window:
+                out[i] = np.nan
+                continue
+            state = sum(seed) / window
+        else:
+            state = alpha * value + (1 - alpha) * state
+        out[i] = state
+
+
+def compute_indicators(ohlcv: np.ndarray, previous: Optional[np.ndarray] = None, start: int = 0) -> np.ndarray:
+    """Compute every indicator column for an OHLCV series.
+
+    Args:
+        ohlcv: float64 array of shape (bars, len(FIELDS))
+        previous: Cached indicator values; rows before start are kept as is
+        start: First row to (re)compute
+
+    Returns:
+        float64 array of shape (bars, len(COLUMNS))
+    """
+    n = len(ohlcv)
+    out = np.full((n, len(COLUMNS)), np.nan)
+    start = min(start, len(previous) if previous is not None else 0)
+    if start:
+        out[:start] = previous[:start]
+
+    close, high, low = ohlcv[:, CLOSE], ohlcv[:, HIGH], ohlcv[:, LOW]
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Simple moving averages
+        out[start:, _COL["sma_20"]] = _rolling(close, 20, start, lambda w: w.mean(axis=1))
+        out[start:, _COL["sma_50"]] = _rolling(close, 50, start, lambda w: w.mean(axis=1))
+
+        # Exponential moving averages
+        _recursive_mean(close, 12, 2 / 13, out[:, _COL["ema_12"]], start)
+        _recursive_mean(close, 26, 2 / 27, out[:, _COL["ema_26"]], start)
+
+        # RSI with Wilder smoothing
+        change = close - prev_close
+        _recursive_mean(np.where(np.isnan(change), np.nan, np.maximum(change, 0)), 14, 1 / 14, out[:, _COL["_rsi_avg_gain_14"]], start)
+        _recursive_mean(np.where(np.isnan(change), np.nan, np.maximum(-change, 0)), 14, 1 / 14, out[:, _COL["_rsi_avg_loss_14"]], start)
+        gain = out[start:, _COL["_rsi_avg_gain_14"]]
+        loss = out[start:, _COL["_rsi_avg_loss_14"]]
+        out[start:, _COL["rsi_14"]] = np.where(loss == 0, 100.0, 100 - 100 / (1 + gain / loss))
+
+        # Average true range with Wilder smoothing
+        true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+        _recursive_mean(true_range, 14, 1 / 14, out[:, _COL["atr_14"]], start)
+
+        # Per-bar standard deviation of log returns, not annualized
+        log_return = np.log(close / prev_close)
+        out[start:, _COL["realized_vol_20"]] = _rolling(log_return, 20, start, lambda w: w.std(axis=1, ddof=1))
+
+        # Rate of change over 10 bars
+        lagged = np.concatenate((np.full(min(10, n), np.nan), close[:-10]))
+        out[start:, _COL["momentum_10"]] = close[start:] / lagged[start:] - 1
+    return out
+
+
+def _first_changed_row(timestamps: List[str], ohlcv: np.ndarray, cached_timestamps: List[str], cached_ohlcv: np.ndarray) -> int:
+    """Index of the first bar that differs from the cached inputs (bars appended or rewritten)."""
+    n = min(len(timestamps), len(cached_timestamps))
+    n = next((i for i in range(n) if timestamps[i] != cached_timestamps[i]), n)
+    same = np.all((ohlcv[:n] == cached_ohlcv[:n]) | (np.isnan(ohlcv[:n]) & np.isnan(cached_ohlcv[:n])), axis=1)
+    changed = np.flatnonzero(~same)
+    return int(changed[0]) if len(changed) else n
+
+
+def _load_cache(path: Path) -> Optional[Tuple[List[str], np.ndarray, np.ndarray]]:
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != INDICATORS_VERSION or list(data["columns"]) != list(COLUMNS):
+                return None
+            return list(data["timestamps"]), data["ohlcv"], data["values"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _save_cache(path: Path, timestamps: List[str], ohlcv: np.ndarray, values: np.ndarray) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            version=np.array(INDICATORS_VERSION),
+            columns=np.array(COLUMNS),
+            timestamps=np.array(timestamps, dtype=str),
+            ohlcv=ohlcv,
+            values=values,
+        )
+    os.replace(tmp_path, path)
+
+
+def update_indicator_cache(merged_file: Path, symbol: str, timestamps: List[str], ohlcv: np.ndarray) -> np.ndarray:
+    """Bring the on-disk indicator cache of one symbol up to date and return its values.
+
+    Only the rows from the first new or changed bar onward are recomputed.
+
+    Args:
+        merged_file: Path to the merged.jsonl file the series comes from
+        symbol: Symbol of the series
+        timestamps: Sorted timestamps of the series
+        ohlcv: Aligned OHLCV array, shape (len(timestamps), len(FIELDS))
+
+    Returns:
+        float64 array of shape (len(timestamps), len(COLUMNS))
+    """
+    path = get_indicator_dir(merged_file) / f"{symbol}.npz"
+    cached = _load_cache(path)
+    if cached is None:
+        values = compute_indicators(ohlcv)
+    else:
+        cached_timestamps, cached_ohlcv, cached_values = cached
+        start = _first_changed_row(timestamps, ohlcv, cached_timestamps, cached_ohlcv)
+        if start == len(timestamps) == len(cached_timestamps):
+            return cached_values
+        values = compute_indicators(ohlcv, cached_values, start)
+    _save_cache(path, timestamps, ohlcv, values)
+    return values
+
+
+_INDICATOR_VALUES: Dict[Tuple[str, str], Tuple[np.ndarray, np.ndarray]] = {}
+_INDICATOR_LOCK = threading.Lock()
+
+
+def get_indicator_values(merged_file: Path, symbol: str, source) -> Tuple[List[str], np.ndarray]:
+    """Get (timestamps, indicator values) for a symbol, cached per process and on disk.
+
+    Args:
+        merged_file: Path to a merged.jsonl file
+        symbol: Symbol to read
+        source: PriceCube or PriceStore for merged_file
+
+    Returns:
+        Sorted timestamps and a float64 array of shape (len(timestamps), len(COLUMNS))
+    """
+    timestamps, ohlcv = source.ohlcv(symbol)
+    key = (str(Path(merged_file).resolve()), symbol)
+    cached = _INDICATOR_VALUES.get(key)
+    # source.ohlcv returns the same array object until the data file changes
+    if cached is not None and cached[0] is ohlcv:
+        return timestamps, cached[1]
+    with _INDICATOR_LOCK:
+        values = update_indicator_cache(merged_file, symbol, timestamps, ohlcv)
+        _INDICATOR_VALUES[key] = (ohlcv, values)
+    return timestamps, values
+
+
+if __name__ == "__main__":
+    from tools.price_tools import get_merged_file_path, get_price_source
+
+    parser = argparse.ArgumentParser(description="Update the on-disk technical indicator cache")
+    parser.add_argument("--market", choices=["us", "cn", "crypto", "all"], default="all", help="Market to update")
+    args = parser.parse_args()
+
+    markets = ["us", "cn", "crypto"] if args.market == "all" else [args.market]
+    for market in markets:
+        merged_file = get_merged_file_path(market)
+        source = get_price_source(merged_file)
+        if source is None:
+            print(f"⚠️  Skipping {market}: {merged_file} not found")
+            continue
+        for symbol in source.symbols:
+            get_indicator_values(merged_file, symbol, source)
+        print(f"✅ Updated {market} indicators: {get_indicator_dir(merged_file)}")
@@ -0,0 +1,844 @@
+import argparse
+import bisect
+import fcntl
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Ensure project root is on sys.path when run as a script
+project_root = Path(__file__).resolve().parents[1]
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from tools.general_tools import get_config_value, join_under
+from tools.holdings import Holdings
+
+CHECKPOINT_VERSION = 4
+
+# v1: every record carries the full "positions" dict (what docs/ reads)
+# v2: records carry only a "delta" of changed holdings plus CASH, with a full
+#     "positions" snapshot every POSITION_SNAPSHOT_EVERY records
+LEDGER_FORMATS = ("v1", "v2")
+
+
+def ledger_format() -> str:
+    """Get the configured position record format: "v1" (default) or "v2"."""
+    fmt = os.getenv("POSITION_LEDGER_FORMAT", "v1").strip().lower()
+    return fmt if fmt in LEDGER_FORMATS else "v1"
+
+
+def snapshot_every() -> int:
+    """Number of v2 records between full position snapshots (POSITION_SNAPSHOT_EVERY, default 50)."""
+    try:
+        return max(1, int(os.getenv("POSITION_SNAPSHOT_EVERY", "50")))
+    except ValueError:
+        return 50
+
+
+def checkpoint_every() -> int:
+    """Number of appended records between automatic checkpoints (POSITION_CHECKPOINT_EVERY, default 200)."""
+    try:
+        return max(1, int(os.getenv("POSITION_CHECKPOINT_EVERY", "200")))
+    except ValueError:
+        return 200
+
+
+def get_checkpoint_file(position_file: Path) -> Path:
+    """Get the checkpoint next to a position file, e.g. position/position.checkpoint.json"""
+    return Path(position_file).with_suffix(".checkpoint.json")
+
+
+def decode_record(record: dict, previous_positions: Optional[Dict[str, float]]) -> dict:
+    """Get record with full positions; a v2 delta is applied on top of the previous record's positions."""
+    if "delta" not in record:
+        return record
+    positions = dict(previous_positions or {})
+    positions.update(record["delta"])
+    decoded = {k: v for k, v in record.items() if k != "delta"}
+    decoded["positions"] = positions
+    return decoded
+
+
+def encode_record(
+    record: dict, previous_positions: Optional[Dict[str, float]], since_snapshot: int, fmt: str
+) -> dict:
+    """Get the form of record to write after a record holding previous_positions.
+
+    Args:
+        record: Record with full "positions"
+        previous_positions: Full positions of the last record in the file, None if there is none
+        since_snapshot: Delta records written since the last full snapshot
+        fmt: Ledger format, "v1" or "v2"
+
+    Returns:
+        record itself, or a v2 delta record if fmt is "v2" and no snapshot is due
+    """
+    positions = record.get("positions", {})
+    if fmt != "v2" or previous_positions is None or since_snapshot + 1 >= snapshot_every():
+        return record
+    if not set(previous_positions) <= set(positions):
+        # A holding disappeared, which a delta cannot express
+        return record
+    delta = {k: v for k, v in positions.items() if previous_positions.get(k) != v}
+    if "CASH" in positions:
+        delta["CASH"] = positions["CASH"]
+    encoded = {k: v for k, v in record.items() if k != "positions"}
+    encoded["delta"] = delta
+    return encoded
+
+
+def iter_position_records(path: Path) -> Iterator[dict]:
+    """Yield the records of a position file in file order, with full positions for v1 and v2 records."""
+    positions = None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(record, dict):
+                continue
+            record = decode_record(record, positions)
+            positions = record.get("positions", {})
+            yield record
+
+
+def read_last_lines(path: Path, k: int = 1, block_size: int = 8192) -> List[bytes]:
+    """Read the last k non-empty lines of a file, scanning backwards from EOF in blocks.
+
+    Only the blocks holding those lines are read, whatever the file size.
+
+    Args:
+        path: File to read
+        k: Number of lines
+        block_size: Bytes read per step
+
+    Returns:
+        Up to k lines in file order, without line endings
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        data = b""
+        while end > 0:
+            start = max(0, end - block_size)
+            f.seek(start)
+            data = f.read(end - start) + data
+            end = start
+            # k complete lines need k + 1 separators unless the start of the file is reached
+            if data.count(b"\n") > k:
+                break
+    pieces = data.split(b"\n")
+    if end > 0:
+        # The piece before the first newline may be a partial line
+        pieces = pieces[1:]
+    lines = [line.rstrip(b"\r") for line in pieces if line.strip()]
+    return lines[-k:] if k else []
+
+
+def read_last_records(path: Path, k: int = 1) -> List[dict]:
+    """Parse the last k records of a position file (as written: v2 records may be deltas).
+
+    Lines that do not parse, such as a final append torn by a crash, are
+    skipped with a warning and the scan reaches further back, so k records are
+    returned whenever the file holds that many.
+    """
+    if k <= 0:
+        return []
+    n = k
+    while True:
+        lines = read_last_lines(path, n)
+        records = []
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                records.append(record)
+        if len(records) >= k or len(lines) < n:
+            break
+        n += k - len(records)
+    if len(records) < len(lines):
+        print(f"⚠️  {path}: skipped {len(lines) - len(records)} unparsable line(s) near the end (torn append?)")
+    return records[-k:]
+
+
+def last_position_date(path: Path) -> Optional[str]:
+    """Date of the last record in a position file, or None if it has none.
+
+    Records are appended in date order, so this is the newest processed date.
+    A torn last line is skipped, so the date of the last complete record is
+    returned rather than None.
+    """
+    records = read_last_records(path, 1)
+    return records[-1].get("date") if records else None
+
+
+def read_tail_record(path: Path) -> Optional[dict]:
+    """Last record of a position file with full positions, read from the end of the file.
+
+    A v2 delta is rebuilt from the nearest snapshot before it, which is at most
+    POSITION_SNAPSHOT_EVERY lines back. Returns None for a missing or empty file.
+    """
+    k = 1
+    while True:
+        try:
+            records = read_last_records(path, k)
+        except OSError:
+            return None
+        snapshots = [i for i, record in enumerate(records) if "delta" not in record]
+        if snapshots:
+            record, positions = None, None
+            for record in records[snapshots[-1]:]:
+                record = decode_record(record, positions)
+                positions = record.get("positions", {})
+            return record
+        if len(records) < k:
+            # No snapshot at all: only a full replay can rebuild the positions
+            return None
+        k *= 2
+
+
+def count_records(path: Path, block_size: int = 1 << 20) -> int:
+    """Number of records in a position file, counted from its line breaks without parsing JSON.
+
+    A last line without a newline counts only if it parses (a torn append does not).
+    """
+    count = 0
+    last = b""
+    try:
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    break
+                count += block.count(b"\n")
+                last = (last + block).rsplit(b"\n", 1)[-1]
+    except OSError:
+        return 0
+    if last.strip():
+        try:
+            count += isinstance(json.loads(last), dict)
+        except ValueError:
+            pass
+    return count
+
+
+def get_position_file(signature: str, log_path: Optional[str] = None) -> Path:
+    """Get {LOG_PATH}/{signature}/position/position.jsonl for a signature.
+
+    Args:
+        signature: Model signature
+        log_path: Log directory, defaults to the LOG_PATH config value
+
+    Returns:
+        Path to the position file (it may not exist yet)
+    """
+    # Get log_path from config, default to "agent_data" for backward compatibility
+    if log_path is None:
+        log_path = get_config_value("LOG_PATH", "./data/agent_data")
+
+    # Handle different path formats:
+    # - If it's an absolute path (like temp directory), use it directly
+    # - If it's a relative path starting with "./data/", remove the prefix and prepend base_dir/data
+    # - Otherwise, treat as relative to base_dir/data
+    # The signature may come from a request, so it must not leave the log directory
+    if os.path.isabs(log_path):
+        return join_under(log_path, signature) / "position" / "position.jsonl"
+    if log_path.startswith("./data/"):
+        log_path = log_path[7:]  # Remove "./data/" prefix
+    return join_under(project_root / "data" / log_path, signature) / "position" / "position.jsonl"
+
+
+def position_lock(signature: str):
+    """Context manager for file-based lock to serialize position updates per signature."""
+    class _Lock:
+        def __init__(self, name: str):
+            base_dir = join_under(project_root / "data" / "agent_data", name)
+            base_dir.mkdir(parents=True, exist_ok=True)
+            self.lock_path = base_dir / ".position.lock"
+            # Ensure lock file exists
+            self._fh = open(self.lock_path, "a+")
+        def __enter__(self):
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
+            return self
+        def __exit__(self, exc_type, exc, tb):
+            try:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+            finally:
+                self._fh.close()
+    return _Lock(signature)
+
+
+class SettlementBook:
+    """T+1 lot book: shares bought per acquisition day, per symbol.
+
+    Lots are keyed by trading day (the YYYY-MM-DD part of a record date). Only
+    the most recent KEEP_DAYS days with buys are kept; a day at or before the
+    newest pruned one is reported as unknown so callers can fall back to a scan.
+    """
+
+    KEEP_DAYS = 5
+
+    def __init__(self, lots: Optional[Dict[str, Dict[str, float]]] = None, pruned_through: Optional[str] = None):
+        self._lots: Dict[str, Dict[str, float]] = lots or {}
+        self._pruned_through = pruned_through
+
+    def record(self, date: str, action: dict) -> None:
+        """Add the lot of a "buy" action made on date."""
+        if action.get("action") != "buy" or not action.get("symbol"):
+            return
+        day = date[:10]
+        lots = self._lots.setdefault(day, {})
+        lots[action["symbol"]] = lots.get(action["symbol"], 0) + action.get("amount", 0)
+        if len(self._lots) > self.KEEP_DAYS:
+            oldest = min(self._lots)
+            del self._lots[oldest]
+            self._pruned_through = max(self._pruned_through or oldest, oldest)
+
+    def bought_on(self, date: str, symbol: str) -> Optional[float]:
+        """Shares of symbol bought on date's trading day, or None if that day was pruned."""
+        day = date[:10]
+        if self._pruned_through is not None and day <= self._pruned_through:
+            return None
+        return self._lots.get(day, {}).get(symbol, 0)
+
+    def to_dict(self) -> dict:
+        return {"lots": self._lots, "pruned_through": self._pruned_through}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SettlementBook":
+        return cls(data.get("lots"), data.get("pruned_through"))
+
+
+class PositionLedger:
+    """Incrementally-read view of one signature's position.jsonl.
+
+    Keeps, per record date, the (id, byte offset, length) of the record with
+    the highest id, plus the newest record overall and the next free id. Each
+    refresh only parses the bytes appended since the previous one; the file is
+    re-read from the start if it was replaced (inode change) or truncated.
+
+    The same state is periodically saved to position.checkpoint.json, so a cold
+    reader loads the checkpoint and only replays the records written after it.
+
+    v2 delta records are decoded on the way in: the positions of the last line
+    are kept, and a delta record further back is rebuilt from the nearest full
+    snapshot before it. Every record handed out carries full "positions".
+
+    A SettlementBook of recent buys is kept alongside (and checkpointed), so
+    the T+1 "bought today" check does not scan the file either.
+
+    The last record's positions are also kept as fixed-point Holdings, which
+    the trade tools update and hand back through append_many, so consecutive
+    trades never convert a position dict; dicts are only built for the JSON
+    line and the model.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.checkpoint_path = get_checkpoint_file(self.path)
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._inode: Optional[int] = None
+        self._offset = 0
+        self._dates: Dict[str, Tuple[int, int, int]] = {}
+        self._sorted_dates: List[str] = []
+        self._latest: Optional[dict] = None
+        self._next_id = 0
+        self._since_checkpoint = 0
+        # Full positions of the last line, and byte offsets of full snapshot lines
+        self._tail_positions: Optional[Dict[str, float]] = None
+        self._tail_record: Optional[dict] = None
+        self._tail_holdings: Optional[Holdings] = None
+        self._record_count = 0
+        self._snapshot_offsets: List[int] = []
+        self._since_snapshot = 0
+        self._settlement = SettlementBook()
+
+    def _apply(self, record: dict, offset: int, length: int) -> None:
+        if "delta" in record:
+            self._since_snapshot += 1
+        else:
+            self._snapshot_offsets.append(offset)
+            self._since_snapshot = 0
+        record = decode_record(record, self._tail_positions)
+        self._tail_positions = record.get("positions", {})
+        self._tail_record = record
+        self._tail_holdings = None
+        self._record_count += 1
+        date, record_id = record.get("date"), record.get("id", -1)
+        if not date:
+            return
+        self._settlement.record(date, record.get("this_action", {}))
+        current = self._dates.get(date)
+        if current is None:
+            bisect.insort(self._sorted_dates, date)
+        if current is None or record_id > current[0]:
+            self._dates[date] = (record_id, offset, length)
+        if self._latest is None or (date, record_id) > (self._latest.get("date"), self._latest.get("id", -1)):
+            self._latest = record
+        self._next_id = max(self._next_id, record_id + 1)
+        self._since_checkpoint += 1
+
+    def _load_checkpoint(self, st: os.stat_result) -> None:
+        """Restore the state saved by write_checkpoint if it still describes the file."""
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError):
+            return
+        if checkpoint.get("version") != CHECKPOINT_VERSION or checkpoint.get("inode") != st.st_ino:
+            return
+        offset, latest = checkpoint.get("offset", 0), checkpoint.get("latest")
+        if not latest or offset > st.st_size:
+            return
+        # The newest record must still sit right before the checkpointed offset,
+        # otherwise the file was rewritten in place and the checkpoint is stale
+        latest_offset, latest_length = checkpoint.get("latest_span", (0, 0))
+        if latest_offset + latest_length != offset:
+            return
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(latest_offset)
+                line = json.loads(f.read(latest_length))
+        except (OSError, ValueError):
+            return
+        if (line.get("date"), line.get("id")) != (latest.get("date"), latest.get("id")):
+            return
+        self._dates = {date: tuple(entry) for date, entry in checkpoint.get("dates", {}).items()}
+        self._sorted_dates = sorted(self._dates)
+        self._latest = latest
+        self._next_id = checkpoint.get("next_id", 0)
+        self._offset = offset
+        self._since_checkpoint = 0
+        self._tail_positions = latest.get("positions", {})
+        self._tail_record = latest
+        self._tail_holdings = None
+        self._record_count = checkpoint.get("record_count", 0)
+        self._snapshot_offsets = checkpoint.get("snapshot_offsets", [])
+        self._since_snapshot = checkpoint.get("since_snapshot", 0)
+        self._settlement = SettlementBook.from_dict(checkpoint.get("settlement", {}))
+
+    def write_checkpoint(self) -> Optional[Path]:
+        """Save the current state to position.checkpoint.json; callers hold position_lock.
+
+        Returns:
+            Path to the checkpoint, or None if the ledger is empty
+        """
+        with self._lock:
+            self.refresh()
+            if self._latest is None:
+                return None
+            latest_date = self._latest.get("date")
+            _, latest_offset, latest_length = self._dates[latest_date]
+            if latest_offset + latest_length != self._offset:
+                # The newest (date, id) record is not the last line of the file;
+                # keep replaying from the start rather than saving an unverifiable state
+                return None
+            checkpoint = {
+                "version": CHECKPOINT_VERSION,
+                "inode": self._inode,
+                "offset": self._offset,
+                "next_id": self._next_id,
+                "latest": self._latest,
+                "latest_span": [latest_offset, latest_length],
+                "dates": self._dates,
+                "snapshot_offsets": self._snapshot_offsets,
+                "since_snapshot": self._since_snapshot,
+                "settlement": self._settlement.to_dict(),
+                "record_count": self._record_count,
+            }
+            tmp_path = self.checkpoint_path.with_name(self.checkpoint_path.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(checkpoint, f)
+            os.replace(tmp_path, self.checkpoint_path)
+            self._since_checkpoint = 0
+            return self.checkpoint_path
+
+    def refresh(self) -> None:
+        """Read the records appended since the last refresh."""
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                self._reset()
+                return
+            if st.st_ino != self._inode or st.st_size < self._offset:
+                self._reset()
+                self._inode = st.st_ino
+                self._load_checkpoint(st)
+            if st.st_size == self._offset:
+                return
+            with open(self.path, "rb") as f:
+                f.seek(self._offset)
+                data = f.read(st.st_size - self._offset)
+            offset = self._offset
+            # Only consume complete lines; a partially written last line is read next time.
+            # A last line without newline that parses as a record is complete, though
+            # (some committed ledgers end that way).
+            end = data.rfind(b"\n") + 1
+            if data[end:].strip():
+                try:
+                    if isinstance(json.loads(data[end:]), dict):
+                        end = len(data)
+                except ValueError:
+                    pass
+            for line in data[:end].splitlines(keepends=True):
+                if line.strip():
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        record = None
+                    if isinstance(record, dict):
+                        self._apply(record, offset, len(line))
+                offset += len(line)
+            self._offset = offset
+
+    def _read_record(self, date: str) -> Optional[dict]:
+        entry = self._dates.get(date)
+        if entry is None:
+            return None
+        if self._latest is not None and self._latest.get("date") == date:
+            return self._latest
+        _, offset, length = entry
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            record = json.loads(f.read(length))
+            if "delta" not in record:
+                return record
+            # Replay from the nearest full snapshot up to and including this record
+            i = bisect.bisect_right(self._snapshot_offsets, offset)
+            start = self._snapshot_offsets[i - 1] if i else 0
+            f.seek(start)
+            positions = None
+            for line in f.read(offset + length - start).splitlines():
+                if line.strip():
+                    record = decode_record(json.loads(line), positions)
+                    positions = record.get("positions", {})
+            return record
+
+    @property
+    def next_id(self) -> int:
+        """Id for the next record appended to the ledger."""
+        self.refresh()
+        return self._next_id
+
+    @property
+    def latest(self) -> Optional[dict]:
+        """Newest record by (date, id), or None for an empty ledger."""
+        self.refresh()
+        return self._latest
+
+    @property
+    def tail_record(self) -> Optional[dict]:
+        """Last record in file order (with full positions), or None for an empty ledger."""
+        self.refresh()
+        return self._tail_record
+
+    def summary(self) -> Tuple[Optional[dict], int]:
+        """Last record in file order (with full positions) and the number of records.
+
+        A ledger that has not read the file yet and has no checkpoint to start
+        from reads the last record from the end of the file and counts lines,
+        rather than replaying every record.
+        """
+        with self._lock:
+            if self._inode is None and not self.checkpoint_path.exists():
+                tail = read_tail_record(self.path)
+                if tail is not None:
+                    return tail, count_records(self.path)
+            self.refresh()
+            return self._tail_record, self._record_count
+
+    @property
+    def record_count(self) -> int:
+        """Number of records in the file, kept up to date as records are read or appended."""
+        self.refresh()
+        return self._record_count
+
+    def dates(self) -> List[str]:
+        """Sorted distinct record dates."""
+        self.refresh()
+        return list(self._sorted_dates)
+
+    def record(self, date: str) -> Optional[dict]:
+        """The record with the highest id on date, or None."""
+        with self._lock:
+            self.refresh()
+            return self._read_record(date)
+
+    def latest_before(self, date: str) -> Optional[dict]:
+        """The highest-id record of the newest date strictly before date, or None."""
+        with self._lock:
+            self.refresh()
+            i = bisect.bisect_left(self._sorted_dates, date)
+            return self._read_record(self._sorted_dates[i - 1]) if i else None
+
+    def _latest_record(self, today_date: str) -> Optional[dict]:
+        record = self.record(today_date)
+        if record is None or not record.get("positions"):
+            record = self.latest_before(today_date)
+        return record
+
+    def latest_position(self, today_date: str) -> Tuple[Dict[str, float], int]:
+        """Positions and id of today's last record, else of the last record before today.
+
+        A ledger that has not read the file yet answers from the last record
+        (read_tail_record) when today is not before its date, as records are
+        appended in date order; only an earlier date needs a replay.
+
+        Returns:
+            (positions, id), or ({}, -1) if the ledger holds nothing up to today
+        """
+        with self._lock:
+            if self._inode is None:
+                tail = read_tail_record(self.path)
+                if tail is not None and tail.get("positions") and tail.get("date", "") <= today_date:
+                    return dict(tail["positions"]), tail.get("id", -1)
+            record = self._latest_record(today_date)
+            if record is None:
+                return {}, -1
+            return dict(record.get("positions", {})), record.get("id", -1)
+
+    def latest_holdings(self, today_date: str, market: str) -> Tuple[Holdings, int]:
+        """latest_position as fixed-point Holdings, for the trade tools.
+
+        Args:
+            today_date: Trading date (TODAY_DATE)
+            market: Holdings market, which sets the quantity scale ("crypto" or a stock market)
+
+        Returns:
+            (holdings, id), a copy the caller may trade on; empty holdings and -1
+            if the ledger holds nothing up to today
+        """
+        with self._lock:
+            record = self._latest_record(today_date)
+            if record is None:
+                return Holdings(market), -1
+            if record is not self._tail_record:
+                return Holdings.from_positions(record.get("positions", {}), market), record.get("id", -1)
+            if self._tail_holdings is None or self._tail_holdings.market != market:
+                self._tail_holdings = Holdings.from_positions(record.get("positions", {}), market)
+            return self._tail_holdings.copy(), record.get("id", -1)
+
+    def bought_on(self, date: str, symbol: str) -> float:
+        """Shares of symbol bought on date's trading day (the T+1 unsettled amount)."""
+        with self._lock:
+            self.refresh()
+            amount = self._settlement.bought_on(date, symbol)
+            if amount is not None:
+                return amount
+        # Older than the settlement book remembers, count the day's buys in the file
+        day = date[:10]
+        return sum(
+            r["this_action"].get("amount", 0)
+            for r in iter_position_records(self.path)
+            if r.get("date", "")[:10] == day
+            and r.get("this_action", {}).get("action") == "buy"
+            and r["this_action"].get("symbol") == symbol
+        )
+
+    def sync(self) -> None:
+        """fsync position.jsonl, making every append so far durable."""
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def append(self, record: dict, holdings: Optional[Holdings] = None) -> None:
+        """Append a record to position.jsonl; callers hold position_lock for the signature.
+
+        Args:
+            record: Record with full "positions"; it is written as a v2 delta
+                    when POSITION_LEDGER_FORMAT=v2 and no full snapshot is due
+            holdings: The record's positions as Holdings, kept for the next latest_holdings call
+        """
+        self.append_many([record], holdings)
+
+    def append_many(self, records: List[dict], holdings: Optional[Holdings] = None) -> None:
+        """Append records in order with a single write; callers hold position_lock for the signature.
+
+        Args:
+            records: Records with full "positions"
+            holdings: The last record's positions as Holdings, kept for the next latest_holdings call
+        """
+        with self._lock:
+            self.refresh()
+            fmt = ledger_format()
+            positions, since_snapshot = self._tail_positions, self._since_snapshot
+            lines = []
+            for record in records:
+                line = encode_record(record, positions, since_snapshot, fmt)
+                since_snapshot = since_snapshot + 1 if "delta" in line else 0
+                positions = record.get("positions", {})
+                lines.append(json.dumps(line) + "\n")
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a+b") as f:
+                # Never glue a record onto a last line that lacks its newline
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        lines.insert(0, "\n")
+                f.write("".join(lines).encode("utf-8"))
+            self.refresh()
+            if holdings is not None and records and self._tail_record is not None:
+                if self._tail_record.get("id") == records[-1].get("id"):
+                    self._tail_holdings = holdings.copy()
+            if self._since_checkpoint >= checkpoint_every():
+                self.write_checkpoint()
+
+
+_LEDGERS: Dict[str, PositionLedger] = {}
+_LEDGERS_LOCK = threading.Lock()
+
+
+def get_position_ledger(signature: str) -> PositionLedger:
+    """Get the process-wide PositionLedger for a signature's current position file."""
+    return get_ledger(get_position_file(signature))
+
+
+def get_ledger(path: Path) -> PositionLedger:
+    """Get the process-wide PositionLedger of a position file."""
+    path = Path(path)
+    key = str(path.resolve())
+    with _LEDGERS_LOCK:
+        ledger = _LEDGERS.get(key)
+        if ledger is None:
+            ledger = PositionLedger(path)
+            _LEDGERS[key] = ledger
+    return ledger
+
+
+def write_position_checkpoint(signature: str) -> Optional[Path]:
+    """Checkpoint a signature's ledger, e.g. at the end of a trading session."""
+    with position_lock(signature):
+        return get_position_ledger(signature).write_checkpoint()
+
+
+def _rewrite_position_file(path: Path, records: Iterator[dict], fmt: str) -> None:
+    """Write full-position records to path in the given format, replacing it atomically."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    positions, since_snapshot = None, 0
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in records:
+            line = encode_record(record, positions, since_snapshot, fmt)
+            since_snapshot = since_snapshot + 1 if "delta" in line else 0
+            positions = record.get("positions", {})
+            f.write(json.dumps(line) + "\n")
+    os.replace(tmp_path, path)
+    # The old checkpoint describes the replaced file
+    get_checkpoint_file(path).unlink(missing_ok=True)
+
+
+def migrate_position_file(path: Path, fmt: str) -> Tuple[int, int]:
+    """Rewrite a position file in the given ledger format.
+
+    The new file is written next to the old one and renamed over it, and the
+    now stale checkpoint is removed. Callers hold position_lock.
+
+    Args:
+        path: Path to a position.jsonl file
+        fmt: Target ledger format, "v1" or "v2"
+
+    Returns:
+        (size before, size after) in bytes
+    """
+    path = Path(path)
+    old_size = path.stat().st_size
+    _rewrite_position_file(path, list(iter_position_records(path)), fmt)
+    return old_size, path.stat().st_size
+
+
+def compact_position_file(path: Path) -> Tuple[int, int]:
+    """Drop redundant no_trade records from a position file and checkpoint the result.
+
+    A no_trade record is redundant when its positions equal those of the record
+    before it. Every trading day (YYYY-MM-DD part of the date) keeps at least
+    its last record, and the file's last record is always kept, so daily
+    valuation and the resume date are unchanged. Record ids are kept as they
+    are. The file keeps its format (v2 if it holds any delta record), and a
+    fresh checkpoint is written so readers start from it with no tail to
+    replay. Callers hold position_lock.
+
+    Args:
+        path: Path to a position.jsonl file
+
+    Returns:
+        (records before, records after)
+    """
+    path = Path(path)
+    with open(path, "r", encoding="utf-8") as f:
+        fmt = "v2" if any('"delta"' in line for line in f) else "v1"
+    records = list(iter_position_records(path))
+
+    # Last record of each trading day, which stays even if redundant
+    last_of_day = {}
+    for i, record in enumerate(records):
+        last_of_day[record.get("date", "")[:10]] = i
+
+    kept = []
+    previous = None
+    for i, record in enumerate(records):
+        positions = record.get("positions", {})
+        redundant = (
+            record.get("this_action", {}).get("action") == "no_trade"
+            and previous is not None
+            and positions == previous
+            and last_of_day[record.get("date", "")[:10]] != i
+            and i != len(records) - 1
+        )
+        if not redundant:
+            kept.append(record)
+        previous = positions
+
+    _rewrite_position_file(path, kept, fmt)
+    PositionLedger(path).write_checkpoint()
+    return len(records), len(kept)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Position ledger maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate", help="Rewrite position.jsonl files in another ledger format")
+    migrate_parser.add_argument("--to", choices=LEDGER_FORMATS, default="v2", help="Target ledger format")
+    migrate_parser.add_argument(
+        "files", nargs="*", help="Position files (default: data/agent_data*/*/position/position.jsonl)"
+    )
+    compact_parser = subparsers.add_parser("compact", help="Drop redundant no_trade records and checkpoint a ledger")
+    compact_parser.add_argument("--signature", required=True, help="Model signature")
+    compact_parser.add_argument("--log-path", default=None, help="Log directory (default: LOG_PATH config)")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        position_file = get_position_file(args.signature, args.log_path)
+        if not position_file.exists():
+            print(f"❌ Position file {position_file} does not exist")
+            sys.exit(1)
+        # Same lock as the trade tools, so this is safe while the trade server is running
+        with position_lock(args.signature):
+            before, after = compact_position_file(position_file)
+        print(f"✅ {position_file}: {before} -> {after} records, checkpoint written")
+    elif args.command == "migrate":
+        files = [Path(f) for f in args.files] or sorted(project_root.glob("data/agent_data*/*/position/position.jsonl"))
+        for position_file in files:
+            if not position_file.exists():
+                print(f"⚠️  Skipping {position_file}: not found")
+                continue
+            # position/position.jsonl lives in the signature's directory
+            with position_lock(position_file.parent.parent.name):
+                old_size, new_size = migrate_position_file(position_file, args.to)
+            print(f"✅ {position_file}: {old_size} -> {new_size} bytes ({args.to})")
@@ -0,0 +1,288 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from tools.general_tools import write_config_value
+from tools.holdings import CASH_SCALE, Holdings
+from tools.ledger import get_position_ledger
+from tools.price_tools import get_latest_position, get_open_prices
+
+# Most orders accepted in one batch
+MAX_BATCH_ORDERS = 50
+
+
+def _order_market(symbol: str, market: Optional[str]) -> str:
+    if market is not None:
+        return market
+    # Auto-detect market type based on symbol format
+    return "cn" if symbol.endswith((".SH", ".SZ")) else "us"
+
+
+def _parse_order(order: Any, market: Optional[str]) -> Tuple[Optional[Tuple[str, str, float, str]], Optional[str]]:
+    """Normalize one order to (side, symbol, amount, market), or return the reason it is invalid."""
+    if not isinstance(order, dict):
+        return None, "Order must be an object with action, symbol and amount"
+    action = str(order.get("action", "")).strip().lower()
+    side = {"buy": "buy", "buy_crypto": "buy", "sell": "sell", "sell_crypto": "sell"}.get(action)
+    if side is None:
+        return None, f"Unknown action {order.get('action')!r}, use 'buy' or 'sell'"
+    symbol = order.get("symbol")
+    if not isinstance(symbol, str) or not symbol:
+        return None, "Missing symbol"
+    symbol_market = _order_market(symbol, market)
+    try:
+        amount = float(order.get("amount"))
+    except (TypeError, ValueError):
+        return None, f"Invalid amount format: {order.get('amount')!r}"
+    if not np.isfinite(amount):
+        return None, f"Invalid amount: {order.get('amount')!r}"
+    # Stocks trade whole shares, crypto allows decimals
+    if symbol_market != "crypto":
+        if amount != int(amount):
+            return None, f"Stock amounts must be whole shares, got {order.get('amount')!r}"
+        amount = int(amount)
+    if amount <= 0:
+        return None, f"Amount must be positive, got {amount}"
+    # 🇨🇳 Chinese A-shares trading rule: Must trade in lots of 100 shares (一手 = 100股)
+    if symbol_market == "cn" and amount % 100 != 0:
+        return None, f"Chinese A-shares must be traded in multiples of 100 shares (1 lot = 100 shares), got {amount}"
+    return (side, symbol, amount, symbol_market), None
+
+
+def execute_order_batch(
+    signature: str, today_date: str, orders: List[Dict[str, Any]], market: Optional[str] = None
+) -> Dict[str, Any]:
+    """Validate a batch of orders against one position snapshot and record all of them, or none.
+
+    Orders are applied in the given order to a copy of the latest position, so
+    cash freed by an earlier sell can pay for a later buy. Every order is
+    checked (amount, lot size, price, cash, holdings and the A-share T+1 rule);
+    if any fails, nothing is written and each failing order is reported. On
+    success the records get consecutive ids and are appended in one write.
+    Callers hold position_lock (the trade tools run this on the OrderExecutor).
+
+    Args:
+        signature: Model signature
+        today_date: Trading date (TODAY_DATE)
+        orders: [{"action": "buy"|"sell", "symbol": ..., "amount": ...}, ...]
+        market: "crypto" for the crypto server; None detects us/cn per symbol
+
+    Returns:
+        {"executed": [...], "positions": {...}, "date": ...} on success, or
+        {"error": ..., "rejected": [{"index", "order", "error"}, ...], "date": ...}
+    """
+    if not orders:
+        return {"error": "No orders given.", "date": today_date}
+    if len(orders) > MAX_BATCH_ORDERS:
+        return {"error": f"Too many orders in one batch ({len(orders)} > {MAX_BATCH_ORDERS}).", "date": today_date}
+
+    rejected = []
+    parsed = []
+    for i, order in enumerate(orders):
+        item, reason = _parse_order(order, market)
+        if reason is not None:
+            rejected.append({"index": i, "order": order, "error": reason})
+        parsed.append(item)
+
+    # One price lookup per market for the whole batch
+    symbols_by_market: Dict[str, List[str]] = {}
+    for item in parsed:
+        if item is not None:
+            symbols_by_market.setdefault(item[3], []).append(item[1])
+    prices: Dict[str, Optional[float]] = {}
+    for symbol_market, symbols in symbols_by_market.items():
+        prices.update(get_open_prices(today_date, sorted(set(symbols)), market=symbol_market))
+
+    ledger = get_position_ledger(signature)
+    # Stocks and crypto never share a batch, so one fixed-point scale covers every order
+    holdings, current_action_id = ledger.latest_holdings(today_date, "crypto" if market == "crypto" else "us")
+    bought_in_batch: Dict[str, int] = {}
+    records = []
+    for i, item in enumerate(parsed):
+        if item is None:
+            continue
+        side, symbol, amount, symbol_market = item
+        price = prices.get(f"{symbol}_price")
+        if price is None:
+            rejected.append({"index": i, "order": orders[i], "error": f"Symbol {symbol} not found or no price today"})
+            continue
+        units = holdings.to_units(amount)
+        if units == 0:
+            rejected.append(
+                {
+                    "index": i,
+                    "order": orders[i],
+                    "error": f"Amount {amount} is below the smallest tradable quantity {1 / holdings.scale}",
+                }
+            )
+            continue
+        # Record the quantity actually traded (crypto amounts are rounded to 1e-4)
+        amount = units if holdings.scale == 1 else units / holdings.scale
+        if side == "buy":
+            cost = holdings.trade_cash_units(units, price)
+            if holdings.cash - cost < 0:
+                rejected.append(
+                    {
+                        "index": i,
+                        "order": orders[i],
+                        "error": f"Insufficient cash: requires {cost / CASH_SCALE:.4f}, available {holdings.cash_value:.4f}",
+                    }
+                )
+                continue
+            holdings.buy(symbol, units, price)
+            bought_in_batch[symbol] = bought_in_batch.get(symbol, 0) + units
+        else:
+            have = holdings.units(symbol)
+            if have < units:
+                rejected.append(
+                    {
+                        "index": i,
+                        "order": orders[i],
+                        "error": f"Insufficient holdings: have {holdings.quantity(symbol)}, want to sell {amount}",
+                    }
+                )
+                continue
+            # 🇨🇳 Chinese A-shares T+1 trading rule: Cannot sell shares bought on the same day
+            if symbol_market == "cn":
+                bought_today = ledger.bought_on(today_date, symbol) + bought_in_batch.get(symbol, 0)
+                if units > have - bought_today:
+                    rejected.append(
+                        {
+                            "index": i,
+                            "order": orders[i],
+                            "error": f"T+1 restriction: {bought_today} shares of {symbol} were bought today, sellable {max(0, have - bought_today)}",
+                        }
+                    )
+                    continue
+            holdings.sell(symbol, units, price)
+        action = f"{side}_crypto" if symbol_market == "crypto" else side
+        records.append(
+            {
+                "date": today_date,
+                "id": current_action_id + 1 + len(records),
+                "this_action": {"action": action, "symbol": symbol, "amount": amount},
+                "positions": holdings.to_positions(),
+            }
+        )
+
+    if rejected:
+        rejected.sort(key=lambda r: r["index"])
+        return {"error": "Batch rejected, no order was executed.", "rejected": rejected, "date": today_date}
+
+    print(f"Writing {len(records)} records to position.jsonl: {json.dumps([r['this_action'] for r in records])}")
+    ledger.append_many(records, holdings)
+    write_config_value("IF_TRADE", True)
+    return {
+        "executed": [dict(r["this_action"], id=r["id"]) for r in records],
+        "positions": holdings.to_positions(),
+        "date": today_date,
+    }
+
+
+def plan_rebalance(
+    position: Dict[str, float], prices: Dict[str, float], weights: Dict[str, float], cash_buffer: float, market: str
+) -> List[Dict[str, Any]]:
+    """Compute the orders that move position to target weights of its total value.
+
+    Holdings without a weight are sold off. Every held symbol needs a price, as
+    it counts towards the total value the weights apply to. Target quantities are rounded down
+    to what the market allows (100-share lots for A-shares, whole shares for US
+    stocks, 4 decimals for crypto), so the buys never need more cash than the
+    sells free up plus cash_buffer of the portfolio value left aside. Sells
+    come first so the batch validates in order.
+
+    Args:
+        position: Current position, {symbol: quantity, "CASH": cash}
+        prices: {symbol: today's buy price} for every symbol that can trade today
+        weights: {symbol: target weight}, weights sum to at most 1
+        cash_buffer: Fraction of the portfolio value kept in cash
+        market: "us", "cn" or "crypto"
+
+    Returns:
+        Orders as accepted by execute_order_batch
+
+    Raises:
+        ValueError: A held symbol has no price
+    """
+    unpriced = sorted(s for s, quantity in position.items() if s != "CASH" and quantity and prices.get(s) is None)
+    if unpriced:
+        raise ValueError(f"No price today for held {', '.join(unpriced)}, cannot value the portfolio.")
+    symbols = sorted(s for s in set(position) | set(weights) if s != "CASH" and s in prices)
+    if not symbols:
+        return []
+    holdings = Holdings.from_positions(position, "crypto" if market == "crypto" else "us")
+    price = np.array([prices[s] for s in symbols], dtype=np.float64)
+    held = np.array([holdings.units(s) for s in symbols], dtype=np.int64)
+    weight = np.array([weights.get(s, 0.0) for s in symbols], dtype=np.float64)
+
+    total_value = holdings.value(holdings.price_vector(prices))
+    # Target quantities in fixed-point units, rounded down to the tradable step
+    target = weight * total_value * (1.0 - cash_buffer) / price * holdings.scale
+    step = 100 if market == "cn" else 1
+    target = (np.floor(target / step) * step).astype(np.int64)
+    delta = target - held
+
+    orders = []
+    for i in np.flatnonzero(delta < 0):
+        amount = int(-delta[i])
+        orders.append({"action": "sell", "symbol": symbols[i], "amount": amount / holdings.scale if market == "crypto" else amount})
+    for i in np.flatnonzero(delta > 0):
+        amount = int(delta[i])
+        orders.append({"action": "buy", "symbol": symbols[i], "amount": amount / holdings.scale if market == "crypto" else amount})
+    return orders
+
+
+def execute_rebalance(
+    signature: str, today_date: str, weights: Dict[str, float], cash_buffer: float, market: Optional[str] = None
+) -> Dict[str, Any]:
+    """Rebalance the latest position to target weights and record the orders atomically.
+
+    Callers hold position_lock (the trade tools run this on the OrderExecutor).
+
+    Args:
+        signature: Model signature
+        today_date: Trading date (TODAY_DATE)
+        weights: {symbol: target weight of the portfolio value}
+        cash_buffer: Fraction of the portfolio value kept in cash, 0 <= cash_buffer < 1
+        market: "crypto" for the crypto server; None detects us/cn from the symbols
+
+    Returns:
+        execute_order_batch's result plus the planned "orders"
+    """
+    if not isinstance(weights, dict) or not weights:
+        return {"error": "weights must be a non-empty {symbol: weight} object.", "date": today_date}
+    try:
+        weights = {str(s): float(w) for s, w in weights.items()}
+        cash_buffer = float(cash_buffer)
+    except (TypeError, ValueError):
+        return {"error": "Weights and cash_buffer must be numbers.", "date": today_date}
+    if any(w < 0 for w in weights.values()):
+        return {"error": "Weights must not be negative.", "date": today_date}
+    if sum(weights.values()) > 1 + 1e-9:
+        return {"error": f"Weights sum to {sum(weights.values()):.4f}, which is more than 1.", "date": today_date}
+    if not 0 <= cash_buffer < 1:
+        return {"error": f"cash_buffer must be in [0, 1), got {cash_buffer}.", "date": today_date}
+
+    if market is None:
+        markets = {_order_market(s, None) for s in weights}
+        if len(markets) > 1:
+            return {"error": "Cannot rebalance US and A-share symbols together.", "date": today_date}
+        market = markets.pop()
+
+    position, _ = get_latest_position(today_date, signature)
+    symbols = sorted((set(position) | set(weights)) - {"CASH"})
+    open_prices = get_open_prices(today_date, symbols, market=market)
+    # Held symbols need a price too, or the portfolio value the weights apply to is too low
+    held = [s for s, quantity in position.items() if s != "CASH" and quantity]
+    missing = sorted(s for s in set(weights) | set(held) if open_prices.get(f"{s}_price") is None)
+    if missing:
+        return {"error": f"No price today for {', '.join(missing)}, cannot rebalance.", "date": today_date}
+    prices = {s: open_prices[f"{s}_price"] for s in symbols if open_prices.get(f"{s}_price") is not None}
+
+    orders = plan_rebalance(position, prices, weights, cash_buffer, market)
+    if not orders:
+        return {"executed": [], "positions": position, "orders": [], "date": today_date}
+    result = execute_order_batch(signature, today_date, orders, market if market == "crypto" else None)
+    result["orders"] = orders
+    return result
@@ -0,0 +1,107 @@
+import asyncio
+import contextvars
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+from tools.ledger import get_position_ledger, position_lock
+
+# Upper bound on orders executed under one lock acquisition and one fsync
+MAX_BATCH = 64
+
+
+class OrderExecutor:
+    """Single writer for one signature's position ledger.
+
+    Orders are queued and run one after another by a single consumer task.
+    The consumer takes whatever is queued (up to MAX_BATCH orders), runs the
+    batch in a worker thread under one position_lock acquisition, and fsyncs
+    position.jsonl once for the whole batch (group commit) before answering
+    the callers. position_lock is still taken so writers in other processes,
+    such as add_no_trade_record in the agent, stay serialized with the server.
+    Each order runs in the context of the request that submitted it, so its
+    session context (TODAY_DATE, LOG_PATH, ...) is the caller's, not that of
+    whichever request started the consumer.
+    """
+
+    def __init__(self, signature: str, loop: asyncio.AbstractEventLoop):
+        self.signature = signature
+        self.loop = loop
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = loop.create_task(self._run())
+
+    async def submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Queue fn(signature, *args) and wait for its result."""
+        future = self.loop.create_future()
+        await self._queue.put((fn, args, future, contextvars.copy_context()))
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < MAX_BATCH and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            results: List[Tuple[bool, Any]] = []
+            try:
+                await asyncio.to_thread(self._execute, batch, results)
+            except Exception as e:
+                # position_lock failed: orders that already ran (and may be
+                # recorded) keep their own result, only the rest fail
+                results.extend([(False, e)] * (len(batch) - len(results)))
+            for (_, _, future, _), (ok, value) in zip(batch, results):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _execute(
+        self,
+        batch: List[Tuple[Callable[..., Any], tuple, asyncio.Future, contextvars.Context]],
+        results: List[Tuple[bool, Any]],
+    ) -> None:
+        """Run the batch under position_lock, appending (ok, result or exception) per order to results."""
+        ledgers = {}
+        with position_lock(self.signature):
+            for fn, args, _, context in batch:
+                try:
+                    results.append((True, context.run(fn, self.signature, *args)))
+                except Exception as e:
+                    results.append((False, e))
+                    continue
+                ledger = context.run(get_position_ledger, self.signature)
+                ledgers[id(ledger)] = ledger
+            sync_errors = []
+            for ledger in ledgers.values():
+                try:
+                    ledger.sync()
+                except Exception as e:
+                    sync_errors.append(f"{ledger.path}: {e}")
+        if sync_errors:
+            # The records are already in position.jsonl, so the orders succeeded;
+            # failing them would invite a retry that trades twice
+            warning = f"Order recorded, but position.jsonl could not be flushed to disk ({'; '.join(sync_errors)})"
+            print(f"⚠️  {warning}")
+            for i, (ok, value) in enumerate(results):
+                # Copy: a result may be the positions dict the ledger keeps
+                if ok and isinstance(value, dict) and "error" not in value:
+                    results[i] = (True, dict(value, warning=warning))
+
+
+_EXECUTORS: Dict[str, OrderExecutor] = {}
+_EXECUTORS_LOCK = threading.Lock()
+
+
+async def submit_order(signature: str, fn: Callable[..., Any], *args: Any) -> Any:
+    """Run fn(signature, *args) on the signature's OrderExecutor and return its result.
+
+    fn runs with position_lock held and must not take it again; it reads and
+    appends to the ledger as usual.
+    """
+    loop = asyncio.get_running_loop()
+    with _EXECUTORS_LOCK:
+        executor = _EXECUTORS.get(signature)
+        if executor is None or executor.loop is not loop:
+            executor = OrderExecutor(signature, loop)
+            _EXECUTORS[signature] = executor
+    return await executor.submit(fn, *args)
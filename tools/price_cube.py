@@ -0,0 +1,375 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Ensure project root is on sys.path when run as a script
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+# The last cube axis follows FIELDS
+from tools.price_store import (
+    CLOSE,
+    FIELD_KEYS,
+    FIELDS,
+    HIGH,
+    LOW,
+    OPEN,
+    VOLUME,
+    PriceStore,
+    _series_resolution,
+    build_symbol_doc,
+)
+from tools.trading_calendar import TradingCalendar
+
+CUBE_VERSION = 1
+
+# {merged.jsonl path: cube directory} published by a parent process (main_parrallel.py)
+SHARED_CUBES_ENV = "PRICE_CUBE_SHARED"
+
+
+def get_cube_dir(merged_file: Path) -> Path:
+    """Get the cube directory for a merged.jsonl file, e.g. data/merged.cube/"""
+    merged_file = Path(merged_file)
+    return merged_file.with_name(merged_file.stem + ".cube")
+
+
+def _stat_key(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _write_atomic(path: Path, write) -> None:
+    # A unique temp file, as several processes may compile the same cube at once
+    fd, tmp_path = tempfile.mkstemp(prefix=path.name + ".", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def compile_price_cube(merged_file: Path, cube_dir: Optional[Path] = None) -> Path:
+    """Compile merged.jsonl into a float64 cube of symbols x timestamps x OHLCV.
+
+    Writes ohlcv.npy (NaN where a field is missing), present.npy (whether a
+    bar exists at all), and symbols.json / calendar.json sidecars. meta.json is
+    written last and records the source file's mtime and size, so a reader
+    only trusts the cube while merged.jsonl is unchanged.
+
+    Args:
+        merged_file: Path to a merged.jsonl file
+        cube_dir: Output directory, defaults to get_cube_dir(merged_file)
+
+    Returns:
+        Path to the cube directory
+    """
+    merged_file = Path(merged_file)
+    source_key = _stat_key(merged_file)
+    if source_key is None:
+        raise FileNotFoundError(f"Data file not found: {merged_file}")
+
+    store = PriceStore(merged_file, source_key)
+    symbols = store.symbols
+    calendar = store.all_timestamps()
+    time_index = {ts: i for i, ts in enumerate(calendar)}
+
+    values = np.full((len(symbols), len(calendar), len(FIELDS)), np.nan, dtype=np.float64)
+    present = np.zeros((len(symbols), len(calendar)), dtype=np.bool_)
+    for s, symbol in enumerate(symbols):
+        for ts, bar in store.bars[symbol].items():
+            t = time_index[ts]
+            present[s, t] = True
+            for f, field in enumerate(FIELDS):
+                raw = bar.get(FIELD_KEYS[field])
+                if raw is None:
+                    continue
+                try:
+                    values[s, t, f] = float(raw)
+                except (TypeError, ValueError):
+                    continue
+
+    cube_dir = Path(cube_dir) if cube_dir is not None else get_cube_dir(merged_file)
+    cube_dir.mkdir(parents=True, exist_ok=True)
+    meta_path = cube_dir / "meta.json"
+    # Invalidate the previous cube before replacing its arrays
+    if meta_path.exists():
+        meta_path.unlink()
+
+    _write_atomic(cube_dir / "ohlcv.npy", lambda f: np.save(f, values))
+    _write_atomic(cube_dir / "present.npy", lambda f: np.save(f, present))
+    symbols_doc = {
+        "symbols": symbols,
+        "resolutions": [_series_resolution(store.series_keys[s]) for s in symbols],
+        "names": store.names,
+    }
+    _write_atomic(cube_dir / "symbols.json", lambda f: f.write(json.dumps(symbols_doc, ensure_ascii=False).encode("utf-8")))
+    _write_atomic(cube_dir / "calendar.json", lambda f: f.write(json.dumps(calendar).encode("utf-8")))
+    meta = {
+        "version": CUBE_VERSION,
+        "source": merged_file.name,
+        "source_mtime_ns": source_key[0],
+        "source_size": source_key[1],
+        "fields": list(FIELDS),
+        "shape": list(values.shape),
+    }
+    _write_atomic(meta_path, lambda f: f.write(json.dumps(meta).encode("utf-8")))
+    return cube_dir
+
+
+class PriceCube:
+    """Read-only, memory-mapped view of a compiled price cube.
+
+    Arrays are opened with np.load(mmap_mode="r") on first access, so every
+    process mapping the same cube shares the OS page cache. The lookup
+    methods mirror PriceStore so either can back price_tools.
+    """
+
+    def __init__(self, cube_dir: Path, meta: dict):
+        self.cube_dir = Path(cube_dir)
+        self.meta = meta
+        with open(self.cube_dir / "symbols.json", "r", encoding="utf-8") as f:
+            symbols_doc = json.load(f)
+        with open(self.cube_dir / "calendar.json", "r", encoding="utf-8") as f:
+            self.timestamps: List[str] = json.load(f)
+        self.symbols: List[str] = symbols_doc["symbols"]
+        self.resolutions: List[str] = symbols_doc["resolutions"]
+        self.names: Dict[str, str] = symbols_doc.get("names", {})
+        self._symbol_index = {s: i for i, s in enumerate(self.symbols)}
+        self._time_index = {ts: i for i, ts in enumerate(self.timestamps)}
+        self._values: Optional[np.ndarray] = None
+        self._present: Optional[np.ndarray] = None
+        self._calendars: Dict[str, TradingCalendar] = {}
+        self._ohlcv: Dict[str, Tuple[List[str], np.ndarray]] = {}
+        self._docs: Dict[str, dict] = {}
+
+    @property
+    def values(self) -> np.ndarray:
+        """float64 array of shape (symbols, timestamps, len(FIELDS))."""
+        if self._values is None:
+            self._values = np.load(self.cube_dir / "ohlcv.npy", mmap_mode="r")
+        return self._values
+
+    @property
+    def present(self) -> np.ndarray:
+        """bool array of shape (symbols, timestamps); True where a bar exists."""
+        if self._present is None:
+            self._present = np.load(self.cube_dir / "present.npy", mmap_mode="r")
+        return self._present
+
+    def symbol_index(self, symbol: str) -> Optional[int]:
+        return self._symbol_index.get(symbol)
+
+    def time_index(self, timestamp: str) -> Optional[int]:
+        return self._time_index.get(timestamp)
+
+    def has_symbol(self, symbol: str) -> bool:
+        return symbol in self._symbol_index
+
+    def symbol_resolution(self, symbol: str) -> Optional[str]:
+        s = self._symbol_index.get(symbol)
+        return None if s is None else self.resolutions[s]
+
+    def has_bar(self, symbol: str, timestamp: str) -> bool:
+        s, t = self._symbol_index.get(symbol), self._time_index.get(timestamp)
+        return s is not None and t is not None and bool(self.present[s, t])
+
+    def get_value(self, symbol: str, timestamp: str, field: int) -> Optional[float]:
+        s, t = self._symbol_index.get(symbol), self._time_index.get(timestamp)
+        if s is None or t is None:
+            return None
+        value = self.values[s, t, field]
+        return None if np.isnan(value) else float(value)
+
+    def get_open(self, symbol: str, timestamp: str) -> Optional[float]:
+        return self.get_value(symbol, timestamp, OPEN)
+
+    def get_close(self, symbol: str, timestamp: str) -> Optional[float]:
+        return self.get_value(symbol, timestamp, CLOSE)
+
+    def ohlcv(self, symbol: str) -> Tuple[List[str], np.ndarray]:
+        """Get symbol's sorted timestamps and its (len, len(FIELDS)) rows of the cube, cached."""
+        cached = self._ohlcv.get(symbol)
+        if cached is None:
+            s = self._symbol_index.get(symbol)
+            if s is None:
+                return [], np.empty((0, len(FIELDS)), dtype=np.float64)
+            rows = np.flatnonzero(self.present[s])
+            cached = ([self.timestamps[t] for t in rows], np.asarray(self.values[s, rows]))
+            self._ohlcv[symbol] = cached
+        return cached
+
+    def symbol_doc(self, symbol: str) -> Optional[dict]:
+        """Rebuild a merged.jsonl-style document for symbol, or None if unknown."""
+        doc = self._docs.get(symbol)
+        if doc is None and symbol in self._symbol_index:
+            resolution = self.symbol_resolution(symbol)
+            series_key = "Time Series (Daily)" if resolution == "daily" else f"Time Series ({resolution})"
+            doc = build_symbol_doc(symbol, self.names.get(symbol), series_key, *self.ohlcv(symbol))
+            self._docs[symbol] = doc
+        return doc
+
+    def all_timestamps(self) -> List[str]:
+        return self.timestamps
+
+    def resolution_timestamps(self, resolution: str) -> List[str]:
+        rows = [i for i, r in enumerate(self.resolutions) if r == resolution]
+        if not rows:
+            return []
+        mask = self.present[rows].any(axis=0)
+        return [self.timestamps[t] for t in np.flatnonzero(mask)]
+
+    def calendar(self, resolution: str = "daily") -> TradingCalendar:
+        """Get the trading calendar for a resolution, same rules as PriceStore.calendar."""
+        cal = self._calendars.get(resolution)
+        if cal is None:
+            timestamps = self.resolution_timestamps(resolution)
+            if resolution == "daily" and not timestamps:
+                cal = TradingCalendar(self.timestamps, "all").dates()
+            else:
+                cal = TradingCalendar(timestamps, resolution)
+            self._calendars[resolution] = cal
+        return cal
+
+
+_CUBES: Dict[str, Tuple[Optional[Tuple[int, int]], Optional[Tuple[int, int]], Optional[PriceCube]]] = {}
+_CUBES_LOCK = threading.Lock()
+
+
+def _open_cube(cube_dir: Path, source_key: Tuple[int, int]) -> Optional[PriceCube]:
+    try:
+        with open(cube_dir / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != CUBE_VERSION:
+        return None
+    if (meta.get("source_mtime_ns"), meta.get("source_size")) != source_key:
+        # merged.jsonl changed since the cube was compiled
+        return None
+    try:
+        return PriceCube(cube_dir, meta)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+_SHARED_CUBES: Tuple[Optional[str], Dict[str, str]] = (None, {})
+
+
+def _shared_cube_dir(merged_key: str) -> Optional[Path]:
+    """Cube directory a parent process published for merged_key through PRICE_CUBE_SHARED, if any."""
+    global _SHARED_CUBES
+    raw = os.environ.get(SHARED_CUBES_ENV)
+    if not raw:
+        return None
+    if _SHARED_CUBES[0] != raw:
+        try:
+            shared = json.loads(raw)
+        except ValueError:
+            shared = {}
+        _SHARED_CUBES = (raw, shared if isinstance(shared, dict) else {})
+    cube_dir = _SHARED_CUBES[1].get(merged_key)
+    return Path(cube_dir) if cube_dir else None
+
+
+def load_price_cube(merged_file: Path) -> Optional[PriceCube]:
+    """Get the memory-mapped cube for a merged.jsonl file if it is up to date.
+
+    A cube published by the parent process (see publish_shared_cubes) is
+    preferred over the one next to merged.jsonl.
+
+    Args:
+        merged_file: Path to a merged.jsonl file
+
+    Returns:
+        PriceCube instance, or None if no cube was compiled or it is stale
+    """
+    merged_file = Path(merged_file)
+    key = str(merged_file.resolve())
+    source_key = _stat_key(merged_file)
+    cube_dir = _shared_cube_dir(key) or get_cube_dir(merged_file)
+    meta_key = _stat_key(cube_dir / "meta.json")
+    if source_key is None or meta_key is None:
+        return None
+
+    cache_key = f"{key}|{cube_dir}"
+    cached = _CUBES.get(cache_key)
+    if cached is not None and cached[0] == source_key and cached[1] == meta_key:
+        return cached[2]
+
+    with _CUBES_LOCK:
+        cube = _open_cube(cube_dir, source_key)
+        _CUBES[cache_key] = (source_key, meta_key, cube)
+    return cube
+
+
+def _shared_memory_dir() -> Path:
+    # tmpfs, so the cube lives in RAM once and every process maps the same pages
+    return Path("/dev/shm") if os.path.isdir("/dev/shm") else Path(tempfile.gettempdir())
+
+
+def publish_shared_cubes(merged_files: List[Path]) -> Tuple[Dict[str, str], Optional[Path]]:
+    """Build the price cubes of merged_files once for child processes to attach to.
+
+    An up-to-date cube next to merged.jsonl is published as is. Otherwise the
+    cube is compiled into a fresh directory under /dev/shm. Children get the
+    mapping through the PRICE_CUBE_SHARED environment variable and open the
+    arrays with mmap, so the price data is resident once, not once per child.
+
+    Args:
+        merged_files: merged.jsonl files the children will read
+
+    Returns:
+        ({merged.jsonl path: cube directory}, directory to remove when the run ends or None)
+    """
+    shared: Dict[str, str] = {}
+    scratch_dir: Optional[Path] = None
+    for merged_file in merged_files:
+        merged_file = Path(merged_file)
+        if not merged_file.exists():
+            continue
+        key = str(merged_file.resolve())
+        cube = load_price_cube(merged_file)
+        if cube is None:
+            if scratch_dir is None:
+                scratch_dir = Path(tempfile.mkdtemp(prefix="ai-trader-cubes-", dir=_shared_memory_dir()))
+            # Every market's file is named merged.jsonl, so the directory is keyed by the source path
+            digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+            cube_dir = compile_price_cube(merged_file, scratch_dir / f"{merged_file.stem}-{digest}.cube")
+        else:
+            cube_dir = cube.cube_dir
+        shared[key] = str(cube_dir)
+    return shared, scratch_dir
+
+
+if __name__ == "__main__":
+    from tools.price_tools import get_merged_file_path
+
+    parser = argparse.ArgumentParser(description="Compile merged.jsonl into a memory-mapped price cube")
+    parser.add_argument("--market", choices=["us", "cn", "crypto", "all"], default="all", help="Market to compile")
+    args = parser.parse_args()
+
+    markets = ["us", "cn", "crypto"] if args.market == "all" else [args.market]
+    for market in markets:
+        merged_file = get_merged_file_path(market)
+        if not merged_file.exists():
+            print(f"⚠️  Skipping {market}: {merged_file} not found")
+            continue
+        cube_dir = compile_price_cube(merged_file)
+        print(f"✅ Compiled {market} price cube: {cube_dir}")
@@ -0,0 +1,299 @@
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+# Ensure project root is on sys.path when run as a script
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from tools.price_store import CLOSE, FIELDS, OPEN, PriceStore, _series_resolution, build_symbol_doc
+from tools.trading_calendar import TradingCalendar
+
+load_dotenv()
+
+DB_VERSION = 1
+
+# bars is a WITHOUT ROWID table clustered on (symbol, ts), so point lookups
+# and per-symbol range scans are served straight from the primary key; the
+# (market, ts) index covers calendar queries.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bars (
+    market TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    open REAL,
+    high REAL,
+    low REAL,
+    close REAL,
+    volume REAL,
+    PRIMARY KEY (symbol, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS bars_market_ts ON bars (market, ts);
+CREATE TABLE IF NOT EXISTS symbols (
+    market TEXT NOT NULL,
+    symbol TEXT PRIMARY KEY,
+    name TEXT,
+    series_key TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def price_backend() -> str:
+    """Get the configured price backend: "jsonl" (default) or "sqlite"."""
+    return os.getenv("PRICE_BACKEND", "jsonl").strip().lower()
+
+
+def get_db_path(merged_file: Path) -> Path:
+    """Get the SQLite database for a merged.jsonl file, e.g. data/merged.sqlite"""
+    merged_file = Path(merged_file)
+    return merged_file.with_suffix(".sqlite")
+
+
+def _stat_key(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def write_price_db(merged_file: Path, market: str) -> Path:
+    """Load merged.jsonl into the bars table of its SQLite database.
+
+    The market's rows are replaced in a single transaction; readers in WAL
+    mode keep seeing the previous data until it commits.
+
+    Args:
+        merged_file: Path to a merged.jsonl file
+        market: Market stored with every row ("us", "cn" or "crypto")
+
+    Returns:
+        Path to the database file
+    """
+    merged_file = Path(merged_file)
+    source_key = _stat_key(merged_file)
+    if source_key is None:
+        raise FileNotFoundError(f"Data file not found: {merged_file}")
+    store = PriceStore(merged_file, source_key)
+
+    def rows():
+        for symbol in store.symbols:
+            timestamps, values = store.ohlcv(symbol)
+            for ts, bar in zip(timestamps, values.tolist()):
+                yield (market, symbol, ts, *[None if v != v else v for v in bar])
+
+    db_path = get_db_path(merged_file)
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        with conn:
+            conn.execute("DELETE FROM bars WHERE market = ?", (market,))
+            conn.execute("DELETE FROM symbols WHERE market = ?", (market,))
+            conn.executemany("INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows())
+            conn.executemany(
+                "INSERT OR REPLACE INTO symbols VALUES (?, ?, ?, ?)",
+                [(market, s, store.names.get(s), store.series_keys[s]) for s in store.symbols],
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                [
+                    ("version", str(DB_VERSION)),
+                    ("source", merged_file.name),
+                    ("source_mtime_ns", str(source_key[0])),
+                    ("source_size", str(source_key[1])),
+                ],
+            )
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    return db_path
+
+
+class PriceDB:
+    """Read-only view of a price database with the PriceStore lookup methods.
+
+    Every thread gets its own read-only connection (sqlite3 connections must
+    not be shared across threads); point lookups hit the (symbol, ts) primary
+    key, and per-symbol series and calendars are cached after the first query.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+        conn = self._conn()
+        self.series_keys: Dict[str, str] = {}
+        self.names: Dict[str, str] = {}
+        for symbol, name, series_key in conn.execute("SELECT symbol, name, series_key FROM symbols ORDER BY rowid"):
+            self.series_keys[symbol] = series_key
+            if name:
+                self.names[symbol] = name
+        self._ohlcv: Dict[str, Tuple[List[str], np.ndarray]] = {}
+        self._docs: Dict[str, dict] = {}
+        self._all_timestamps: Optional[List[str]] = None
+        self._resolution_timestamps: Dict[str, List[str]] = {}
+        self._calendars: Dict[str, TradingCalendar] = {}
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            conn.execute("PRAGMA query_only = ON")
+            self._local.conn = conn
+        return conn
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self.series_keys.keys())
+
+    def has_symbol(self, symbol: str) -> bool:
+        return symbol in self.series_keys
+
+    def symbol_resolution(self, symbol: str) -> Optional[str]:
+        series_key = self.series_keys.get(symbol)
+        return _series_resolution(series_key) if series_key else None
+
+    def has_bar(self, symbol: str, timestamp: str) -> bool:
+        row = self._conn().execute("SELECT 1 FROM bars WHERE symbol = ? AND ts = ?", (symbol, timestamp)).fetchone()
+        return row is not None
+
+    def get_value(self, symbol: str, timestamp: str, field: int) -> Optional[float]:
+        column = FIELDS[field]
+        row = self._conn().execute(f"SELECT {column} FROM bars WHERE symbol = ? AND ts = ?", (symbol, timestamp)).fetchone()
+        return None if row is None else row[0]
+
+    def get_open(self, symbol: str, timestamp: str) -> Optional[float]:
+        return self.get_value(symbol, timestamp, OPEN)
+
+    def get_close(self, symbol: str, timestamp: str) -> Optional[float]:
+        return self.get_value(symbol, timestamp, CLOSE)
+
+    def ohlcv(self, symbol: str) -> Tuple[List[str], np.ndarray]:
+        """Get symbol's sorted timestamps and aligned OHLCV array, same as PriceStore.ohlcv."""
+        cached = self._ohlcv.get(symbol)
+        if cached is None:
+            rows = self._conn().execute(
+                "SELECT ts, open, high, low, close, volume FROM bars WHERE symbol = ? ORDER BY ts", (symbol,)
+            ).fetchall()
+            values = np.array([row[1:] for row in rows], dtype=np.float64).reshape(len(rows), len(FIELDS))
+            cached = ([row[0] for row in rows], values)
+            self._ohlcv[symbol] = cached
+        return cached
+
+    def symbol_doc(self, symbol: str) -> Optional[dict]:
+        """Rebuild a merged.jsonl-style document for symbol, or None if unknown."""
+        doc = self._docs.get(symbol)
+        if doc is None and symbol in self.series_keys:
+            doc = build_symbol_doc(symbol, self.names.get(symbol), self.series_keys[symbol], *self.ohlcv(symbol))
+            self._docs[symbol] = doc
+        return doc
+
+    def all_timestamps(self) -> List[str]:
+        if self._all_timestamps is None:
+            self._all_timestamps = [row[0] for row in self._conn().execute("SELECT DISTINCT ts FROM bars ORDER BY ts")]
+        return self._all_timestamps
+
+    def resolution_timestamps(self, resolution: str) -> List[str]:
+        timestamps = self._resolution_timestamps.get(resolution)
+        if timestamps is None:
+            series_keys = sorted({k for k in self.series_keys.values() if _series_resolution(k) == resolution})
+            placeholders = ", ".join("?" * len(series_keys))
+            rows = self._conn().execute(
+                "SELECT DISTINCT ts FROM bars JOIN symbols USING (symbol) "
+                f"WHERE symbols.series_key IN ({placeholders}) ORDER BY ts",
+                series_keys,
+            )
+            timestamps = [row[0] for row in rows]
+            self._resolution_timestamps[resolution] = timestamps
+        return timestamps
+
+    def calendar(self, resolution: str = "daily") -> TradingCalendar:
+        """Get the trading calendar for a resolution, same rules as PriceStore.calendar."""
+        cal = self._calendars.get(resolution)
+        if cal is None:
+            timestamps = self.resolution_timestamps(resolution)
+            if resolution == "daily" and not timestamps:
+                cal = TradingCalendar(self.all_timestamps(), "all").dates()
+            else:
+                cal = TradingCalendar(timestamps, resolution)
+            self._calendars[resolution] = cal
+        return cal
+
+
+_DBS: Dict[str, Tuple[Tuple, Optional[PriceDB]]] = {}
+_DBS_LOCK = threading.Lock()
+
+
+def _open_db(merged_file: Path, source_key: Tuple[int, int]) -> Optional[PriceDB]:
+    db_path = get_db_path(merged_file)
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    if meta.get("version") != str(DB_VERSION):
+        return None
+    if (meta.get("source_mtime_ns"), meta.get("source_size")) != (str(source_key[0]), str(source_key[1])):
+        print(f"⚠️  Price database {db_path} is older than {merged_file}, falling back to JSONL")
+        return None
+    return PriceDB(db_path)
+
+
+def load_price_db(merged_file: Path) -> Optional[PriceDB]:
+    """Get the read-only price database for a merged.jsonl file if it is up to date.
+
+    Args:
+        merged_file: Path to a merged.jsonl file
+
+    Returns:
+        PriceDB instance, or None if no database was written or it is stale
+    """
+    merged_file = Path(merged_file)
+    db_path = get_db_path(merged_file)
+    key = str(merged_file.resolve())
+    source_key = _stat_key(merged_file)
+    db_key = _stat_key(db_path)
+    if source_key is None or db_key is None:
+        return None
+    # Committed writes may still sit in the WAL file until checkpointed
+    stat_key = (source_key, db_key, _stat_key(db_path.with_name(db_path.name + "-wal")))
+
+    cached = _DBS.get(key)
+    if cached is not None and cached[0] == stat_key:
+        return cached[1]
+
+    with _DBS_LOCK:
+        db = _open_db(merged_file, source_key)
+        _DBS[key] = (stat_key, db)
+    return db
+
+
+if __name__ == "__main__":
+    from tools.price_tools import get_merged_file_path
+
+    parser = argparse.ArgumentParser(description="Load merged.jsonl into the SQLite price database")
+    parser.add_argument("--market", choices=["us", "cn", "crypto", "all"], default="all", help="Market to load")
+    args = parser.parse_args()
+
+    markets = ["us", "cn", "crypto"] if args.market == "all" else [args.market]
+    for market in markets:
+        merged_file = get_merged_file_path(market)
+        if not merged_file.exists():
+            print(f"⚠️  Skipping {market}: {merged_file} not found")
+            continue
+        print(f"✅ Wrote {market} price database: {write_price_db(merged_file, market)}")
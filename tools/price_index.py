@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+INDEX_VERSION = 1
+
+
+def get_index_path(merged_file: Path) -> Path:
+    """Get the symbol index sidecar for a merged.jsonl file, e.g. data/merged.idx"""
+    merged_file = Path(merged_file)
+    return merged_file.with_suffix(".idx")
+
+
+def _stat_key(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def build_symbol_index(merged_file: Path) -> Dict[str, Tuple[int, int]]:
+    """Scan merged.jsonl once and map each symbol to (byte offset, length) of its line.
+
+    Args:
+        merged_file: Path to a merged.jsonl file
+
+    Returns:
+        {symbol: (offset, length)}; the first line wins for duplicated symbols
+    """
+    offsets: Dict[str, Tuple[int, int]] = {}
+    offset = 0
+    with open(merged_file, "rb") as f:
+        for line in f:
+            length = len(line)
+            if line.strip():
+                try:
+                    doc = json.loads(line)
+                    symbol = doc.get("Meta Data", {}).get("2. Symbol")
+                except Exception:
+                    symbol = None
+                if symbol and symbol not in offsets:
+                    offsets[symbol] = (offset, length)
+            offset += length
+    return offsets
+
+
+def write_symbol_index(merged_file: Path) -> Path:
+    """Build the symbol index for merged.jsonl and write it to the .idx sidecar.
+
+    The sidecar records the data file's mtime and size so readers can detect
+    that merged.jsonl was rewritten after the index was built.
+
+    Args:
+        merged_file: Path to a merged.jsonl file
+
+    Returns:
+        Path to the written index file
+    """
+    merged_file = Path(merged_file)
+    source_key = _stat_key(merged_file)
+    if source_key is None:
+        raise FileNotFoundError(f"Data file not found: {merged_file}")
+
+    index = {
+        "version": INDEX_VERSION,
+        "source": merged_file.name,
+        "source_mtime_ns": source_key[0],
+        "source_size": source_key[1],
+        "symbols": {symbol: list(pos) for symbol, pos in build_symbol_index(merged_file).items()},
+    }
+    index_path = get_index_path(merged_file)
+    tmp_path = index_path.with_name(index_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(tmp_path, index_path)
+    return index_path
+
+
+def _read_index_file(merged_file: Path, source_key: Tuple[int, int]) -> Optional[Dict[str, Tuple[int, int]]]:
+    try:
+        with open(get_index_path(merged_file), "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get("version") != INDEX_VERSION:
+        return None
+    if (index.get("source_mtime_ns"), index.get("source_size")) != source_key:
+        return None
+    return {symbol: (pos[0], pos[1]) for symbol, pos in index.get("symbols", {}).items()}
+
+
+_INDEXES: Dict[str, Tuple[Tuple[int, int], Dict[str, Tuple[int, int]]]] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_symbol_index(merged_file: Path) -> Optional[Dict[str, Tuple[int, int]]]:
+    """Get {symbol: (offset, length)} for merged.jsonl, cached per process.
+
+    Uses the .idx sidecar when it matches the data file's mtime and size;
+    otherwise the index is rebuilt in memory with a single scan.
+
+    Args:
+        merged_file: Path to a merged.jsonl file
+
+    Returns:
+        Symbol index dict, or None if the data file does not exist
+    """
+    merged_file = Path(merged_file)
+    key = str(merged_file.resolve())
+    source_key = _stat_key(merged_file)
+    if source_key is None:
+        return None
+
+    cached = _INDEXES.get(key)
+    if cached is not None and cached[0] == source_key:
+        return cached[1]
+
+    with _INDEXES_LOCK:
+        cached = _INDEXES.get(key)
+        if cached is not None and cached[0] == source_key:
+            return cached[1]
+        offsets = _read_index_file(merged_file, source_key)
+        if offsets is None:
+            print(f"⚠️  Symbol index for {merged_file} missing or stale, rebuilding in memory")
+            offsets = build_symbol_index(merged_file)
+        _INDEXES[key] = (source_key, offsets)
+    return offsets
+
+
+def read_symbol_doc(merged_file: Path, symbol: str) -> Optional[dict]:
+    """Read one symbol's document from merged.jsonl with a single seek.
+
+    Args:
+        merged_file: Path to a merged.jsonl file
+        symbol: Symbol to read
+
+    Returns:
+        The parsed JSON document for symbol, or None if not found
+    """
+    offsets = get_symbol_index(merged_file)
+    if not offsets or symbol not in offsets:
+        return None
+    offset, length = offsets[symbol]
+    with open(merged_file, "rb") as f:
+        f.seek(offset)
+        line = f.read(length)
+    try:
+        doc = json.loads(line)
+    except ValueError:
+        return None
+    # Guard against the file being rewritten between the stat and the read
+    if doc.get("Meta Data", {}).get("2. Symbol") != symbol:
+        return None
+    return doc
@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from tools.bar_store import BarStore
+from tools.price_tools import get_price_source
+
+
+def _stat_key(path: Path) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class PriceSnapshot:
+    """Price sources of a fixed set of data files, captured at one point in time.
+
+    A snapshot never changes after it is built; a request that grabbed it keeps
+    reading the same data even if a newer snapshot is swapped in meanwhile.
+    """
+
+    def __init__(self, files: List[Path]):
+        self.stat_keys: Dict[str, Optional[Tuple[int, int, int]]] = {}
+        self._sources = {}
+        self._bar_stores: Dict[str, BarStore] = {}
+        for path in files:
+            key = str(Path(path).resolve())
+            self.stat_keys[key] = _stat_key(path)
+            source = get_price_source(path)
+            if source is None:
+                continue
+            # Build the calendars up front so the first request does not pay for them
+            source.calendar("daily")
+            self._sources[key] = source
+            self._bar_stores[key] = BarStore(source)
+
+    def source(self, path: Path):
+        """Get the PriceDB/PriceCube/PriceStore of path, or None if it is not part of the snapshot."""
+        return self._sources.get(str(Path(path).resolve()))
+
+    def bar_store(self, path: Path) -> Optional[BarStore]:
+        return self._bar_stores.get(str(Path(path).resolve()))
+
+
+class PriceCacheWatcher:
+    """Keeps a warm PriceSnapshot and swaps in a new one when a data file changes.
+
+    A daemon thread polls the files' inode, mtime and size. A change is only
+    picked up once the file has stayed the same for one more poll, so a merge
+    script still writing the file is not loaded half-way. The new snapshot is
+    built on the polling thread and published with a single reference swap.
+    """
+
+    def __init__(self, files: List[Path], interval: float = 5.0):
+        self.files = [Path(f) for f in files]
+        self.interval = interval
+        self._snapshot = PriceSnapshot(self.files)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def snapshot(self) -> PriceSnapshot:
+        return self._snapshot
+
+    def _current_keys(self) -> Dict[str, Optional[Tuple[int, int, int]]]:
+        return {str(f.resolve()): _stat_key(f) for f in self.files}
+
+    def _run(self) -> None:
+        pending = None
+        while not self._stop.wait(self.interval):
+            keys = self._current_keys()
+            if keys == self._snapshot.stat_keys:
+                pending = None
+                continue
+            if keys != pending:
+                # Changed since the last poll, wait until the writer is done
+                pending = keys
+                continue
+            try:
+                start = time.time()
+                self._snapshot = PriceSnapshot(self.files)
+                print(f"🔄 Price cache reloaded in {time.time() - start:.2f}s")
+            except Exception as e:
+                print(f"⚠️  Price cache reload failed, keeping the previous snapshot: {e}")
+            pending = None
+
+    def start(self) -> "PriceCacheWatcher":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="price-cache-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
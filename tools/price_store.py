@@ -0,0 +1,243 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from tools.trading_calendar import TradingCalendar
+
+# Field order of OHLCV arrays, and the merged.jsonl keys they come from
+FIELDS = ("open", "high", "low", "close", "volume")
+FIELD_KEYS = {
+    "open": "1. buy price",
+    "high": "2. high",
+    "low": "3. low",
+    "close": "4. sell price",
+    "volume": "5. volume",
+}
+OPEN, HIGH, LOW, CLOSE, VOLUME = range(len(FIELDS))
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except Exception:
+        return None
+
+
+def _series_resolution(series_key: str) -> str:
+    """Map "Time Series (Daily)" -> "daily", "Time Series (60min)" -> "60min"."""
+    start, end = series_key.find("("), series_key.rfind(")")
+    if start < 0 or end <= start:
+        return series_key
+    return series_key[start + 1:end].strip().lower()
+
+
+def build_symbol_doc(
+    symbol: str, name: Optional[str], series_key: str, timestamps: List[str], values: np.ndarray
+) -> dict:
+    """Rebuild a merged.jsonl-style document from a symbol's OHLCV array (missing fields are omitted)."""
+    series = {
+        ts: {FIELD_KEYS[field]: v for field, v in zip(FIELDS, bar) if v == v}
+        for ts, bar in zip(timestamps, values.tolist())
+    }
+    meta = {"2. Symbol": symbol}
+    if name:
+        meta["2.1. Name"] = name
+    return {"Meta Data": meta, series_key: series}
+
+
+class PriceStore:
+    """In-memory, symbol-indexed view of a single merged.jsonl file.
+
+    The file is parsed once; every symbol keeps a sorted timestamp list with
+    aligned buy (open) / sell (close) price arrays, plus the raw bars for
+    callers that need the original string fields.
+    """
+
+    def __init__(self, path: Path, stat_key: Tuple[int, int]):
+        self.path = path
+        self.stat_key = stat_key
+        self.names: Dict[str, str] = {}
+        self.series_keys: Dict[str, str] = {}
+        self.timestamps: Dict[str, List[str]] = {}
+        self.opens: Dict[str, List[Optional[float]]] = {}
+        self.closes: Dict[str, List[Optional[float]]] = {}
+        self.bars: Dict[str, Dict[str, dict]] = {}
+        self._index: Dict[str, Dict[str, int]] = {}
+        self._all_timestamps: List[str] = []
+        self._resolution_timestamps: Dict[str, set] = {}
+        self._calendars: Dict[str, TradingCalendar] = {}
+        self._ohlcv: Dict[str, np.ndarray] = {}
+        self._load()
+
+    def _load(self) -> None:
+        all_timestamps = set()
+        with self.path.open("r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    doc = json.loads(line)
+                except Exception:
+                    continue
+                if not isinstance(doc, dict):
+                    continue
+                meta = doc.get("Meta Data", {})
+                symbol = meta.get("2. Symbol") if isinstance(meta, dict) else None
+                name = meta.get("2.1. Name", "") if isinstance(meta, dict) else ""
+                if symbol and name:
+                    self.names[symbol] = name
+
+                # 查找第一个以 "Time Series" 开头的键
+                series_key, series = None, None
+                for key, value in doc.items():
+                    if key.startswith("Time Series"):
+                        series_key, series = key, value
+                        break
+                if not isinstance(series, dict):
+                    continue
+
+                all_timestamps.update(series.keys())
+                self._resolution_timestamps.setdefault(_series_resolution(series_key), set()).update(series.keys())
+                if not symbol:
+                    continue
+
+                ts_list = sorted(series.keys())
+                bars = {ts: bar for ts, bar in series.items() if isinstance(bar, dict)}
+                self.series_keys[symbol] = series_key
+                self.timestamps[symbol] = ts_list
+                self.bars[symbol] = bars
+                self.opens[symbol] = [_to_float(bars.get(ts, {}).get("1. buy price")) for ts in ts_list]
+                self.closes[symbol] = [_to_float(bars.get(ts, {}).get("4. sell price")) for ts in ts_list]
+                self._index[symbol] = {ts: i for i, ts in enumerate(ts_list)}
+
+        self._all_timestamps = sorted(all_timestamps)
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self.timestamps.keys())
+
+    def has_symbol(self, symbol: str) -> bool:
+        return symbol in self.timestamps
+
+    def symbol_resolution(self, symbol: str) -> Optional[str]:
+        """Resolution of symbol's series ("daily", "60min", ...), or None if unknown."""
+        series_key = self.series_keys.get(symbol)
+        return _series_resolution(series_key) if series_key else None
+
+    def has_bar(self, symbol: str, timestamp: str) -> bool:
+        return timestamp in self.bars.get(symbol, {})
+
+    def symbol_doc(self, symbol: str) -> Optional[dict]:
+        """Get symbol's document with the raw bars as read from merged.jsonl, or None if unknown."""
+        if symbol not in self.bars:
+            return None
+        meta = {"2. Symbol": symbol}
+        if symbol in self.names:
+            meta["2.1. Name"] = self.names[symbol]
+        return {"Meta Data": meta, self.series_keys[symbol]: self.bars[symbol]}
+
+    def get_bar(self, symbol: str, timestamp: str) -> Optional[dict]:
+        """Return the raw bar dict for symbol at timestamp, or None."""
+        return self.bars.get(symbol, {}).get(timestamp)
+
+    def get_open(self, symbol: str, timestamp: str) -> Optional[float]:
+        i = self._index.get(symbol, {}).get(timestamp)
+        return None if i is None else self.opens[symbol][i]
+
+    def get_close(self, symbol: str, timestamp: str) -> Optional[float]:
+        i = self._index.get(symbol, {}).get(timestamp)
+        return None if i is None else self.closes[symbol][i]
+
+    def ohlcv(self, symbol: str) -> Tuple[List[str], np.ndarray]:
+        """Get symbol's sorted timestamps and an aligned (len, len(FIELDS)) float64 array.
+
+        The array is built on first use and cached; missing fields are NaN.
+        """
+        if symbol not in self.timestamps:
+            return [], np.empty((0, len(FIELDS)), dtype=np.float64)
+        ts_list = self.timestamps[symbol]
+        values = self._ohlcv.get(symbol)
+        if values is None:
+            bars = self.bars[symbol]
+            values = np.array(
+                [[_to_float(bars.get(ts, {}).get(FIELD_KEYS[field])) for field in FIELDS] for ts in ts_list],
+                dtype=np.float64,
+            ).reshape(len(ts_list), len(FIELDS))
+            self._ohlcv[symbol] = values
+        return ts_list, values
+
+    def all_timestamps(self) -> List[str]:
+        """Sorted union of timestamps across every symbol's series."""
+        return self._all_timestamps
+
+    def resolution_timestamps(self, resolution: str) -> List[str]:
+        """Sorted union of timestamps across series of one resolution only."""
+        return sorted(self._resolution_timestamps.get(resolution, ()))
+
+    def calendar(self, resolution: str = "daily") -> TradingCalendar:
+        """Get the trading calendar for a resolution ("daily", "60min", ...).
+
+        The daily calendar falls back to the distinct dates of every series
+        when the file holds no daily series (e.g. hourly-only data).
+        """
+        cal = self._calendars.get(resolution)
+        if cal is None:
+            timestamps = self._resolution_timestamps.get(resolution, ())
+            if resolution == "daily" and not timestamps:
+                cal = TradingCalendar(self._all_timestamps, "all").dates()
+            else:
+                cal = TradingCalendar(timestamps, resolution)
+            self._calendars[resolution] = cal
+        return cal
+
+
+_STORES: Dict[str, PriceStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def _stat_key(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def get_price_store(path: Path) -> Optional[PriceStore]:
+    """Get the cached PriceStore for a merged.jsonl path.
+
+    The store is rebuilt when the file's mtime or size changes, so a data
+    pipeline rewriting the file is picked up on the next lookup.
+
+    Args:
+        path: Path to a merged.jsonl file
+
+    Returns:
+        PriceStore instance, or None if the file does not exist
+    """
+    path = Path(path)
+    key = str(path.resolve())
+    stat_key = _stat_key(path)
+    if stat_key is None:
+        return None
+
+    store = _STORES.get(key)
+    if store is not None and store.stat_key == stat_key:
+        return store
+
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is None or store.stat_key != stat_key:
+            store = PriceStore(path, stat_key)
+            _STORES[key] = store
+    return store
+
+
+def clear_price_stores() -> None:
+    """Drop every cached PriceStore (mainly useful for tests and scripts)."""
+    with _STORES_LOCK:
+        _STORES.clear()
@@ -5,15 +5,22 @@ from dotenv import load_dotenv
 load_dotenv()
 import json
 import sys
+import threading
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 
 # 将项目根目录加入 Python 路径，便于从子目录直接运行本文件
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
+from tools.bar_store import BarStore
 from tools.general_tools import get_config_value
+from tools.ledger import get_position_ledger, position_lock
+from tools.price_cube import PriceCube, load_price_cube
+from tools.price_db import PriceDB, load_price_db, price_backend
+from tools.price_store import PriceStore, get_price_store
+from tools.trading_calendar import TradingCalendar
 
 
 def get_market_type() -> str:
@@ -218,6 +225,78 @@ def get_merged_file_path(market: str = "us") -> Path:
         return base_dir / "data" / "merged.jsonl"
 
 
+def get_price_source(merged_file: Path) -> Optional[Union[PriceDB, PriceCube, PriceStore]]:
+    """Get the parsed price data for a merged.jsonl file.
+
+    With PRICE_BACKEND=sqlite, queries the SQLite database written by the merge
+    scripts (see tools/price_db.py). Otherwise prefers the memory-mapped price
+    cube when one was compiled from the current file (see tools/price_cube.py),
+    and falls back to the in-process PriceStore.
+
+    Args:
+        merged_file: Path to a merged.jsonl file
+
+    Returns:
+        PriceDB, PriceCube or PriceStore, or None if the file does not exist
+    """
+    if price_backend() == "sqlite":
+        db = load_price_db(merged_file)
+        if db is not None:
+            return db
+    return load_price_cube(merged_file) or get_price_store(merged_file)
+
+
+_BAR_STORES: Dict[str, BarStore] = {}
+_BAR_STORES_LOCK = threading.Lock()
+
+
+def get_bar_store(merged_file: Path) -> Optional[BarStore]:
+    """Get the multi-resolution bar store for a merged.jsonl file.
+
+    The store wraps get_price_source(), so resampled bars are dropped as soon
+    as the underlying cube or PriceStore is rebuilt for a changed file.
+
+    Args:
+        merged_file: Path to a merged.jsonl file
+
+    Returns:
+        BarStore instance, or None if the file does not exist
+    """
+    source = get_price_source(merged_file)
+    if source is None:
+        return None
+    key = str(Path(merged_file).resolve())
+    bar_store = _BAR_STORES.get(key)
+    if bar_store is not None and bar_store.source is source:
+        return bar_store
+    with _BAR_STORES_LOCK:
+        bar_store = _BAR_STORES.get(key)
+        if bar_store is None or bar_store.source is not source:
+            bar_store = BarStore(source)
+            _BAR_STORES[key] = bar_store
+    return bar_store
+
+
+def get_trading_calendar(
+    market: str = "us", resolution: str = "daily", merged_path: Optional[str] = None
+) -> Optional[TradingCalendar]:
+    """Get the sorted trading calendar of a market and resolution.
+
+    Args:
+        market: Market type ("us", "cn", or "crypto")
+        resolution: "daily" or "60min"
+        merged_path: Optional custom merged.jsonl path, defaults to the market's file
+
+    Returns:
+        TradingCalendar built from merged.jsonl, or None if the file does not exist
+    """
+    merged_file = get_merged_file_path(market) if merged_path is None else Path(merged_path)
+    store = get_price_source(merged_file)
+    if store is None:
+        return None
+    return store.calendar(resolution)
+
+
 def is_trading_day(date: str, market: str = "us") -> bool:
     """Check if a given date is a trading day by looking up merged.jsonl.
 
@@ -254,37 +333,17 @@ def is_trading_day(date: str, market: str = "us") -> bool:
             return False
         return True
 
-    merged_file_path = get_merged_file_path(market)
-
-    if not merged_file_path.exists():
-        print(f"⚠️  Warning: {merged_file_path} not found, cannot validate trading day")
-        return False
-
+    resolution = "60min" if " " in date else "daily"
     try:
-        with open(merged_file_path, "r", encoding="utf-8") as f:
-            # Read first line to check if date exists
-            for line in f:
-                try:
-                    data = json.loads(line.strip())
-                    # Check for daily time series first
-                    time_series = data.get("Time Series (Daily)", {})
-                    if date in time_series:
-                        return True
-
-                    # If no daily data, check for hourly data (e.g., "Time Series (60min)")
-                    for key, value in data.items():
-                        if key.startswith("Time Series") and isinstance(value, dict):
-                            # Check if any hourly timestamp starts with the date
-                            for timestamp in value.keys():
-                                if timestamp.startswith(date):
-                                    return True
-                except json.JSONDecodeError:
-                    continue
-            # If we get here, checked all stocks and date was not found in any
-            return False
+        calendar = get_trading_calendar(market, resolution)
     except Exception as e:
         print(f"⚠️  Error checking trading day: {e}")
         return False
+    if calendar is None:
+        print(f"⚠️  Warning: {get_merged_file_path(market)} not found, cannot validate trading day")
+        return False
+
+    return date in calendar
 
 
 def get_all_trading_days(market: str = "us") -> List[str]:
@@ -298,25 +357,16 @@ def get_all_trading_days(market: str = "us") -> List[str]:
     """
     merged_file_path = get_merged_file_path(market)
 
-    if not merged_file_path.exists():
-        print(f"⚠️  Warning: {merged_file_path} not found")
-        return []
-
-    trading_days = set()
     try:
-        with open(merged_file_path, "r", encoding="utf-8") as f:
-            for line in f:
-                try:
-                    data = json.loads(line.strip())
-                    time_series = data.get("Time Series (Daily)", {})
-                    # Add all dates from this stock's time series
-                    trading_days.update(time_series.keys())
-                except json.JSONDecodeError:
-                    continue
-        return sorted(list(trading_days))
+        store = get_price_source(merged_file_path)
     except Exception as e:
         print(f"⚠️  Error reading trading days: {e}")
         return []
+    if store is None:
+        print(f"⚠️  Warning: {merged_file_path} not found")
+        return []
+
+    return store.resolution_timestamps("daily")
 
 
 def get_stock_name_mapping(market: str = "us") -> Dict[str, str]:
@@ -330,26 +380,15 @@ def get_stock_name_mapping(market: str = "us") -> Dict[str, str]:
     """
     merged_file_path = get_merged_file_path(market)
 
-    if not merged_file_path.exists():
-        return {}
-
-    name_map = {}
     try:
-        with open(merged_file_path, "r", encoding="utf-8") as f:
-            for line in f:
-                try:
-                    data = json.loads(line.strip())
-                    meta = data.get("Meta Data", {})
-                    symbol = meta.get("2. Symbol")
-                    name = meta.get("2.1. Name", "")
-                    if symbol and name:
-                        name_map[symbol] = name
-                except json.JSONDecodeError:
-                    continue
-        return name_map
+        store = get_price_source(merged_file_path)
     except Exception as e:
         print(f"⚠️  Error reading stock names: {e}")
         return {}
+    if store is None:
+        return {}
+
+    return dict(store.names)
 
 
 def format_price_dict_with_names(
@@ -391,7 +430,7 @@ def format_price_dict_with_names(
 def get_yesterday_date(today_date: str, merged_path: Optional[str] = None, market: str = "us") -> str:
     """
     获取输入日期的上一个交易日或时间点。
-    从 merged.jsonl 读取所有可用的交易时间，然后找到 today_date 的上一个时间。
+    在 merged.jsonl 构建的交易日历（按市场与周期排序）中二分查找 today_date 的上一个时间。
     
     Args:
         today_date: 日期字符串，格式 YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS。
@@ -415,60 +454,14 @@ def get_yesterday_date(today_date: str, merged_path: Optional[str] = None, marke
     else:
         merged_file = Path(merged_path)
     
-    if not merged_file.exists():
-        # 如果文件不存在，根据输入类型回退
+    calendar = get_trading_calendar(market, "daily" if date_only else "60min", merged_path=merged_file)
+    if calendar is None:
         print(f"merged.jsonl file does not exist at {merged_file}")
-        if date_only:
-            yesterday_dt = input_dt - timedelta(days=1)
-            while yesterday_dt.weekday() >= 5:
-                yesterday_dt -= timedelta(days=1)
-            return yesterday_dt.strftime("%Y-%m-%d")
-        else:
-            yesterday_dt = input_dt - timedelta(hours=1)
-            return yesterday_dt.strftime("%Y-%m-%d %H:%M:%S")
-    
-    # 从 merged.jsonl 读取所有可用的交易时间
-    all_timestamps = set()
-    
-    with merged_file.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                doc = json.loads(line)
-                # 查找所有以 "Time Series" 开头的键
-                for key, value in doc.items():
-                    if key.startswith("Time Series"):
-                        if isinstance(value, dict):
-                            all_timestamps.update(value.keys())
-                        break
-            except Exception:
-                continue
-    
-    if not all_timestamps:
-        # 如果没有找到任何时间戳，根据输入类型回退
-        if date_only:
-            yesterday_dt = input_dt - timedelta(days=1)
-            while yesterday_dt.weekday() >= 5:
-                yesterday_dt -= timedelta(days=1)
-            return yesterday_dt.strftime("%Y-%m-%d")
-        else:
-            yesterday_dt = input_dt - timedelta(hours=1)
-            return yesterday_dt.strftime("%Y-%m-%d %H:%M:%S")
-    
-    # 将所有时间戳转换为 datetime 对象，并找到小于 today_date 的最大时间戳
-    previous_timestamp = None
-    
-    for ts_str in all_timestamps:
-        try:
-            ts_dt = datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S")
-            if ts_dt < input_dt:
-                if previous_timestamp is None or ts_dt > previous_timestamp:
-                    previous_timestamp = ts_dt
-        except Exception:
-            continue
-    
-    # 如果没有找到更早的时间戳，根据输入类型回退
+
+    # 在排序好的交易日历中二分查找 today_date 的上一个时间点
+    previous_timestamp = calendar.previous(today_date) if calendar is not None else None
+
+    # 如果文件不存在或没有找到更早的时间戳，根据输入类型回退
     if previous_timestamp is None:
         if date_only:
             yesterday_dt = input_dt - timedelta(days=1)
@@ -479,12 +472,7 @@ def get_yesterday_date(today_date: str, merged_path: Optional[str] = None, marke
             yesterday_dt = input_dt - timedelta(hours=1)
             return yesterday_dt.strftime("%Y-%m-%d %H:%M:%S")
 
-    # 返回结果
-    if date_only:
-        return previous_timestamp.strftime("%Y-%m-%d")
-    else:
-        return previous_timestamp.strftime("%Y-%m-%d %H:%M:%S")
-
+    return previous_timestamp
 
 
 def get_open_prices(
@@ -501,7 +489,6 @@ def get_open_prices(
     Returns:
         {symbol_price: open_price 或 None} 的字典；若未找到对应日期或标的，则值为 None。
     """
-    wanted = set(symbols)
     results: Dict[str, Optional[float]] = {}
 
     if merged_path is None:
@@ -509,38 +496,17 @@ def get_open_prices(
     else:
         merged_file = Path(merged_path)
 
-    if not merged_file.exists():
+    bar_store = get_bar_store(merged_file)
+    if bar_store is None:
         return results
 
-    with merged_file.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                doc = json.loads(line)
-            except Exception:
-                continue
-            meta = doc.get("Meta Data", {}) if isinstance(doc, dict) else {}
-            sym = meta.get("2. Symbol")
-            if sym not in wanted:
-                continue
-            # 查找所有以 "Time Series" 开头的键
-            series = None
-            for key, value in doc.items():
-                if key.startswith("Time Series"):
-                    series = value
-                    break
-            if not isinstance(series, dict):
-                continue
-            bar = series.get(today_date)
-            
-            if isinstance(bar, dict):
-                open_val = bar.get("1. buy price")
-                
-                try:
-                    results[f"{sym}_price"] = float(open_val) if open_val is not None else None
-                except Exception:
-                    results[f"{sym}_price"] = None
+    # 日线日期可由更细周期（如 60min）数据重采样得到
+    resolution = "60min" if " " in today_date else "daily"
+    for sym in symbols:
+        if not bar_store.source.has_symbol(sym):
+            continue
+        if bar_store.has_bar(sym, today_date, resolution):
+            results[f"{sym}_price"] = bar_store.get_open(sym, today_date, resolution)
 
     return results
 
@@ -559,7 +525,6 @@ def get_yesterday_open_and_close_price(
     Returns:
         (买入价字典, 卖出价字典) 的元组；若未找到对应日期或标的，则值为 None。
     """
-    wanted = set(symbols)
     buy_results: Dict[str, Optional[float]] = {}
     sell_results: Dict[str, Optional[float]] = {}
 
@@ -568,83 +533,23 @@ def get_yesterday_open_and_close_price(
     else:
         merged_file = Path(merged_path)
 
-    if not merged_file.exists():
+    bar_store = get_bar_store(merged_file)
+    if bar_store is None:
         return buy_results, sell_results
 
     yesterday_date = get_yesterday_date(today_date, merged_path=merged_path, market=market)
+    resolution = "60min" if " " in yesterday_date else "daily"
 
-    with merged_file.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                doc = json.loads(line)
-            except Exception:
-                continue
-            meta = doc.get("Meta Data", {}) if isinstance(doc, dict) else {}
-            sym = meta.get("2. Symbol")
-            if sym not in wanted:
-                continue
-            # 查找所有以 "Time Series" 开头的键
-            series = None
-            for key, value in doc.items():
-                if key.startswith("Time Series"):
-                    series = value
-                    break
-            if not isinstance(series, dict):
-                continue
-
-            # 尝试获取昨日买入价和卖出价
-            bar = series.get(yesterday_date)
-            if isinstance(bar, dict):
-                buy_val = bar.get("1. buy price")  # 买入价字段
-                sell_val = bar.get("4. sell price")  # 卖出价字段
-
-                try:
-                    buy_price = float(buy_val) if buy_val is not None else None
-                    sell_price = float(sell_val) if sell_val is not None else None
-                    buy_results[f"{sym}_price"] = buy_price
-                    sell_results[f"{sym}_price"] = sell_price
-                except Exception:
-                    buy_results[f"{sym}_price"] = None
-                    sell_results[f"{sym}_price"] = None
-            else:
-                # 如果昨日没有数据，尝试向前查找最近的交易日
-                # raise ValueError(f"No data found for {sym} on {yesterday_date}")
-                # print(f"No data found for {sym} on {yesterday_date}")
-                buy_results[f'{sym}_price'] = None
-                sell_results[f'{sym}_price'] = None
-                # today_dt = datetime.strptime(today_date, "%Y-%m-%d")
-                # yesterday_dt = today_dt - timedelta(days=1)
-                # current_date = yesterday_dt
-                # found_data = False
-                
-                # # 最多向前查找5个交易日
-                # for _ in range(5):
-                #     current_date -= timedelta(days=1)
-                #     # 跳过周末
-                #     while current_date.weekday() >= 5:
-                #         current_date -= timedelta(days=1)
-                    
-                #     check_date = current_date.strftime("%Y-%m-%d")
-                #     bar = series.get(check_date)
-                #     if isinstance(bar, dict):
-                #         buy_val = bar.get("1. buy price")
-                #         sell_val = bar.get("4. sell price")
-                        
-                #         try:
-                #             buy_price = float(buy_val) if buy_val is not None else None
-                #             sell_price = float(sell_val) if sell_val is not None else None
-                #             buy_results[f'{sym}_price'] = buy_price
-                #             sell_results[f'{sym}_price'] = sell_price
-                #             found_data = True
-                #             break
-                #         except Exception:
-                #             continue
-                
-                # if not found_data:
-                #     buy_results[f'{sym}_price'] = None
-                #     sell_results[f'{sym}_price'] = None
+    for sym in symbols:
+        if not bar_store.source.has_symbol(sym):
+            continue
+        # 尝试获取昨日买入价和卖出价；昨日没有数据时值为 None
+        if bar_store.has_bar(sym, yesterday_date, resolution):
+            buy_results[f"{sym}_price"] = bar_store.get_open(sym, yesterday_date, resolution)
+            sell_results[f"{sym}_price"] = bar_store.get_close(sym, yesterday_date, resolution)
+        else:
+            buy_results[f"{sym}_price"] = None
+            sell_results[f"{sym}_price"] = None
 
     return buy_results, sell_results
 
@@ -706,65 +611,26 @@ def get_today_init_position(today_date: str, signature: str) -> Dict[str, float]
     Returns:
         {symbol: weight} 的字典；若未找到对应日期，则返回空字典。
     """
-    from tools.general_tools import get_config_value
-    import os
-
-    base_dir = Path(__file__).resolve().parents[1]
-
-    # Get log_path from config, default to "agent_data" for backward compatibility
-    log_path = get_config_value("LOG_PATH", "./data/agent_data")
-
-    # Handle different path formats:
-    # - If it's an absolute path (like temp directory), use it directly
-    # - If it's a relative path starting with "./data/", remove the prefix and prepend base_dir/data
-    # - Otherwise, treat as relative to base_dir/data
-    if os.path.isabs(log_path):
-        # Absolute path (like temp directory) - use directly
-        position_file = Path(log_path) / signature / "position" / "position.jsonl"
-    else:
-        if log_path.startswith("./data/"):
-            log_path = log_path[7:]  # Remove "./data/" prefix
-        position_file = base_dir / "data" / log_path / signature / "position" / "position.jsonl"
-#     position_file = base_dir / "data" / "agent_data" / signature / "position" / "position.jsonl"
-
-    if not position_file.exists():
-        print(f"Position file {position_file} does not exist")
+    ledger = get_position_ledger(signature)
+    if not ledger.path.exists():
+        print(f"Position file {ledger.path} does not exist")
         return {}
-    
-    # 获取市场类型，智能判断
-    market = get_market_type()
-    yesterday_date = get_yesterday_date(today_date, market=market)
-    
-    max_id = -1
-    latest_positions = {}
-    all_records = []
-  
-    with position_file.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                doc = json.loads(line)
-                record_date = doc.get("date")
-                if record_date and record_date < today_date:
-                    all_records.append(doc)
-            except Exception:
-                continue
 
-    if not all_records:
+    # 今天之前最新日期中 id 最大的记录
+    record = ledger.latest_before(today_date)
+    if record is None:
         return {}
-
-    # Sort by date (descending) then by id (descending) to get the most recent record
-    all_records.sort(key=lambda x: (x.get("date", ""), x.get("id", 0)), reverse=True)
-
-    return all_records[0].get("positions", {})
+    return record.get("positions", {})
 
 
 def get_latest_position(today_date: str, signature: str) -> Tuple[Dict[str, float], int]:
     """
     获取最新持仓。从 ../data/agent_data/{signature}/position/position.jsonl 中读取。
     优先选择当天 (today_date) 中 id 最大的记录；
-    若当天无记录，则回退到上一个交易日，选择该日中 id 最大的记录。
+    若当天无记录，则回退到今天之前最近一个有记录的日期，选择该日中 id 最大的记录。
+
+    持仓文件由按签名缓存的 PositionLedger 增量读取，每次调用只解析上次之后追加的字节。
+    尚未读取文件时，若 today_date 不早于最后一条记录的日期，则只从文件末尾读取最后一条记录。
 
     Args:
         today_date: 日期字符串，格式 YYYY-MM-DD，代表今天日期。
@@ -775,95 +641,7 @@ def get_latest_position(today_date: str, signature: str) -> Tuple[Dict[str, floa
           - positions: {symbol: weight} 的字典；若未找到任何记录，则为空字典。
           - max_id: 选中记录的最大 id；若未找到任何记录，则为 -1.
     """
-    from tools.general_tools import get_config_value
-    import os
-
-    base_dir = Path(__file__).resolve().parents[1]
-
-    # Get log_path from config, default to "agent_data" for backward compatibility
-    log_path = get_config_value("LOG_PATH", "./data/agent_data")
-
-    # Handle different path formats:
-    # - If it's an absolute path (like temp directory), use it directly
-    # - If it's a relative path starting with "./data/", remove the prefix and prepend base_dir/data
-    # - Otherwise, treat as relative to base_dir/data
-    if os.path.isabs(log_path):
-        # Absolute path (like temp directory) - use directly
-        position_file = Path(log_path) / signature / "position" / "position.jsonl"
-    else:
-        if log_path.startswith("./data/"):
-            log_path = log_path[7:]  # Remove "./data/" prefix
-        position_file = base_dir / "data" / log_path / signature / "position" / "position.jsonl"
-
-    if not position_file.exists():
-        return {}, -1
-
-    # 获取市场类型，智能判断
-    market = get_market_type()
-    
-    # Step 1: 先查找当天的记录
-    max_id_today = -1
-    latest_positions_today: Dict[str, float] = {}
-    
-    with position_file.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                doc = json.loads(line)
-                if doc.get("date") == today_date:
-                    current_id = doc.get("id", -1)
-                    if current_id > max_id_today:
-                        max_id_today = current_id
-                        latest_positions_today = doc.get("positions", {})
-            except Exception:
-                continue
-    
-    # 如果当天有记录，直接返回
-    if max_id_today >= 0 and latest_positions_today:
-        return latest_positions_today, max_id_today
-    
-    # Step 2: 当天没有记录，则回退到上一个交易日
-    prev_date = get_yesterday_date(today_date, market=market)
-    
-    max_id_prev = -1
-    latest_positions_prev: Dict[str, float] = {}
-
-    with position_file.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                doc = json.loads(line)
-                if doc.get("date") == prev_date:
-                    current_id = doc.get("id", -1)
-                    if current_id > max_id_prev:
-                        max_id_prev = current_id
-                        latest_positions_prev = doc.get("positions", {})
-            except Exception:
-                continue
-    
-    # 如果前一天也没有记录，尝试找文件中最新的记录（按日期和id排序）
-    if max_id_prev < 0 or not latest_positions_prev:
-        all_records = []
-        with position_file.open("r", encoding="utf-8") as f:
-            for line in f:
-                if not line.strip():
-                    continue
-                try:
-                    doc = json.loads(line)
-                    if doc.get("date") and doc.get("date") < today_date:
-                        all_records.append(doc)
-                except Exception:
-                    continue
-        
-        if all_records:
-            # 按日期和id排序，取最新的一条
-            all_records.sort(key=lambda x: (x.get("date", ""), x.get("id", 0)), reverse=True)
-            latest_positions_prev = all_records[0].get("positions", {})
-            max_id_prev = all_records[0].get("id", -1)
-    
-    return latest_positions_prev, max_id_prev
+    return get_position_ledger(signature).latest_position(today_date)
 
 def add_no_trade_record(today_date: str, signature: str):
     """
@@ -875,37 +653,17 @@ def add_no_trade_record(today_date: str, signature: str):
     Returns:
         None
     """
-    save_item = {}
-    current_position, current_action_id = get_latest_position(today_date, signature)
-    
-    save_item["date"] = today_date
-    save_item["id"] = current_action_id + 1
-    save_item["this_action"] = {"action": "no_trade", "symbol": "", "amount": 0}
-
-    save_item["positions"] = current_position
-
-    from tools.general_tools import get_config_value
-    import os
-
-    base_dir = Path(__file__).resolve().parents[1]
-
-    # Get log_path from config, default to "agent_data" for backward compatibility
-    log_path = get_config_value("LOG_PATH", "./data/agent_data")
+    with position_lock(signature):
+        ledger = get_position_ledger(signature)
+        current_position, current_action_id = ledger.latest_position(today_date)
 
-    # Handle different path formats:
-    # - If it's an absolute path (like temp directory), use it directly
-    # - If it's a relative path starting with "./data/", remove the prefix and prepend base_dir/data
-    # - Otherwise, treat as relative to base_dir/data
-    if os.path.isabs(log_path):
-        # Absolute path (like temp directory) - use directly
-        position_file = Path(log_path) / signature / "position" / "position.jsonl"
-    else:
-        if log_path.startswith("./data/"):
-            log_path = log_path[7:]  # Remove "./data/" prefix
-        position_file = base_dir / "data" / log_path / signature / "position" / "position.jsonl"
+        save_item = {}
+        save_item["date"] = today_date
+        save_item["id"] = current_action_id + 1
+        save_item["this_action"] = {"action": "no_trade", "symbol": "", "amount": 0}
+        save_item["positions"] = current_position
 
-    with position_file.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(save_item) + "\n")
+        ledger.append(save_item)
     return
 
 
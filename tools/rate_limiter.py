@@ -0,0 +1,263 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# Add project root directory to Python path
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+# Bucket state files shared by every process of a run. main_parrallel.py gives
+# each run a fresh directory and passes it to its subprocesses in RATE_LIMIT_DIR.
+RATE_LIMIT_DIR_ENV = "RATE_LIMIT_DIR"
+DEFAULT_RATE_LIMIT_DIR = project_root / "data" / ".rate_limits"
+
+
+def get_rate_limit_dir() -> Path:
+    """Directory of the current run's bucket files: $RATE_LIMIT_DIR, else data/.rate_limits"""
+    raw = os.environ.get(RATE_LIMIT_DIR_ENV)
+    return Path(raw) if raw else DEFAULT_RATE_LIMIT_DIR
+
+
+def create_run_rate_limit_dir(log_path: str) -> Path:
+    """Create an empty bucket directory for one run under {log_path}/.rate_limits/.
+
+    A new directory gives every provider a full budget and zeroed stats without
+    touching the buckets of other runs, which may be using the same providers
+    concurrently.
+
+    Args:
+        log_path: The config's log_path, resolved like the agents' data directory
+
+    Returns:
+        Path to the new directory
+    """
+    if os.path.isabs(log_path):
+        base_dir = Path(log_path)
+    else:
+        if log_path.startswith("./data/"):
+            log_path = log_path[7:]
+        base_dir = project_root / "data" / log_path
+    base_dir = base_dir / ".rate_limits"
+    base_dir.mkdir(parents=True, exist_ok=True)
+    return Path(tempfile.mkdtemp(prefix=time.strftime("run-%Y%m%d-%H%M%S-"), dir=base_dir))
+
+
+class TokenBucket:
+    """Requests-per-minute and tokens-per-minute budget of one API provider.
+
+    The state lives in a small JSON file guarded by an fcntl lock, so model
+    subprocesses of the parallel runner draw from the same budget. Each
+    bucket holds at most one minute of budget and refills continuously. The
+    file also accumulates the request, token and wait counts reported in the
+    run summary.
+    """
+
+    def __init__(self, key: str, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.key = key
+        self.rpm = rpm
+        self.tpm = tpm
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        rate_limit_dir = get_rate_limit_dir()
+        rate_limit_dir.mkdir(parents=True, exist_ok=True)
+        self.path = rate_limit_dir / f"{digest}.json"
+        self.lock_path = rate_limit_dir / f"{digest}.lock"
+
+    def _locked(self):
+        fh = open(self.lock_path, "a+")
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        return fh
+
+    def _load(self, now: float) -> Dict[str, Any]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        if "updated" not in state:
+            state.update(
+                {"requests": self.rpm or 0.0, "tokens": self.tpm or 0.0, "updated": now, "stats": _empty_stats()}
+            )
+        # Refill for the time since the last update, capped at one minute of budget
+        elapsed = max(0.0, now - state["updated"])
+        if self.rpm:
+            state["requests"] = min(self.rpm, state["requests"] + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            state["tokens"] = min(self.tpm, state["tokens"] + elapsed * self.tpm / 60.0)
+        state["updated"] = now
+        return state
+
+    def _save(self, state: Dict[str, Any]) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def try_acquire(self, tokens: float) -> float:
+        """Take one request and tokens from the bucket.
+
+        Returns:
+            0 if the budget was taken, otherwise the seconds to wait before trying again
+        """
+        fh = self._locked()
+        try:
+            state = self._load(time.time())
+            # A prompt larger than the whole minute budget only waits for a full bucket
+            tokens = min(tokens, self.tpm) if self.tpm else tokens
+            wait = 0.0
+            if self.rpm and state["requests"] < 1:
+                wait = max(wait, (1 - state["requests"]) * 60.0 / self.rpm)
+            if self.tpm and state["tokens"] < tokens:
+                wait = max(wait, (tokens - state["tokens"]) * 60.0 / self.tpm)
+            if wait == 0:
+                state["requests"] -= 1
+                state["tokens"] -= tokens
+                state["stats"]["requests"] += 1
+                state["stats"]["tokens"] += tokens
+            self._save(state)
+            return wait
+        finally:
+            fh.close()
+
+    async def acquire(self, tokens: float) -> float:
+        """Wait until one request and tokens are available and take them.
+
+        The locked file I/O runs in a worker thread, so an agent waiting for
+        the lock does not stall the other agents of the event loop.
+
+        Returns:
+            Seconds spent waiting
+        """
+        start = time.monotonic()
+        throttled = False
+        while True:
+            wait = await asyncio.to_thread(self.try_acquire, tokens)
+            if wait == 0:
+                break
+            throttled = True
+            await asyncio.sleep(wait)
+        if not throttled:
+            return 0.0
+        waited = time.monotonic() - start
+        await asyncio.to_thread(self._update_stats, waits=1, wait_seconds=waited)
+        return waited
+
+    def settle(self, tokens: float) -> None:
+        """Charge (or refund, if negative) the difference between actual and estimated tokens."""
+        if tokens:
+            fh = self._locked()
+            try:
+                state = self._load(time.time())
+                state["tokens"] -= tokens
+                state["stats"]["tokens"] += tokens
+                self._save(state)
+            finally:
+                fh.close()
+
+    def _update_stats(self, **deltas: float) -> None:
+        fh = self._locked()
+        try:
+            state = self._load(time.time())
+            for name, delta in deltas.items():
+                state["stats"][name] = state["stats"].get(name, 0) + delta
+            self._save(state)
+        finally:
+            fh.close()
+
+    def stats(self) -> Dict[str, float]:
+        fh = self._locked()
+        try:
+            return dict(self._load(time.time())["stats"])
+        finally:
+            fh.close()
+
+
+def _empty_stats() -> Dict[str, float]:
+    return {"requests": 0, "tokens": 0, "waits": 0, "wait_seconds": 0.0}
+
+
+def _estimate_tokens(messages: List[List[Any]]) -> int:
+    # About 4 characters per token; the real count is settled when the response arrives
+    chars = sum(len(str(getattr(m, "content", m))) for batch in messages for m in batch)
+    return chars // 4 + 1
+
+
+class RateLimitCallback(AsyncCallbackHandler):
+    """LangChain callback that makes every chat model request wait for its provider's TokenBucket.
+
+    Passed to ChatOpenAI(callbacks=[...]), so each request of an agent
+    invocation (not just each invocation) is counted. Requests take an
+    estimated token count up front, and the difference is settled from the
+    usage the API reports.
+    """
+
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self._estimates: Dict[UUID, int] = {}
+
+    async def on_chat_model_start(
+        self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID, **kwargs: Any
+    ) -> None:
+        estimate = _estimate_tokens(messages) if self.bucket.tpm else 0
+        self._estimates[run_id] = estimate
+        await self.bucket.acquire(estimate)
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        estimate = self._estimates.pop(run_id, 0)
+        actual = _total_tokens(response)
+        if actual is not None:
+            await asyncio.to_thread(self.bucket.settle, actual - estimate)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._estimates.pop(run_id, None)
+
+
+def _total_tokens(response: LLMResult) -> Optional[int]:
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage.get("total_tokens") is not None:
+        return usage["total_tokens"]
+    for generations in response.generations:
+        for generation in generations:
+            usage_metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage_metadata:
+                return usage_metadata.get("total_tokens")
+    return None
+
+
+def get_provider_key(model_config: Dict[str, Any]) -> str:
+    """Group key of a model: its openai_base_url, else OPENAI_API_BASE."""
+    return model_config.get("openai_base_url") or os.getenv("OPENAI_API_BASE") or "default"
+
+
+def get_rate_limit(scheduler_config: Dict[str, Any], provider_key: str) -> Dict[str, float]:
+    """Limits of a provider from the config's scheduler.rate_limits, falling back to its "default" entry."""
+    rate_limits = scheduler_config.get("rate_limits") or {}
+    return rate_limits.get(provider_key) or rate_limits.get("default") or {}
+
+
+# (bucket directory, provider key) -> TokenBucket
+_BUCKETS: Dict[Tuple[str, str], TokenBucket] = {}
+
+
+def get_rate_limiter(model_config: Dict[str, Any], scheduler_config: Dict[str, Any]) -> Optional[RateLimitCallback]:
+    """RateLimitCallback for a model's provider, or None when the provider has no limits configured."""
+    key = get_provider_key(model_config)
+    limit = get_rate_limit(scheduler_config, key)
+    if not limit.get("rpm") and not limit.get("tpm"):
+        return None
+    bucket_key = (str(get_rate_limit_dir()), key)
+    bucket = _BUCKETS.get(bucket_key)
+    if bucket is None:
+        bucket = TokenBucket(key, limit.get("rpm"), limit.get("tpm"))
+        _BUCKETS[bucket_key] = bucket
+    return RateLimitCallback(bucket)
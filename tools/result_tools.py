@@ -14,6 +14,7 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 from tools.general_tools import get_config_value
+from tools.ledger import get_position_ledger, iter_position_records
 from tools.price_tools import (all_nasdaq_100_symbols, get_latest_position,
                                get_open_prices, get_today_init_position,
                                get_yesterday_date,
@@ -62,38 +63,16 @@ def get_available_date_range(signature: str) -> Tuple[str, str]:
     Returns:
         Tuple of (earliest date, latest date) in YYYY-MM-DD format
     """
-    from tools.general_tools import get_config_value
-
-    base_dir = Path(__file__).resolve().parents[1]
-
-    # Get log_path from config, default to "agent_data" for backward compatibility
-    log_path = get_config_value("LOG_PATH", "./data/agent_data")
-    if log_path.startswith("./data/"):
-        log_path = log_path[7:]  # Remove "./data/" prefix
-
-    position_file = base_dir / "data" / log_path / signature / "position" / "position.jsonl"
-
-    if not position_file.exists():
+    # The ledger keeps its sorted dates (loaded from the checkpoint plus the tail
+    # written after it), so this does not replay the whole position file
+    ledger = get_position_ledger(signature)
+    if not ledger.path.exists():
         return "", ""
 
-    dates = []
-
-    with position_file.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                doc = json.loads(line)
-                date = doc.get("date")
-                if date:
-                    dates.append(date)
-            except Exception:
-                continue
-
+    dates = ledger.dates()
     if not dates:
         return "", ""
 
-    dates.sort()
     return dates[0], dates[-1]
 
 
@@ -141,16 +120,7 @@ def get_daily_portfolio_values(
             end_date = latest_date
 
     # Read position data
-    position_data = []
-    with position_file.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                doc = json.loads(line)
-                position_data.append(doc)
-            except Exception:
-                continue
+    position_data = list(iter_position_records(position_file))
 
     # Read price data
     price_data = {}
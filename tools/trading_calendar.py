@@ -0,0 +1,77 @@
+from bisect import bisect_left, bisect_right
+from typing import Iterable, List, Optional
+
+# Appended to a date-only bound so it sorts after every "YYYY-MM-DD HH:MM:SS"
+# timestamp of that day (and before the next day).
+_END_OF_DAY = "~"
+
+
+class TradingCalendar:
+    """Sorted array of trading timestamps with O(log n) lookups.
+
+    Timestamps are kept as strings; both "YYYY-MM-DD" and
+    "YYYY-MM-DD HH:MM:SS" sort chronologically, so all queries are plain
+    bisects. A date-only query against an hourly calendar is treated as the
+    whole day (e.g. previous("2025-10-30") is the last bar of the prior day).
+    """
+
+    def __init__(self, timestamps: Iterable[str], resolution: str = "daily"):
+        self.resolution = resolution
+        self.timestamps: List[str] = sorted(set(timestamps))
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __contains__(self, timestamp: str) -> bool:
+        i = bisect_left(self.timestamps, timestamp)
+        return i < len(self.timestamps) and self.timestamps[i] == timestamp
+
+    @staticmethod
+    def _day_end(timestamp: str) -> str:
+        return timestamp + _END_OF_DAY if len(timestamp) == 10 else timestamp
+
+    @property
+    def first(self) -> Optional[str]:
+        return self.timestamps[0] if self.timestamps else None
+
+    @property
+    def last(self) -> Optional[str]:
+        return self.timestamps[-1] if self.timestamps else None
+
+    def previous(self, timestamp: str) -> Optional[str]:
+        """Latest trading timestamp strictly before timestamp, or None."""
+        i = bisect_left(self.timestamps, timestamp)
+        return self.timestamps[i - 1] if i > 0 else None
+
+    def next(self, timestamp: str) -> Optional[str]:
+        """Earliest trading timestamp strictly after timestamp, or None."""
+        i = bisect_right(self.timestamps, self._day_end(timestamp))
+        return self.timestamps[i] if i < len(self.timestamps) else None
+
+    def range(self, start: str, end: str, include_start: bool = True, include_end: bool = True) -> List[str]:
+        """Trading timestamps between start and end.
+
+        Args:
+            start: Lower bound; a date-only bound covers the whole day
+            end: Upper bound; a date-only bound covers the whole day
+            include_start: Whether timestamps on the start bound are included
+            include_end: Whether timestamps on the end bound are included
+
+        Returns:
+            Sorted list of timestamps within the bounds
+        """
+        if include_start:
+            lo = bisect_left(self.timestamps, start)
+        else:
+            lo = bisect_right(self.timestamps, self._day_end(start))
+        if include_end:
+            hi = bisect_right(self.timestamps, self._day_end(end))
+        else:
+            hi = bisect_left(self.timestamps, end)
+        return self.timestamps[lo:hi] if lo < hi else []
+
+    def dates(self) -> "TradingCalendar":
+        """Daily calendar made of the distinct dates in this calendar."""
+        if self.resolution == "daily":
+            return self
+        return TradingCalendar((ts[:10] for ts in self.timestamps), "daily")